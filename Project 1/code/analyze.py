@@ -1,12 +1,24 @@
+import io
 import os
 import re
+import json
+import time
+import hashlib
 import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import pandas as pd
 import matplotlib
 # Use non-interactive backend so PNGs can be produced in headless environments
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+import kernel_registry
+import hostinfo
+import results_store
+import dataset
+import ceilings
 
 
 def find_csv_files(exp_dir):
@@ -16,70 +28,255 @@ def find_csv_files(exp_dir):
 
 def load_all(exp_dir, variants=('scalar', 'simd')):
     # Load CSVs for the listed variants. Return dict variant->DataFrame
+    # (typed and cached by dataset.py; 'steady' marks the non-warmup samples)
+    df = dataset.load_dir(exp_dir)
     data = {}
     for v in variants:
-        pattern = re.compile(rf'^{re.escape(v)}_.*_([^_.]+)\.csv$')
-        matched = [f for f in os.listdir(exp_dir) if pattern.match(f)]
-        if not matched:
-            data[v] = None
-            continue
-        dfs = []
-        for fname in matched:
-            path = os.path.join(exp_dir, fname)
-            df = pd.read_csv(path)
-            # normalize columns
-            if 'elapsed_sec' in df.columns:
-                df['elapsed_sec'] = pd.to_numeric(df['elapsed_sec'], errors='coerce').replace([np.inf, -np.inf], 0).fillna(0)
-            if 'gflops' in df.columns:
-                df['gflops'] = pd.to_numeric(df['gflops'], errors='coerce').replace([np.inf, -np.inf], 0).fillna(0)
-            df['array_size'] = pd.to_numeric(df['array_size'], errors='coerce')
-            dfs.append(df)
-        if dfs:
-            data[v] = pd.concat(dfs, ignore_index=True)
-        else:
-            data[v] = None
+        sub = df[df['variant'] == v] if df is not None else None
+        data[v] = sub.reset_index(drop=True) if sub is not None and not sub.empty else None
     return data
 
 
-def summarize_by_size(df, kernel, min_run=5):
+def load_frame(exp_dir, variants=('scalar', 'simd')):
+    # all samples of the listed variants as one frame (None when there are none)
+    df = dataset.load_dir(exp_dir)
+    if df is None:
+        return None
+    df = df[df['variant'].isin(variants)]
+    return df if not df.empty else None
+
+
+# -------------------------------
+# Per-configuration metrics
+# -------------------------------
+# Every chart reduces steady-state samples to one row per configuration. The
+# reduction is done here once, with grouped/vectorized pandas operations, so
+# cost grows with the number of samples only through a few column passes;
+# registry lookups (bytes per element) run once per distinct
+# (kernel, type, access, stride), not once per sample.
+
+METRIC_COLUMNS = ['gflops', 'ci_lo', 'ci_hi', 'gflops_mean', 'gflops_trimmed', 'elapsed_sec', 'freq_mhz', 'ai',
+                  'bytes', 'gib_s', 'cpe', 'speedup', 'speedup_lo', 'speedup_hi', 'samples', 'warmup']
+
+# Robust statistics. A configuration is summarized by its median GFLOP/s, so a
+# preempted or otherwise disturbed sample does not move the point; the mean
+# and TRIM_FRACTION-trimmed mean are kept beside it. ci_lo..ci_hi is a
+# CI_LEVEL percentile bootstrap interval of the median. A resample's median is
+# an order statistic of the sorted samples, x[floor(n * U)] with U the uniform
+# order statistic of the same rank, which is Beta distributed; drawing U
+# directly gives exactly the bootstrap distribution at a cost of one draw per
+# configuration and resample, whatever the number of samples.
+TRIM_FRACTION = 0.1  # share of samples dropped at each end for the trimmed mean
+CI_LEVEL = 0.95
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_SEED = 0  # fixed: unchanged data redraws the same intervals
+BOOTSTRAP_CHUNK = 4096  # configurations resampled at once (bounds memory)
+
+
+def bytes_per_elem_column(df):
+    """kernel_registry.bytes_per_elem for every row (NaN for kernels the registry does not know)."""
+    access = df['access'] if 'access' in df.columns else pd.Series('unit-stride', index=df.index)
+    stride = df['stride'].fillna(1) if 'stride' in df.columns else pd.Series(1, index=df.index)
+    keys = pd.DataFrame({'kernel': df['kernel'], 'type': df['type'], 'access': access, 'stride': stride})
+    grouped = keys.groupby(list(keys.columns), observed=True)
+    codes = grouped.ngroup().to_numpy()
+    combos = grouped.size().index  # same (sorted) order as the ngroup codes
+    table = np.array([kernel_registry.bytes_per_elem(k, t, a, int(st)) if kernel_registry.is_known(k) else np.nan
+                      for k, t, a, st in combos])
+    return table[codes]
+
+
+def robust_stats(codes, values, groups):
+    """Median, trimmed mean and bootstrap CI of the median of values per group code (0..groups-1)."""
+    order = np.argsort(values)
+    order = order[np.argsort(codes[order], kind='stable')]  # by group, ascending values within (faster than lexsort)
+    v, c = values[order], codes[order]
+    counts = np.bincount(c, minlength=groups)
+    start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    median = (v[start + (counts - 1) // 2] + v[start + counts // 2]) / 2
+
+    cut = (counts * TRIM_FRACTION).astype(int)
+    pos = np.arange(len(v)) - start[c]
+    keep = (pos >= cut[c]) & (pos < (counts - cut)[c])
+    trimmed = np.bincount(c[keep], weights=v[keep], minlength=groups) / (counts - 2 * cut)
+
+    # resampled medians: the rank-m uniform order statistic of n is Beta(m, n - m + 1); for even n
+    # the next one is U_m + (1 - U_m) * Beta(1, n - m)
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    q = [(1 - CI_LEVEL) / 2, (1 + CI_LEVEL) / 2]
+    ci = np.empty((2, groups))
+    for lo in range(0, groups, BOOTSTRAP_CHUNK):
+        n, s = counts[lo:lo + BOOTSTRAP_CHUNK], start[lo:lo + BOOTSTRAP_CHUNK]
+        m = (n + 1) // 2
+        u1 = rng.beta(m, n - m + 1, size=(BOOTSTRAP_RESAMPLES, len(n)))
+        u2 = np.where(n % 2 == 1, u1, u1 + (1 - u1) * rng.beta(1, np.maximum(n - m, 1), size=u1.shape))
+        boot = (v[s + np.minimum((u1 * n).astype(int), n - 1)] + v[s + np.minimum((u2 * n).astype(int), n - 1)]) / 2
+        ci[:, lo:lo + len(n)] = np.quantile(boot, q, axis=0)
+    return median, trimmed, ci[0], ci[1]
+
+
+def counter_clock_mhz(df):
+    """Per-sample clock (MHz) measured by perf for runs with counters (tester.py --counters): the run's
+    cycles over its CPU time (utime + stime). The counters cover the whole pro1 run, so this is its
+    average clock -- not a per-kernel cycle count. NaN for samples of runs without cycles."""
+    def clock(counters):
+        cpu = counters.get('utime_sec', 0) + counters.get('stime_sec', 0)
+        return counters['cycles'] / cpu / 1e6 if counters.get('cycles') and cpu > 0 else np.nan
+
+    if 'counters' in df.columns:  # results store: runs.counters holds the sidecar's counters
+        per_run = {s: clock(json.loads(s)) for s in df['counters'].dropna().unique()}
+        return df['counters'].map(per_run).astype(float)
+    if 'source' not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    per_file = {}
+    for src in df['source'].unique():
+        path = str(src)[:-len('.csv')] + '.counters.json'
+        if os.path.exists(path):
+            with open(path) as f:
+                per_file[src] = clock(json.load(f)['counters'])
+    return df['source'].map(per_file).astype(float)
+
+
+def config_metrics(df, keys, cpu_ghz=3.0):
+    """One row per configuration (the `keys` columns) over the steady samples with elapsed_sec > 0:
+
+      gflops, ci_lo, ci_hi           median GFLOP/s and its bootstrap confidence interval
+      gflops_mean, gflops_trimmed    mean and trimmed mean GFLOP/s
+      elapsed_sec                    median time per call
+      freq_mhz                       mean sampled clock (cpufreq) over the samples
+      ai                             FLOP/byte (measured FLOPs over registry bytes moved)
+      bytes                          bytes moved per call (array_size x registry bytes per element)
+      gib_s                          bytes / median elapsed time
+      cpe                            cycles per element: median elapsed time x clock / elements, at the
+                                     perf-measured clock of the run (counter_clock_mhz) when it has
+                                     cycle counts, else freq_mhz, else cpu_ghz
+      speedup, speedup_lo/hi         gflops over the 'scalar' variant's for the same configuration, and
+                                     the ratio of their intervals' opposite ends
+      samples                        number of steady samples
+      warmup                         number of samples discarded as warmup (flagged or detected)
+    """
+    keys = list(keys)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=keys + METRIC_COLUMNS)
+    timed = df[df['elapsed_sec'] > 0]
+    warmup = timed[~timed['steady']].groupby(keys, observed=True).size().rename('warmup')
+    df = timed[timed['steady']]
+    bpe = bytes_per_elem_column(df)
+    n = df['array_size'].to_numpy(dtype=float)
+    rows = pd.DataFrame({k: df[k] for k in keys})
+    rows['gflops'] = df['gflops']
+    rows['elapsed_sec'] = df['elapsed_sec']
+    rows['freq_mhz'] = df['freq_mhz'] if 'freq_mhz' in df.columns else np.nan
+    rows['cycle_mhz'] = counter_clock_mhz(df)
+    rows['elements'] = n
+    rows['bytes'] = n * bpe
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows['ai'] = df['gflops'].to_numpy() * 1e9 * df['elapsed_sec'].to_numpy() / rows['bytes'].to_numpy()
+    grouped = rows.groupby(keys, observed=True)
+    g = grouped.agg(
+        gflops_mean=('gflops', 'mean'), elapsed_sec=('elapsed_sec', 'median'), freq_mhz=('freq_mhz', 'mean'),
+        cycle_mhz=('cycle_mhz', 'mean'), ai=('ai', 'mean'), elements=('elements', 'mean'), bytes=('bytes', 'mean'),
+        samples=('gflops', 'size')).reset_index()
+    codes = grouped.ngroup().to_numpy()
+    valid = codes >= 0  # rows with a missing key belong to no configuration
+    g['gflops'], g['gflops_trimmed'], g['ci_lo'], g['ci_hi'] = robust_stats(
+        codes[valid].astype(int), rows['gflops'].to_numpy(dtype=float)[valid], len(g))
+    g = g.merge(warmup.reset_index(), on=keys, how='left') if not warmup.empty else g.assign(warmup=0)
+    g['warmup'] = g['warmup'].fillna(0).astype(int)
+    ghz = np.where(g['cycle_mhz'] > 0, g['cycle_mhz'] / 1e3,
+                   np.where(g['freq_mhz'] > 0, g['freq_mhz'] / 1e3, cpu_ghz))
+    g['gib_s'] = g['bytes'] / g['elapsed_sec'] / (1024**3)
+    g['cpe'] = np.where(g['elements'] > 0, g['elapsed_sec'] * ghz * 1e9 / g['elements'], np.nan)
+    if 'variant' in keys:
+        rest = [k for k in keys if k != 'variant']
+        scalar = g.loc[g['variant'] == 'scalar', rest + ['gflops', 'ci_lo', 'ci_hi']].rename(
+            columns={'gflops': 'scalar_gflops', 'ci_lo': 'scalar_lo', 'ci_hi': 'scalar_hi'})
+        if rest:
+            g = g.merge(scalar, on=rest, how='left')
+        else:
+            for col in ('scalar_gflops', 'scalar_lo', 'scalar_hi'):
+                g[col] = scalar[col].mean() if not scalar.empty else np.nan
+        g['speedup'] = g['gflops'] / g['scalar_gflops'].where(g['scalar_gflops'] > 0)
+        g['speedup_lo'] = g['ci_lo'] / g['scalar_hi'].where(g['scalar_hi'] > 0)
+        g['speedup_hi'] = g['ci_hi'] / g['scalar_lo'].where(g['scalar_lo'] > 0)
+    else:
+        g['speedup'] = g['speedup_lo'] = g['speedup_hi'] = np.nan
+    return g[keys + METRIC_COLUMNS]
+
+
+def ci_yerr(m, col='gflops'):
+    """Error bars (2 x rows: below, above) for a plotted metric column: its own _lo/_hi interval, else
+    the median GFLOP/s interval carried over relatively -- within a configuration gib_s is proportional
+    to GFLOP/s, elapsed_sec and cpe inversely."""
+    val = m[col].to_numpy(dtype=float)
+    if f'{col}_lo' in m.columns:
+        lo, hi = m[f'{col}_lo'].to_numpy(dtype=float), m[f'{col}_hi'].to_numpy(dtype=float)
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rlo, rhi = (m['ci_lo'] / m['gflops']).to_numpy(), (m['ci_hi'] / m['gflops']).to_numpy()
+            if col in ('elapsed_sec', 'cpe'):
+                rlo, rhi = 1 / rhi, 1 / rlo
+        lo, hi = val * rlo, val * rhi
+    return np.nan_to_num(np.vstack([val - lo, hi - val]).clip(min=0))
+
+
+def pivot_ci(m, index, order, variants, col='gflops'):
+    """Grouped-bar tables (index rows in `order` x variant columns, 0 where missing): values and the
+    error bars below and above them."""
+    err = ci_yerr(m, col)
+    m = m.assign(err_lo=err[0], err_hi=err[1])
+    return [m.pivot(index=index, columns='variant', values=c).reindex(index=order, columns=list(variants)).fillna(0)
+            for c in (col, 'err_lo', 'err_hi')]
+
+
+def summarize_by_size(df, kernel):
+    # median GFLOP/s with its CI, robust timings and clock per array size of one kernel (see config_metrics)
     if df is None:
         return pd.DataFrame()
-    kdf = df[(df['kernel'] == kernel) & (df['run'] >= min_run) & (df['elapsed_sec'] > 0)]
-    if kdf.empty:
-        return pd.DataFrame()
-    grp = kdf.groupby('array_size')
-    # return mean GFLOP/s and mean elapsed for compatibility with existing plots
-    summary = grp.agg({'gflops': 'mean', 'elapsed_sec': 'mean'}).reset_index()
-    return summary.sort_values('array_size')
+    summary = config_metrics(df[df['kernel'] == kernel], ['array_size'])
+    return summary.sort_values('array_size') if not summary.empty else pd.DataFrame()
+
+
+SUMMARY_KEYS = ['experiment', 'variant', 'kernel', 'type', 'aligned', 'tail', 'access', 'stride', 'memory_level',
+                'array_size']
+SUMMARY_CSV = 'summary.csv'
+
+
+def write_summary(data_dir='.', out_csv=SUMMARY_CSV):
+    # config_metrics of every configuration below data_dir (experiment: the CSV's folder) to out_csv
+    df = dataset.load_tree(data_dir)
+    if df is None:
+        print('No data found in', data_dir)
+        return None
+    df = df.assign(experiment=df['source'].map(lambda p: os.path.relpath(os.path.dirname(p), data_dir)))
+    m = config_metrics(df, [k for k in SUMMARY_KEYS if k in df.columns])
+    m.to_csv(out_csv, index=False)
+    print(f"Wrote {out_csv} ({len(m)} configurations, {int(m['samples'].sum())} steady samples, "
+          f"{int(m['warmup'].sum())} warmup samples discarded)")
+    return m
 
 
 def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
     variants = ('scalar', 'simd')
-    data = load_all(exp_dir, variants)
-
-    # determine kernels present (from any variant) - coerce to str and drop nulls
-    kernels = set()
-    for df in data.values():
-        if 'kernel' in df.columns:
-            vals = df['kernel'].dropna().unique().tolist()
-            kernels.update([str(v) for v in vals])
-    if not kernels:
+    df = load_frame(exp_dir, variants)
+    if df is None:
         print('No data found in', exp_dir)
         return
-    kernels = sorted(kernels)
+    # per-(variant, kernel, size) medians, CIs and speedup over scalar in one pass
+    m = config_metrics(df, ['variant', 'kernel', 'array_size'])
+    kernels = sorted(str(k) for k in df['kernel'].dropna().unique())
 
-    # cache sizes (bytes) - adjust if you know your machine specifics
-    cache_bytes = {'L1': 32*1024, 'L2': 512*1024, 'L3': 8*1024*1024, "DRAM": 1 << 30}
+    # cache sizes (bytes) of the machine that produced the CSVs (hostinfo.json, else this one)
+    caches = hostinfo.load_caches(exp_dir)
+    cache_bytes = dict(caches, DRAM=hostinfo.working_sets(caches, cores=1)['dram'])
 
     # one subplot per kernel: GFLOPS and speedup (two rows)
     n = len(kernels)
     fig, axes = plt.subplots(nrows=n, ncols=2, figsize=(12, 4*n), squeeze=False)
 
     for i, kernel in enumerate(kernels):
-        sums = {v: summarize_by_size(data[v], kernel) for v in variants}
-        # union of sizes (iterate DataFrame objects directly)
-        sizes = sorted({int(s) for df in sums.values() for s in (df['array_size'].tolist() if not df.empty else [])})
-        if not sizes:
+        km = m[m['kernel'] == kernel].sort_values('array_size')
+        if km.empty:
             axes[i][0].text(0.5, 0.5, 'no valid data', ha='center')
             axes[i][1].text(0.5, 0.5, 'no valid data', ha='center')
             continue
@@ -87,10 +284,9 @@ def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
         # GFLOPS plot
         ax_g = axes[i][0]
         for v in variants:
-            dfv = sums[v]
-            if dfv.empty:
-                continue
-        ax_g.plot(dfv['array_size'], dfv['gflops'], marker='o', label=v)
+            vm = km[km['variant'] == v]
+            if not vm.empty:
+                ax_g.errorbar(vm['array_size'], vm['gflops'], yerr=ci_yerr(vm), marker='o', capsize=3, label=v)
         ax_g.set_xscale('log')
         ax_g.set_xlabel('array_size (elements)')
         ax_g.set_ylabel('GFLOP/s')
@@ -98,9 +294,9 @@ def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
         ax_g.legend()
         ax_g.grid(True, which='both', ls='--')
 
-        # annotate cache boundaries (convert bytes -> elements, f32=4 bytes)
+        # annotate cache boundaries (convert bytes -> elements, f32=4 bytes, two arrays as in choose_N)
         for name, b in cache_bytes.items():
-            elem = b // 4
+            elem = b // (4 * hostinfo.SWEEP_ARRAYS)
             ax_g.axvline(elem, color='k', linestyle=':', linewidth=1)
             # place label near top; protect if ylim not set yet
             try:
@@ -109,23 +305,11 @@ def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
                 ytext = 0
             ax_g.text(elem, ytext, name, rotation=90, va='top', ha='right')
 
-        # Speedup plot (scalar / auto and scalar / simd)
+        # Speedup plot: vector_gflops / scalar_gflops per size
         ax_s = axes[i][1]
-        # build arrays aligned to sizes list
-        scalar_map = {int(r['array_size']): r['gflops'] for _, r in sums['scalar'].iterrows()} if not sums['scalar'].empty else {}
-        simd_map = {int(r['array_size']): r['gflops'] for _, r in sums['simd'].iterrows()} if not sums['simd'].empty else {}
-
-        spd_simd = []
-        for s in sizes:
-            sg = scalar_map.get(s, 0)
-            mg = simd_map.get(s, 0)
-            # Speedup = vector_gflops / scalar_gflops
-            if sg > 0 and mg > 0:
-                spd_simd.append(mg / sg)
-            else:
-                spd_simd.append(np.nan)
-
-        ax_s.plot(sizes, spd_simd, marker='o', label='scalar/simd')
+        spd = km[km['variant'] == 'simd']
+        ax_s.errorbar(spd['array_size'], spd['speedup'], yerr=ci_yerr(spd, 'speedup'), marker='o', capsize=3,
+                      label='scalar/simd')
         ax_s.set_xscale('log')
         ax_s.set_xlabel('array_size (elements)')
         ax_s.set_ylabel('Speedup')
@@ -133,7 +317,7 @@ def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
         ax_s.grid(True, which='both', ls='--')
         ax_s.legend()
         for name, b in cache_bytes.items():
-            elem = b // 4
+            elem = b // (4 * hostinfo.SWEEP_ARRAYS)
             ax_s.axvline(elem, color='k', linestyle=':', linewidth=1)
 
     plt.tight_layout()
@@ -142,39 +326,34 @@ def plot_exp1(exp_dir='exp1', out_png='exp1_baseline_vs_auto.png'):
 
 
 def plot_exp2(exp_dir='exp2', out_png='exp2_sweep.png', variants=('scalar','simd'), cpu_ghz=3.0):
-    """Analyze sweep runs: produce GFLOP/s (and GiB/s) and CPE, annotate cache transitions."""
-    data = load_all(exp_dir, variants)
+    """Analyze sweep runs: produce GFLOP/s (and GiB/s) and CPE, annotate cache transitions.
 
-    # determine kernels present
-    kernels = set()
-    for df in data.values():
-        if df is None:
-            continue
-        kernels.update(df['kernel'].unique())
-    if not kernels:
+    CPE uses the clock tester.py measured during each sample (freq_mhz) and falls back to cpu_ghz
+    for CSVs without it; runs flagged with frequency drift are reported.
+    """
+    df = load_frame(exp_dir, variants)
+    if df is None:
         print('No data found in', exp_dir)
         return
-    kernels = sorted(kernels)
+    kernels = sorted(df['kernel'].dropna().unique())
+    if 'freq_drift' in df.columns:
+        drift = df[df['freq_drift'] == 1].groupby('variant', observed=True)['freq_mhz'].agg(['min', 'max'])
+        for v, lo, hi in zip(drift.index, drift['min'], drift['max']):
+            print(f'WARNING: {v} sweep ran with a drifting clock ({lo:.0f}-{hi:.0f} MHz); '
+                  f'its GFLOP/s are not comparable across sizes')
 
-    # cache sizes in bytes
-    cache_bytes = {'L1': 32*1024, 'L2': 512*1024, 'L3': 8*1024*1024}
+    # GFLOP/s, GiB/s and CPE per (variant, kernel, size) in one pass
+    m = config_metrics(df, ['variant', 'kernel', 'array_size'], cpu_ghz=cpu_ghz)
 
-    # bytes accessed per element for each kernel (approx)
-    bytes_per_elem = {
-        'SAXPY': 3 * 4,   # read x,y write y
-        'DOT': 2 * 4,     # read x,y
-        'MUL': 3 * 4,     # read x,y write z
-        'STENCIL': 4 * 4, # read x-1,x,x+1 write y
-    }
+    # cache sizes in bytes of the machine that produced the CSVs
+    cache_bytes = hostinfo.load_caches(exp_dir)
 
     n = len(kernels)
     fig, axes = plt.subplots(nrows=n, ncols=2, figsize=(14, 4*n), squeeze=False)
 
     for i, kernel in enumerate(kernels):
-        sums = {v: summarize_by_size(data[v], kernel) for v in variants}
-        # union sizes
-        sizes = sorted({int(s) for df in sums.values() for s in (df['array_size'].tolist() if not df.empty else [])})
-        if not sizes:
+        km = m[m['kernel'] == kernel].sort_values('array_size')
+        if km.empty:
             axes[i][0].text(0.5, 0.5, 'no valid data', ha='center')
             axes[i][1].text(0.5, 0.5, 'no valid data', ha='center')
             continue
@@ -183,19 +362,13 @@ def plot_exp2(exp_dir='exp2', out_png='exp2_sweep.png', variants=('scalar','simd
         ax_g = axes[i][0]
         ax_bw = ax_g.twinx()
         for v in variants:
-            dfv = sums[v]
-            if dfv.empty:
+            vm = km[km['variant'] == v]
+            if vm.empty:
                 continue
-            ax_g.plot(dfv['array_size'], dfv['gflops'], marker='o', label=f'{v} GFLOP/s')
-            # compute bandwidth per size
-            bw_vals = []
-            for _, row in dfv.iterrows():
-                N = int(row['array_size'])
-                elapsed = float(row['elapsed_sec'])
-                bpe = bytes_per_elem.get(kernel, 3*4)
-                bw = (bpe * N) / elapsed / (1024**3) if elapsed > 0 else 0
-                bw_vals.append(bw)
-            ax_bw.plot(dfv['array_size'], bw_vals, marker='x', linestyle='--', label=f'{v} GiB/s')
+            ax_g.errorbar(vm['array_size'], vm['gflops'], yerr=ci_yerr(vm), marker='o', capsize=3,
+                          label=f'{v} GFLOP/s')
+            ax_bw.errorbar(vm['array_size'], vm['gib_s'], yerr=ci_yerr(vm, 'gib_s'), marker='x', linestyle='--',
+                           capsize=3, label=f'{v} GiB/s')
 
         # show combined legend for GFLOPS and GiB/s
         h1, l1 = ax_g.get_legend_handles_labels()
@@ -212,7 +385,7 @@ def plot_exp2(exp_dir='exp2', out_png='exp2_sweep.png', variants=('scalar','simd
 
         # annotate cache boundaries
         for name, b in cache_bytes.items():
-            elem = b // 4
+            elem = b // (4 * hostinfo.SWEEP_ARRAYS)
             ax_g.axvline(elem, color='k', linestyle=':', linewidth=1)
             try:
                 ytext = ax_g.get_ylim()[1] * 0.9
@@ -223,16 +396,10 @@ def plot_exp2(exp_dir='exp2', out_png='exp2_sweep.png', variants=('scalar','simd
         # CPE plot
         ax_c = axes[i][1]
         for v in variants:
-            dfv = sums[v]
-            if dfv.empty:
-                continue
-            cpe = []
-            for _, row in dfv.iterrows():
-                N = int(row['array_size'])
-                elapsed = float(row['elapsed_sec'])
-                cycles = elapsed * (cpu_ghz * 1e9)
-                cpe.append(cycles / N if N > 0 else np.nan)
-            ax_c.plot(dfv['array_size'], cpe, marker='o', label=f'{v} CPE')
+            vm = km[km['variant'] == v]
+            if not vm.empty:
+                ax_c.errorbar(vm['array_size'], vm['cpe'], yerr=ci_yerr(vm, 'cpe'), marker='o', capsize=3,
+                              label=f'{v} CPE')
         ax_c.set_xscale('log')
         ax_c.set_xlabel('array_size (elements)')
         ax_c.set_ylabel('Cycles per element (CPE)')
@@ -247,9 +414,17 @@ def plot_exp2(exp_dir='exp2', out_png='exp2_sweep.png', variants=('scalar','simd
 
 def main():
     p = argparse.ArgumentParser(description='Analyze experiments and produce charts')
-    p.add_argument('--exp', default='exp1', help='experiment folder (exp1..exp5) or "roofline"')
+    p.add_argument('--exp', default='exp1', help='experiment folder (exp1..exp5), "roofline", "counters", "efficiency", '
+                   '"summary" (per-configuration statistics to summary.csv) or "all" (every figure whose inputs changed)')
+    p.add_argument('--dir', default='exp1', help='experiment folder for --exp counters (and the folder tree for --exp '
+                   'efficiency and summary)')
+    p.add_argument('--db', default=None, help='results_store database for --exp roofline (instead of CSV files)')
     p.add_argument('--out', default='exp1_baseline_vs_auto.png', help='output PNG filename')
-    p.add_argument('--peak', type=float, default=25.22, help='peak GFLOP/s for compute roof (default 25.22)')
+    p.add_argument('--peak', type=float, default=None, help='override the measured compute roof in GFLOP/s (see ceilings.py)')
+    p.add_argument('--min-eff', type=float, default=0.5, help='--exp efficiency: list configurations below this fraction of their roof')
+    p.add_argument('--calibrate', action='store_true', help='re-measure this host\'s roofline ceilings before plotting')
+    p.add_argument('--force', action='store_true', help='--exp all: redraw every figure, changed or not')
+    p.add_argument('--jobs', type=int, default=None, help='--exp all: worker processes (default: one per CPU)')
     p.add_argument('--memmhz', type=float, default=3200.0, help='memory DRAM data rate in MT/s (e.g. 3200) to estimate bandwidth')
     args = p.parse_args()
     if args.exp == 'exp1':
@@ -263,7 +438,20 @@ def main():
     elif args.exp == 'exp5':
         plot_exp5(args.exp, args.out)
     elif args.exp == 'roofline':
-        plot_roofline(args.out, peak_gflops=args.peak, mem_mhz=args.memmhz)
+        ceil = ceilings.get(force=True) if args.calibrate else None
+        plot_roofline(args.out, peak_gflops=args.peak, mem_mhz=args.memmhz, db=args.db, ceil=ceil)
+    elif args.exp == 'stencil_tb':
+        plot_stencil_tb(args.exp, args.out)
+    elif args.exp == 'counters':
+        plot_counters(args.dir, args.out)
+    elif args.exp == 'efficiency':
+        report_efficiency(args.dir, db=args.db, min_eff=args.min_eff)
+    elif args.exp == 'summary':
+        write_summary(args.dir)
+    elif args.exp == 'all':
+        if args.calibrate:
+            ceilings.get(force=True)
+        render_all(force=args.force, jobs=args.jobs, peak_gflops=args.peak)
     # elif args.exp == 'roofline_data_type':
     #     # simple roofline using provided peak GFLOP/s and memory rate (MT/s)
     #     plot_roofline_data_type(args.out, peak_gflops=args.peak, mem_mhz=args.memmhz)
@@ -271,23 +459,21 @@ def main():
     #     # simple roofline using provided peak GFLOP/s and memory rate (MT/s)
     #     plot_roofline_memory(args.out, peak_gflops=args.peak, mem_mhz=args.memmhz)
     else:
-        print('exp option not implemented; supported: exp1, exp2, exp3, exp4, exp5, roofline_data_type, roofline_memory')
+        print('exp option not implemented; supported: exp1, exp2, exp3, exp4, exp5, roofline, stencil_tb, counters, efficiency, summary, all')
     
 
 def plot_exp3(exp_dir='exp3', out_png='exp3_alignment_tail.png', variants=('scalar','simd')):
     """Analyze alignment and tail handling: compare aligned vs misaligned and tail/no-tail."""
-    data = load_all(exp_dir, variants)
-
-    # determine kernels present
-    kernels = set()
-    for df in data.values():
-        if df is None:
-            continue
-        kernels.update(df['kernel'].unique())
-    if not kernels:
+    df = load_frame(exp_dir, variants)
+    if df is None:
         print('No data found in', exp_dir)
         return
-    kernels = sorted(kernels)
+    kernels = sorted(df['kernel'].dropna().unique())
+
+    # median GFLOP/s and its CI per (kernel, aligned, tail, variant) over all sizes
+    m = config_metrics(df, ['kernel', 'aligned', 'tail', 'variant'])
+    # create a label for the group
+    m['group'] = m['aligned'].map({1:'aligned',0:'misaligned'}) + '\n' + m['tail'].map({1:'tail',0:'no-tail'})
 
     # We'll create one plot per kernel showing grouped bars for (aligned/misaligned) x (tail/no-tail)
     n = len(kernels)
@@ -295,40 +481,19 @@ def plot_exp3(exp_dir='exp3', out_png='exp3_alignment_tail.png', variants=('scal
 
     for i, kernel in enumerate(kernels):
         ax = axes[i][0]
-        # Build a small dataframe combining variants
-        rows = []
-        for v in variants:
-            dfv = data[v]
-            if dfv is None:
-                continue
-            kdf = dfv[(dfv['kernel'] == kernel) & (dfv['run'] >= 5) & (dfv['elapsed_sec'] > 0)]
-            if kdf.empty:
-                continue
-            # group by aligned and tail
-            g = kdf.groupby(['aligned','tail']).agg({'gflops':'mean','array_size':'count'}).reset_index()
-            for _, r in g.iterrows():
-                rows.append({'variant': v, 'aligned': int(r['aligned']), 'tail': int(r['tail']), 'gflops': r['gflops']})
-
-        if not rows:
+        km = m[m['kernel'] == kernel]
+        if km.empty:
             ax.text(0.5, 0.5, 'no valid data', ha='center')
             continue
 
-        summary = pd.DataFrame(rows)
-        # pivot to have columns per variant+flags
-        # create a label for the group
-        summary['group'] = summary['aligned'].map({1:'aligned',0:'misaligned'}) + '\n' + summary['tail'].map({1:'tail',0:'no-tail'})
-
-        groups = summary['group'].unique()
+        # groups as rows, variants as columns (0 where a variant has no data)
+        groups = km['group'].unique()
+        table, err_lo, err_hi = pivot_ci(km, 'group', groups, variants)
         x = np.arange(len(groups))
         width = 0.35
 
-        # for each variant, get gflops per group
         for j, v in enumerate(variants):
-            vals = []
-            for gname in groups:
-                row = summary[(summary['variant']==v) & (summary['group']==gname)]
-                vals.append(row['gflops'].values[0] if not row.empty else 0)
-            ax.bar(x + j*width, vals, width, label=v)
+            ax.bar(x + j*width, table[v].values, width, yerr=[err_lo[v].values, err_hi[v].values], capsize=3, label=v)
 
         ax.set_xticks(x + width*(len(variants)-1)/2)
         ax.set_xticklabels(groups)
@@ -362,19 +527,43 @@ def parse_access_label(access_str):
     return access_str
 
 
+def access_pattern(access, stride):
+    # canonical pattern of one (access, stride) configuration: unit, stride=N or gather-N (None if unknown)
+    a = str(parse_access_label(access)).lower()
+    stride = None if pd.isna(stride) else int(stride)
+    # unit detection
+    if a in ('unit', 'unit-stride', 'unit_stride', 'unit stride') or stride == 1:
+        return 'unit'
+    # stride/gather detection: prefer numeric in access, else use stride column
+    m = re.search(r'(\d+)', a)
+    if 'stride' in a:
+        return f'stride={m.group(1)}' if m else (f'stride={stride}' if stride is not None else None)
+    if 'gather' in a:
+        return f'gather-{m.group(1)}' if m else (f'gather-{stride}' if stride is not None else None)
+    # fallback: if stride column indicates a non-unit stride
+    if stride is not None and stride > 1:
+        return f'stride={stride}'
+    return None
+
+
 def plot_exp4(exp_dir='exp4', out_png='exp4_stride_gather.png', variants=('scalar','simd')):
     """Analyze stride/gather effects: compare unit-stride vs stride/gather patterns."""
-    data = load_all(exp_dir, variants)
-    # determine kernels present
-    kernels = set()
-    for df in data.values():
-        if df is None:
-            continue
-        kernels.update(df['kernel'].unique())
-    if not kernels:
+    df = load_frame(exp_dir, variants)
+    if df is None:
         print('No data found in', exp_dir)
         return
-    kernels = sorted(kernels)
+    kernels = sorted(df['kernel'].dropna().unique())
+
+    # requested canonical patterns
+    pattern_order = ['unit', 'stride=2', 'stride=4', 'stride=8', 'gather-2', 'gather-4', 'gather-8']
+
+    # a pattern for each distinct (access, stride) -- a handful of lookups, not one per sample
+    grouped = df.groupby(['access', 'stride'], observed=True, dropna=False)
+    patterns = np.array([access_pattern(a, st) for a, st in grouped.size().index], dtype=object)
+    df = df.assign(pattern=patterns[grouped.ngroup().to_numpy()])
+    df = df[df['pattern'].isin(pattern_order)]
+    # median GFLOP/s and its CI per (kernel, variant, pattern) over the pooled samples
+    pm = config_metrics(df, ['kernel', 'variant', 'pattern'])
 
     # For each kernel, create separate bars labeled like 'scalar stride=2' or 'simd gather=4'
     n = len(kernels)
@@ -382,87 +571,19 @@ def plot_exp4(exp_dir='exp4', out_png='exp4_stride_gather.png', variants=('scala
 
     for i, kernel in enumerate(kernels):
         ax = axes[i][0]
-
-        # requested canonical patterns
-        pattern_order = ['unit', 'stride=2', 'stride=4', 'stride=8', 'gather-2', 'gather-4', 'gather-8']
-
-        # collect mean gflops per (variant, pattern)
-        vals = {v: {p: 0.0 for p in pattern_order} for v in variants}
-        found = False
-        for v in variants:
-            dfv = data[v]
-            if dfv is None:
-                continue
-            kdf = dfv[(dfv['kernel'] == kernel) & (dfv['run'] >= 5) & (dfv['elapsed_sec'] > 0)]
-            if kdf.empty:
-                continue
-            kdf = kdf.copy()
-            # prefer explicit access/stride parsing: look at access column and stride column
-            kdf['access_bucket'] = kdf['access'].apply(parse_access_label)
-
-            # map patterns: unit when access indicates unit-stride OR stride==1
-            for _, r in kdf.iterrows():
-                acc = r['access_bucket']
-                # try to get numeric stride from the stride column if present
-                stride = None
-                try:
-                    if not pd.isna(r['stride']):
-                        stride = int(r['stride'])
-                except Exception:
-                    stride = None
-
-                pattern = None
-                a = str(acc).lower()
-                # unit detection
-                if a in ('unit', 'unit-stride', 'unit_stride', 'unit stride') or stride == 1:
-                    pattern = 'unit'
-                # stride detection: prefer numeric in access, else use stride column
-                elif 'stride' in a:
-                    m = re.search(r'(\d+)', a)
-                    if m:
-                        pattern = f'stride={m.group(1)}'
-                    elif stride is not None:
-                        pattern = f'stride={stride}'
-                # gather detection: prefer numeric in access, else use stride column
-                elif 'gather' in a:
-                    m = re.search(r'(\d+)', a)
-                    if m:
-                        pattern = f'gather-{m.group(1)}'
-                    elif stride is not None:
-                        pattern = f'gather-{stride}'
-                else:
-                    # fallback: if stride column indicates a non-unit stride
-                    if stride is not None and stride > 1:
-                        pattern = f'stride={stride}'
-
-                if pattern and pattern in vals[v]:
-                    # accumulate into list: we'll average after
-                    if isinstance(vals[v][pattern], float) and vals[v][pattern] == 0.0:
-                        vals[v][pattern] = [float(r['gflops'])]
-                    elif isinstance(vals[v][pattern], list):
-                        vals[v][pattern].append(float(r['gflops']))
-                    else:
-                        vals[v][pattern] = [float(r['gflops'])]
-                    found = True
-
-        if not found:
+        km = pm[pm['kernel'] == kernel]
+        if km.empty:
             ax.text(0.5, 0.5, 'no valid data', ha='center')
             continue
 
-        # compute means and prepare plotting arrays
+        # patterns as rows, variants as columns (0 where missing)
+        table, err_lo, err_hi = pivot_ci(km, 'pattern', pattern_order, variants)
         types = pattern_order
         x = np.arange(len(types))
         width = 0.35
         for j, v in enumerate(variants):
-            bar_vals = []
-            for p in types:
-                pv = vals[v].get(p, 0.0)
-                if isinstance(pv, list):
-                    bar_vals.append(float(np.mean(pv)))
-                else:
-                    # pv may be 0.0 indicating missing
-                    bar_vals.append(float(pv) if pv else 0.0)
-            ax.bar(x + j*width, bar_vals, width, label=v)
+            bar_vals = table[v].values
+            ax.bar(x + j*width, bar_vals, width, yerr=[err_lo[v].values, err_hi[v].values], capsize=3, label=v)
             # annotate
             for xi, val in enumerate(bar_vals):
                 if val > 0:
@@ -471,7 +592,7 @@ def plot_exp4(exp_dir='exp4', out_png='exp4_stride_gather.png', variants=('scala
         ax.set_xticks(x + width*(len(variants)-1)/2)
         ax.set_xticklabels([p.replace('gather-', 'gather=') for p in types], rotation=45, ha='right')
         ax.set_ylabel('GFLOP/s')
-        ax.set_title(f'{kernel}: mean GFLOP/s by canonical access patterns')
+        ax.set_title(f'{kernel}: median GFLOP/s by canonical access patterns')
         ax.legend()
         ax.grid(axis='y', ls='--')
 
@@ -481,77 +602,32 @@ def plot_exp4(exp_dir='exp4', out_png='exp4_stride_gather.png', variants=('scala
 
 
 def plot_exp5(exp_dir='exp5', out_png='exp5_types.png', variants=('scalar','simd'), vector_bytes=32):
-    """Compare types (f32, f64, optionally i32): grouped bar charts of mean GFLOP/s per type and variant.
+    """Compare types (f32, f64, optionally i32): grouped bar charts of median GFLOP/s (with CIs) per type and variant.
     Also compute arithmetic intensity (FLOP/byte) from measured GFLOP/s and elapsed time and print a textual summary
     showing lanes (vector width / bytes per element) and simd/scalar speedups.
 
     Notes/assumptions:
-      - base_bytes_per_elem mapping below assumes f32 (4 bytes) in its values; we scale for other types.
+      - bytes per element come from kernel_registry for each kernel and type.
       - FLOPs are taken from measured GFLOP/s * elapsed_sec.
       - lanes = vector_bytes / bytes_per_type.
     """
-    data = load_all(exp_dir, variants)
-
-    # determine kernels present
-    kernels = set()
-    for df in data.values():
-        if df is None:
-            continue
-        kernels.update(df['kernel'].unique())
-    if not kernels:
+    df = load_frame(exp_dir, variants)
+    if df is None:
         print('No data found in', exp_dir)
         return
-    kernels = sorted(kernels)
+    kernels = sorted(df['kernel'].dropna().unique())
 
     # bytes per element by type
-    bytes_per_type = {'f32': 4, 'f64': 8, 'i32': 4}
+    bytes_per_type = kernel_registry.TYPE_BYTES
 
-    # base bytes accessed per element for each kernel (assumes f32). Adjust if you know the kernels differ.
-    base_bytes_per_elem = {
-        'SAXPY': 3 * 4,   # read x,y write y
-        'DOT': 2 * 4,     # read x,y
-        'MUL': 3 * 4,     # read x,y write z
-        'STENCIL': 4 * 4, # read neighborhood, write
-    }
-
-    rows = []
-    for kernel in kernels:
-        for v in variants:
-            dfv = data[v]
-            if dfv is None:
-                continue
-            # relevant rows for this kernel
-            kdf = dfv[(dfv['kernel'] == kernel) & (dfv['run'] >= 5) & (dfv['elapsed_sec'] > 0)]
-            if kdf.empty:
-                continue
-            # ensure numeric
-            kdf = kdf.copy()
-            kdf['array_size'] = pd.to_numeric(kdf['array_size'], errors='coerce').fillna(0).astype(int)
-            kdf['elapsed_sec'] = pd.to_numeric(kdf['elapsed_sec'], errors='coerce').fillna(0.0)
-            kdf['gflops'] = pd.to_numeric(kdf['gflops'], errors='coerce').fillna(0.0)
-
-            for t in kdf['type'].unique():
-                sub = kdf[kdf['type'] == t]
-                if sub.empty:
-                    continue
-                # per-row FLOPs = gflops * 1e9 * elapsed
-                flops = (sub['gflops'] * 1e9 * sub['elapsed_sec']).astype(float)
-                # bytes accessed = base_bytes_per_elem[kernel] scaled by type size / 4, times N
-                base_bpe = base_bytes_per_elem.get(kernel, 3 * 4)
-                bpe = base_bpe * (bytes_per_type.get(t, 4) / 4.0)
-                bytes_accessed = (sub['array_size'] * bpe).astype(float)
-                # avoid divide-by-zero
-                ai_per_row = flops / bytes_accessed.replace({0: np.nan})
-                mean_ai = float(ai_per_row.replace([np.inf, -np.inf], np.nan).dropna().mean() or 0.0)
-                mean_gflops = float(sub['gflops'].mean())
-                lanes = int(max(1, vector_bytes // bytes_per_type.get(t, 4)))
-                rows.append({'kernel': kernel, 'variant': v, 'type': t, 'mean_gflops': mean_gflops, 'mean_ai': mean_ai, 'lanes': lanes})
-
-    if not rows:
+    # median GFLOP/s with its CI, AI and simd/scalar speedup per (kernel, variant, type) in one pass
+    res = config_metrics(df, ['kernel', 'variant', 'type'])
+    if res.empty:
         print('No valid exp5 data found')
         return
-
-    res = pd.DataFrame(rows)
+    res = res.rename(columns={'ai': 'mean_ai'})
+    res['mean_ai'] = res['mean_ai'].fillna(0.0)
+    res['lanes'] = [int(max(1, vector_bytes // bytes_per_type.get(t, 4))) for t in res['type']]
 
     # Plot: one grouped bar chart per kernel (types on x, bars per variant)
     n = len(kernels)
@@ -561,14 +637,12 @@ def plot_exp5(exp_dir='exp5', out_png='exp5_types.png', variants=('scalar','simd
         ax = axes[i][0]
         kres = res[res['kernel'] == kernel]
         types = sorted(kres['type'].unique())
+        table, err_lo, err_hi = pivot_ci(kres, 'type', types, variants)
         x = np.arange(len(types))
         width = 0.35
         for j, v in enumerate(variants):
-            vals = []
-            for t in types:
-                row = kres[(kres['variant'] == v) & (kres['type'] == t)]
-                vals.append(float(row['mean_gflops'].values[0]) if not row.empty else 0.0)
-            ax.bar(x + j*width, vals, width, label=v)
+            vals = table[v].values
+            ax.bar(x + j*width, vals, width, yerr=[err_lo[v].values, err_hi[v].values], capsize=3, label=v)
             # annotate values
             for xi, val in enumerate(vals):
                 if val > 0:
@@ -577,271 +651,514 @@ def plot_exp5(exp_dir='exp5', out_png='exp5_types.png', variants=('scalar','simd
         ax.set_xticks(x + width*(len(variants)-1)/2)
         ax.set_xticklabels(types)
         ax.set_ylabel('GFLOP/s')
-        ax.set_title(f'{kernel}: mean GFLOP/s by type and variant')
+        ax.set_title(f'{kernel}: median GFLOP/s by type and variant')
         ax.legend()
         ax.grid(axis='y', ls='--')
 
         # print textual summary for this kernel
         print(f"\nSummary for kernel: {kernel}")
-        kertab = kres[['variant','type','mean_gflops','mean_ai','lanes']].copy()
-        kertab['mean_gflops'] = kertab['mean_gflops'].map(lambda x: f"{x:.3f}")
+        kertab = kres[['variant','type','gflops','mean_ai','lanes']].rename(columns={'gflops': 'median_gflops'})
+        kertab['median_gflops'] = kertab['median_gflops'].map(lambda x: f"{x:.3f}")
+        kertab.insert(3, 'ci', [f"[{lo:.3f}, {hi:.3f}]" for lo, hi in zip(kres['ci_lo'], kres['ci_hi'])])
         kertab['mean_ai'] = kertab['mean_ai'].map(lambda x: f"{x:.3f}")
         print(kertab.to_string(index=False))
 
         # print simd/scalar speedups per type when both present
         print('\nSpeedup (simd / scalar) by type:')
-        for t in types:
-            s_row = kres[(kres['variant'] == 'scalar') & (kres['type'] == t)]
-            v_row = kres[(kres['variant'] == 'simd') & (kres['type'] == t)]
-            if not s_row.empty and not v_row.empty:
-                s = float(s_row['mean_gflops'].values[0])
-                v = float(v_row['mean_gflops'].values[0])
-                if s > 0:
-                    print(f"  {t:6s} : {v/s:6.3f}x (simd {v:.3f} / scalar {s:.3f})")
-                else:
-                    print(f"  {t:6s} : n/a (scalar zero)")
+        simd = kres[kres['variant'] == 'simd'].merge(
+            kres.loc[kres['variant'] == 'scalar', ['type', 'gflops']], on='type', suffixes=('', '_scalar'))
+        for t, v, sc, spd, lo, hi in zip(simd['type'], simd['gflops'], simd['gflops_scalar'], simd['speedup'],
+                                         simd['speedup_lo'], simd['speedup_hi']):
+            if sc > 0:
+                print(f"  {t:6s} : {spd:6.3f}x [{lo:.3f}, {hi:.3f}] (simd {v:.3f} / scalar {sc:.3f})")
+            else:
+                print(f"  {t:6s} : n/a (scalar zero)")
 
     plt.tight_layout()
     fig.savefig(out_png)
     print('\nSaved exp5 chart to', out_png)
 
-def plot_roofline(out_png='roofline.png', peak_gflops=25.22, mem_mhz=3200.0, 
-                  data_dir="roofline"):
+def plot_stencil_tb(exp_dir='stencil_tb', out_png='stencil_tb.png', variants=('scalar', 'simd', 'numpy')):
+    """Compare the naive (STENCIL_T<T>) and temporally blocked (STENCIL_TB<T>) multi-step stencils
+    per memory level: grouped GFLOP/s bars plus a printed speedup and modelled arithmetic intensity.
+
+    AI comes from kernel_registry: the naive version streams the array once per step, the blocked
+    version only once per call, so its AI grows with T.
+    """
+    df = load_frame(exp_dir, variants)
+    variants = [v for v in variants if df is not None and (df['variant'] == v).any()]
+    if not variants:
+        print('No data found in', exp_dir)
+        return
+
+    levels = ['l2', 'l3', 'dram']
+    res = config_metrics(df[df['kernel'].str.startswith('STENCIL_T')], ['variant', 'memory_level', 'kernel', 'type'])
+    # step count and version from the kernel name (one regex per configuration)
+    parsed = [kernel_registry.MULTISTEP_RE.match(k) for k in res['kernel']]
+    res = res[[m is not None for m in parsed]]
+    parsed = [m for m in parsed if m is not None]
+    if res.empty:
+        print('No multi-step stencil rows found in', exp_dir)
+        return
+    res = res.assign(steps=[int(m.group(2)) for m in parsed],
+                     version=['blocked' if m.group(1) == 'TB' else 'naive' for m in parsed],
+                     ai=[kernel_registry.arithmetic_intensity(k, t) for k, t in zip(res['kernel'], res['type'])])
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    groups = [(v, ver) for v in variants for ver in ('naive', 'blocked')]
+    x = np.arange(len(levels))
+    width = 0.8 / len(groups)
+    err = ci_yerr(res)
+    for j, (v, ver) in enumerate(groups):
+        vals, errs = [], []
+        for lvl in levels:
+            sel = ((res['variant'] == v) & (res['version'] == ver) & (res['memory_level'] == lvl)).to_numpy()
+            vals.append(float(res['gflops'].values[sel][0]) if sel.any() else 0.0)
+            errs.append(err[:, sel][:, 0] if sel.any() else (0.0, 0.0))
+        ax.bar(x + j*width, vals, width, yerr=np.array(errs).T, capsize=3, label=f'{v} {ver}')
+        for xi, val in enumerate(vals):
+            if val > 0:
+                ax.text(x[xi] + j*width, val, f"{val:.2f}", ha='center', va='bottom', fontsize=8)
+    ax.set_xticks(x + width*(len(groups)-1)/2)
+    ax.set_xticklabels(levels)
+    ax.set_ylabel('GFLOP/s')
+    ax.set_title(f"{int(res['steps'].iloc[0])}-step stencil: naive sweeps vs temporal blocking")
+    ax.legend()
+    ax.grid(axis='y', ls='--')
+
+    print('\nTemporal blocking speedup (blocked / naive):')
+    for v in variants:
+        for lvl in levels:
+            sub = res[(res['variant'] == v) & (res['memory_level'] == lvl)].set_index('version')
+            if {'naive', 'blocked'} <= set(sub.index) and sub.loc['naive', 'gflops'] > 0:
+                print(f"  {v:7s} {lvl:5s}: {sub.loc['blocked', 'gflops'] / sub.loc['naive', 'gflops']:6.3f}x "
+                      f"(AI {sub.loc['naive', 'ai']:.3f} -> {sub.loc['blocked', 'ai']:.3f} FLOP/byte)")
+
+    plt.tight_layout()
+    fig.savefig(out_png)
+    print('\nSaved stencil_tb chart to', out_png)
+
+def load_counters(exp_dir, variants=('scalar', 'simd')):
+    """One row per configuration that has a <csv>.counters.json sidecar (tester.py --counters).
+
+    Counters cover the whole pro1 run, so per-element rates divide by every element the CSV's
+    samples processed (array_size * reps summed over rows); calibration calls are not included.
     """
-    Combined roofline plot on log-log axes showing the characteristic knee.
+    rows = []
+    frame = dataset.load_dir(exp_dir)
+    for fname in sorted(os.listdir(exp_dir)):
+        if not fname.endswith('.counters.json'):
+            continue
+        stem = fname[:-len('.counters.json')]
+        variant = stem.split('_')[0]
+        csv_path = os.path.join(exp_dir, stem + '.csv')
+        if variant not in variants or not os.path.exists(csv_path):
+            continue
+        with open(os.path.join(exp_dir, fname)) as f:
+            counters = json.load(f)['counters']
+        df = frame[frame['source'] == csv_path] if frame is not None else pd.DataFrame()
+        if df.empty:
+            continue  # sidecar of a CSV without samples
+        reps = df['reps'] if 'reps' in df.columns else 1
+        elements = float((df['array_size'] * reps).sum())
+        row = {'variant': variant, 'config': stem[len(variant) + 1:].replace('--', ''),
+               'memory_level': df['memory_level'].iloc[0], 'elements': elements}
+        row.update(counters)
+        if counters.get('cycles'):
+            row['ipc'] = counters.get('instructions', np.nan) / counters['cycles']
+        for key in ('cache-misses', 'LLC-load-misses', 'dTLB-load-misses', 'minor_faults', 'major_faults'):
+            if key in counters and elements > 0:
+                row[f'{key}_per_elem'] = counters[key] / elements
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def plot_counters(exp_dir='exp1', out_png='counters.png', variants=('scalar', 'simd')):
+    """IPC and misses per element for each configuration of an experiment run with tester.py --counters.
+    Without perf data, page faults and context switches per configuration are plotted instead."""
+    res = load_counters(exp_dir, variants)
+    if res.empty:
+        print('No counter sidecars found in', exp_dir, '(run tester.py with --counters)')
+        return
+    have_perf = 'ipc' in res.columns
+    if have_perf:
+        panels = [('IPC', ['ipc'], False),
+                  ('Misses per element', [c for c in ('cache-misses_per_elem', 'LLC-load-misses_per_elem',
+                                                      'dTLB-load-misses_per_elem') if c in res.columns], True)]
+    else:
+        panels = [('Page faults per element', ['minor_faults_per_elem', 'major_faults_per_elem'], True),
+                  ('Context switches', ['voluntary_ctx_switches', 'involuntary_ctx_switches'], False)]
+    labels = [f"{r['variant']}\n{r['config']}" for _, r in res.iterrows()]
+    x = np.arange(len(res))
+    fig, axes = plt.subplots(len(panels), 1, figsize=(max(8, 0.9*len(res)), 4*len(panels)), squeeze=False)
+    for ax, (title, cols, logy) in zip(axes[:, 0], panels):
+        cols = [c for c in cols if c in res.columns]
+        width = 0.8 / max(len(cols), 1)
+        for j, col in enumerate(cols):
+            ax.bar(x + j*width, res[col].fillna(0).values, width, label=col.replace('_per_elem', ''))
+        ax.set_xticks(x + width*(len(cols)-1)/2)
+        ax.set_xticklabels(labels, rotation=45, ha='right', fontsize=7)
+        ax.set_title(title)
+        if logy:
+            ax.set_yscale('symlog', linthresh=1e-4)
+        ax.legend(fontsize='small')
+        ax.grid(axis='y', ls='--')
+    print(res.drop(columns=['elements']).to_string(index=False))
+    plt.tight_layout()
+    fig.savefig(out_png)
+    print('Saved counters chart to', out_png)
+
+def store_roofline_points(db):
+    """Roofline points (one per run) from the results store: variant, type and memory level come
+    from the runs table instead of CSV file names."""
+    df = results_store.load_samples(db)
+    df['steady'] = dataset.steady_samples(df, by=['run_id'])  # the same warm-up rule as the CSV path
+    df = df[(df['elapsed_sec'] > 0) & (df['gflops'] > 0)]
+    m = config_metrics(df, ['run_id', 'variant', 'type', 'memory_level']).dropna(subset=['ai'])
+    return pd.DataFrame({'variant': m['variant'], 'dtype': m['type'], 'mem_label': m['memory_level'],
+                         'ai': m['ai'], 'gflops': m['gflops'], 'ci_lo': m['ci_lo'], 'ci_hi': m['ci_hi'],
+                         'source': [f"{db}#{r}" for r in m['run_id']]})
+
+
+def memory_label(path):
+    # memory level from a pro1 CSV name: its last token (l1small, l1large, l2, l3, dram, sweep...)
+    fn = os.path.basename(path).lower()
+    tokens = [p for p in os.path.splitext(fn)[0].split('_') if p != '']
+    mem_raw = tokens[-1] if tokens else 'unknown'
+    for label, spellings in (('l1small', ('l1small', 'l1_small')), ('l1large', ('l1large', 'l1_large')),
+                             ('l2', ('l2',)), ('l3', ('l3',)), ('dram', ('dram',))):
+        if any(sp in mem_raw for sp in spellings):
+            return label
+    return mem_raw
+
+
+def csv_roofline_points(frame):
+    """Roofline points (one per CSV file): mean AI and median GFLOP/s (with its CI) over the file's steady samples."""
+    valid = frame[(frame['array_size'] > 0) & (frame['elapsed_sec'] > 0) & (frame['gflops'] > 0)]
+    m = config_metrics(valid, ['source', 'variant', 'type']).dropna(subset=['ai'])
+    labels = {src: memory_label(src) for src in m['source'].unique()}
+    return pd.DataFrame({'variant': m['variant'].astype(str), 'dtype': m['type'].astype(str),
+                         'mem_label': m['source'].map(labels).astype(str),
+                         'ai': m['ai'], 'gflops': m['gflops'], 'ci_lo': m['ci_lo'], 'ci_hi': m['ci_hi'],
+                         'source': m['source'].astype(str)})
+
+
+# nominal roofs used before ceilings.py measured them
+NOMINAL_PEAK_GFLOPS = 25.22
+NOMINAL_DRAM_GIB = 25.0
+ROOF_COLORS = {'l1': 'tab:blue', 'l2': 'tab:green', 'l3': 'tab:orange', 'dram': 'tab:red'}
+DTYPE_MARKERS = {'f32': 'o', 'f64': 's', 'i32': '^'}
+
+
+def roofline_ceilings(ceil=None, peak_gflops=None):
+    """Roofs for the roofline: the given ceilings, else this host's measured ones (ceilings.py), else
+    the nominal single DRAM roof. peak_gflops overrides every compute roof."""
+    if ceil is None:
+        ceil = ceilings.get(measure=False)
+    if ceil is None:
+        print(f'No measured ceilings for this host (run python ceilings.py); using the nominal '
+              f'{NOMINAL_PEAK_GFLOPS} GFLOP/s and {NOMINAL_DRAM_GIB} GiB/s DRAM roofs')
+        ceil = {'peak_gflops': {'f32': NOMINAL_PEAK_GFLOPS},
+                'bandwidth': {'dram': {'copy_gib': NOMINAL_DRAM_GIB, 'triad_gib': NOMINAL_DRAM_GIB}}}
+    if peak_gflops:
+        ceil = dict(ceil, peak_gflops={dtype: peak_gflops for dtype in ceil['peak_gflops']})
+    return ceil
+
+
+def load_roofline_frame(data_dir="roofline"):
+    # every pro1 CSV below data_dir (typed and cached by dataset.py), else below the exp* folders
+    if data_dir is None:
+        data_dir = '.'
+    frame = dataset.load_tree(data_dir) if os.path.isdir(data_dir) else None
+    if frame is None:
+        frame = dataset.concat([dataset.load_tree(entry) for entry in sorted(os.listdir('.'))
+                                if entry.startswith('exp') and os.path.isdir(entry)])
+    return frame
+
+
+def plot_roofline(out_png='roofline.png', peak_gflops=None, mem_mhz=3200.0, 
+                  data_dir="roofline", db=None, ceil=None):
+    """
+    Combined roofline plot on log-log axes with one memory roof per cache level.
     
     Args:
         out_png: Output filename for the plot
-        peak_gflops: Peak compute performance in GFLOP/s
+        peak_gflops: Override for the measured compute roof in GFLOP/s (every dtype)
         mem_mhz: Memory clock speed in MHz
         data_dir: Directory to scan for CSV files (defaults to current directory)
+        db: results_store database to read instead of scanning CSV files
+        ceil: Ceilings to draw (default: this host's from ceilings.py, else the nominal roofs)
     """
     import os
     import numpy as np
     import pandas as pd
     import matplotlib.pyplot as plt
     
-    # Estimate bandwidth
-    bw_gib = 25.0
-    bw_bytes_per_s = bw_gib * (1024**3)
-
-    # Data type sizes and bytes per element for different kernels
-    bytes_per_type = {'f32': 4, 'f64': 8, 'i32': 4}
-    base_bytes_per_elem = {'SAXPY': 3*4, 'DOT': 2*4, 'MUL': 3*4, 'STENCIL': 4*4}
-
-    # Determine which directory to scan
-    if data_dir is None:
-        data_dir = '.'
-    
-    # Scan for CSV files
-    files_to_scan = []
-    if os.path.isdir(data_dir):
-        for root, _, files in os.walk(data_dir):
-            for f in files:
-                if f.endswith('.csv'):
-                    files_to_scan.append(os.path.join(root, f))
-    
-    # Fallback: scan exp* directories
-    if not files_to_scan:
-        for entry in sorted(os.listdir('.')):
-            if not entry.startswith('exp'):
-                continue
-            for root, _, files in os.walk(entry):
-                for f in files:
-                    if f.endswith('.csv'):
-                        files_to_scan.append(os.path.join(root, f))
-
-    print(f"Scanning {len(files_to_scan)} CSV files...")
-
-    # Process CSV files and extract measurement points
-    pts = []
-    for path in files_to_scan:
-        try:
-            df = pd.read_csv(path)
-        except Exception:
-            continue
-        
-        if 'elapsed_sec' not in df.columns or 'gflops' not in df.columns:
-            continue
-        
-        df = df.copy()
-        if 'array_size' in df.columns:
-            df['array_size'] = pd.to_numeric(df['array_size'], errors='coerce').fillna(0).astype(int)
-        df['elapsed_sec'] = pd.to_numeric(df['elapsed_sec'], errors='coerce').fillna(0.0)
-        df['gflops'] = pd.to_numeric(df['gflops'], errors='coerce').fillna(0.0)
-
-        valid = df[(df['array_size'] > 0) & (df['elapsed_sec'] > 0) & (df['gflops'] > 0)]
-        if valid.empty:
-            continue
+    ceil = roofline_ceilings(ceil, peak_gflops)
 
-        # Compute arithmetic intensity for each row
-        ais = []
-        for _, r in valid.iterrows():
-            kernel = r.get('kernel', '')
-            t = r.get('type', 'f32')
-            N = int(r.get('array_size', 0))
-            elapsed = float(r.get('elapsed_sec', 0.0))
-            gflops = float(r.get('gflops', 0.0))
-            base_bpe = base_bytes_per_elem.get(kernel, 3*4)
-            bpe = base_bpe * (bytes_per_type.get(t, 4) / 4.0)
-            flops = gflops * 1e9 * elapsed
-            bytes_moved = N * bpe
-            if bytes_moved <= 0:
-                continue
-            ais.append(flops / bytes_moved)
+    frame = load_roofline_frame(data_dir) if not db else None
 
-        if not ais:
-            continue
+    if db:
+        dfpts = store_roofline_points(db)
+        print(f"Loaded {len(dfpts)} runs from {db}")
+    else:
+        print(f"Scanning {frame['source'].nunique() if frame is not None else 0} CSV files...")
+        dfpts = csv_roofline_points(frame) if frame is not None else pd.DataFrame()
 
-        mean_ai = float(np.mean(ais))
-        mean_gflops = float(valid['gflops'].mean())
-
-        # Infer variant (scalar/simd)
-        variant = None
-        if 'variant' in valid.columns:
-            vals = valid['variant'].dropna().unique().tolist()
-            if vals:
-                variant = str(vals[0])
-        if not variant:
-            fn = os.path.basename(path).lower()
-            if 'scalar' in fn:
-                variant = 'scalar'
-            elif 'simd' in fn:
-                variant = 'simd'
-            else:
-                variant = '?'
-
-        # Infer data type
-        dtype = None
-        if 'type' in valid.columns:
-            td = valid['type'].dropna().unique().tolist()
-            if td:
-                dtype = str(td[0])
-        if not dtype:
-            fn = os.path.basename(path).lower()
-            if 'f32' in fn:
-                dtype = 'f32'
-            elif 'f64' in fn:
-                dtype = 'f64'
-            elif 'i32' in fn:
-                dtype = 'i32'
-            else:
-                dtype = '?'
-
-        # Infer memory level
-        fn = os.path.basename(path).lower()
-        tokens = [p for p in os.path.splitext(fn)[0].split('_') if p != '']
-        mem_raw = tokens[-1] if tokens else 'unknown'
-        if 'l1small' in mem_raw or 'l1_small' in mem_raw:
-            mem_label = 'l1small'
-        elif 'l1large' in mem_raw or 'l1_large' in mem_raw:
-            mem_label = 'l1large'
-        elif 'l2' in mem_raw:
-            mem_label = 'l2'
-        elif 'l3' in mem_raw:
-            mem_label = 'l3'
-        elif 'dram' in mem_raw:
-            mem_label = 'dram'
-        else:
-            mem_label = mem_raw
-
-        pts.append({
-            'variant': variant,
-            'dtype': dtype,
-            'mem_label': mem_label,
-            'ai': mean_ai,
-            'gflops': mean_gflops,
-            'source': path
-        })
-
-    if not pts:
+    if dfpts.empty:
         print('No measurement rows found in CSV files to plot roofline')
         return
+    dfpts = dfpts.reset_index(drop=True)
 
-    dfpts = pd.DataFrame(pts)
-    
-    # Apply jitter to duplicate coordinates
-    dup_groups = dfpts.groupby(['ai', 'gflops']).size().reset_index(name='count')
-    dup_groups = dup_groups[dup_groups['count'] > 1]
-    if not dup_groups.empty:
-        ai_min = dfpts['ai'].min()
-        ai_max = dfpts['ai'].max()
-        ai_range = max(1e-12, ai_max - ai_min)
-        jitter = max(1e-12, ai_range * 1e-3)
-        for _, dg in dup_groups.iterrows():
-            aival = dg['ai']
-            gval = dg['gflops']
-            idxs = dfpts[(dfpts['ai'] == aival) & (dfpts['gflops'] == gval)].index.tolist()
-            k = len(idxs)
-            for j, ix in enumerate(idxs):
-                offset = (j - (k-1)/2.0) * jitter
-                dfpts.at[ix, 'ai'] = dfpts.at[ix, 'ai'] + offset
+    # Apply jitter to duplicate coordinates: spread each group of k equal points symmetrically
+    ai_range = max(1e-12, dfpts['ai'].max() - dfpts['ai'].min())
+    jitter = max(1e-12, ai_range * 1e-3)
+    dup = dfpts.groupby(['ai', 'gflops'])
+    k = dup['ai'].transform('size')
+    dfpts['ai'] = dfpts['ai'] + (dup.cumcount() - (k - 1) / 2.0) * jitter
 
     # Create the plot with log-log axes
     fig, ax = plt.subplots(figsize=(10, 7))
-    
-    # Calculate the "knee" point where memory and compute roofs intersect
-    knee_ai = peak_gflops * 1e9 / bw_bytes_per_s
-    
-    # Set x-axis range to show the knee clearly
-    if not dfpts.empty:
-        data_ai_min = dfpts['ai'].min()
-        data_ai_max = dfpts['ai'].max()
-        xmin = min(data_ai_min * 0.3, knee_ai * 0.1)
-        xmax = max(data_ai_max * 3.0, knee_ai * 10.0)
-    else:
-        xmin = knee_ai * 0.1
-        xmax = knee_ai * 10.0
-    
+
+    peaks = ceil['peak_gflops']
+    bws = {lvl: ceil['bandwidth'][lvl]['triad_gib'] for lvl in ceilings.ROOF_LEVELS if lvl in ceil['bandwidth']}
+    top_peak = max(peaks.values())
+
+    # Ridge points ("knees") where each memory roof meets each compute roof
+    knees = {(dtype, lvl): peak * 1e9 / (bw * 1024**3) for dtype, peak in peaks.items() for lvl, bw in bws.items()}
+
+    # Set x-axis range to show every knee clearly
+    xmin = min(dfpts['ai'].min() * 0.3, min(knees.values()) * 0.1)
+    xmax = max(dfpts['ai'].max() * 3.0, max(knees.values()) * 10.0)
+
     # Generate points for roofline curves
     xs = np.logspace(np.log10(xmin), np.log10(xmax), 300)
-    
-    # Memory-bound region: GFLOP/s = bandwidth * AI
-    mem_y = (bw_bytes_per_s * xs) / 1e9
-    
-    # Compute-bound region: constant at peak GFLOP/s
-    peak_y = np.full_like(xs, peak_gflops)
-    
-    # Take the minimum to create the actual roofline
-    roofline_y = np.minimum(mem_y, peak_y)
-    
-    # Plot the roofline
-    ax.loglog(xs, mem_y, '--', color='gray', alpha=0.7, 
-              label=f'Memory roof ({bw_gib:.2f} GiB/s)', linewidth=2)
-    ax.loglog(xs, peak_y, '--', color='red', alpha=0.7,
-              label=f'Compute roof ({peak_gflops:.2f} GFLOP/s)', linewidth=2)
-    ax.loglog(xs, roofline_y, 'k-', linewidth=2.5, label='Roofline', zorder=10)
-    
-    # Mark the knee point
-    ax.plot(knee_ai, peak_gflops, 'k*', markersize=15, 
-            label=f'Knee (AI={knee_ai:.3f})', zorder=11)
-
-    # Plot measured points
-    cmap = plt.get_cmap('tab20')
-    npts = len(dfpts)
-    colors = [cmap(i % cmap.N) for i in range(npts)]
-    
-    for idx, (_, r) in enumerate(dfpts.iterrows()):
-        variant = r.get('variant', '?')
-        dtype = r.get('dtype', '?')
-        mem_label = r.get('mem_label', '?')
+
+    # Memory-bound region per level: GFLOP/s = bandwidth * AI, capped by the highest compute roof
+    for lvl, bw in bws.items():
+        mem_y = np.minimum(bw * (1024**3) * xs / 1e9, top_peak)
+        ax.loglog(xs, mem_y, '-', color=ROOF_COLORS[lvl], alpha=0.8, linewidth=2,
+                  label=f'{lvl.upper()} roof ({bw:.2f} GiB/s)')
+
+    # Compute-bound region: constant at each dtype's peak GFLOP/s
+    for (dtype, peak), ls in zip(sorted(peaks.items()), ('--', '-.', ':')):
+        ax.loglog(xs, np.full_like(xs, peak), ls, color='k', alpha=0.7, linewidth=2,
+                  label=f'{dtype} compute roof ({peak:.2f} GFLOP/s)')
+        # Mark the DRAM knee of each compute roof
+        if 'dram' in bws:
+            ax.plot(knees[(dtype, 'dram')], peak, 'k*', markersize=12, zorder=11)
+
+    # Plot measured points in the colour of the roof of the level they ran in, with the CI of their median
+    err = ci_yerr(dfpts)
+    for variant, dtype, mem_label, ai, gflops, lo, hi in zip(dfpts['variant'], dfpts['dtype'], dfpts['mem_label'],
+                                                             dfpts['ai'], dfpts['gflops'], err[0], err[1]):
         lbl = f"{variant} | {dtype} | {mem_label}"
-        ax.plot(r['ai'], r['gflops'], 'o', color=colors[idx], 
-                markersize=8, label=lbl, zorder=12)
+        color = ROOF_COLORS.get(ceilings.LEVEL_ROOF.get(mem_label), 'gray')
+        ax.errorbar(ai, gflops, yerr=[[lo], [hi]], fmt=DTYPE_MARKERS.get(dtype, 'o'), color=color,
+                    markeredgecolor='k', markersize=8, capsize=2, label=lbl, zorder=12)
 
     ax.set_xlabel('Arithmetic Intensity (FLOP/byte)', fontsize=12)
     ax.set_ylabel('Performance (GFLOP/s)', fontsize=12)
-    ax.set_title('Roofline Model', fontsize=14)
+    ax.set_title(f"Roofline Model ({ceil.get('host', 'nominal ceilings')})", fontsize=14)
     
-    ax.legend(fontsize='x-small', loc='best', ncol=2, title='variant | dtype | memory')
+    ax.legend(fontsize='x-small', loc='best', ncol=2, title='roofs; variant | dtype | memory')
     ax.grid(True, which='both', ls=':', alpha=0.5)
     ax.set_xlim(xmin, xmax)
     
     fig.savefig(out_png, bbox_inches='tight', dpi=150)
     print(f'Saved roofline plot to {out_png}')
-    print(f'Estimated DRAM bandwidth: {bw_gib:.2f} GiB/s')
-    print(f'Compute peak: {peak_gflops:.2f} GFLOP/s')
-    print(f'Roofline knee at AI = {knee_ai:.3f} FLOP/byte')
+    for lvl, bw in bws.items():
+        print(f'{lvl.upper():5s} bandwidth: {bw:8.2f} GiB/s  knee at AI = '
+              + ', '.join(f'{knees[(dtype, lvl)]:.3f} ({dtype})' for dtype in sorted(peaks)))
+    for dtype, peak in sorted(peaks.items()):
+        print(f'Compute peak {dtype}: {peak:.2f} GFLOP/s')
+
+
+# -------------------------------
+# Roofline efficiency
+# -------------------------------
+# Each configuration is judged against the roof of the level it ran in:
+#   attainable = min(peak[dtype], AI x bandwidth[level])
+#   efficiency = measured GFLOP/s / attainable
+# The level is pro1's memory level (l1small/l1large -> L1 ...); sweep points
+# are placed by the bytes they move per call against the cache sizes.
+
+EFFICIENCY_KEYS = ['variant', 'kernel', 'type', 'aligned', 'tail', 'access', 'stride', 'memory_level', 'array_size']
+EFFICIENCY_CSV = 'roofline_efficiency.csv'
+
+
+def roofline_efficiency(df, ceil, caches=None):
+    """One row per configuration with its roof level, attainable GFLOP/s, efficiency, ridge AI and
+    whether it is memory- or compute-bound."""
+    caches = caches or ceil.get('caches') or hostinfo.cache_sizes()
+    keys = [k for k in EFFICIENCY_KEYS if k in df.columns]
+    m = config_metrics(df[df['gflops'] > 0], keys).dropna(subset=['ai'])
+    bws = {lvl: v['triad_gib'] for lvl, v in ceil['bandwidth'].items()}
+    peaks = ceil['peak_gflops']
+
+    by_size = np.select([m['bytes'] <= caches['L1'], m['bytes'] <= caches['L2'], m['bytes'] <= caches['L3']],
+                        ['l1', 'l2', 'l3'], 'dram')
+    m['roof'] = m['memory_level'].astype(str).map(ceilings.LEVEL_ROOF).fillna(pd.Series(by_size, index=m.index))
+    # levels without a measured roof (nominal ceilings) fall back to DRAM
+    m['bandwidth_gib'] = m['roof'].map(bws).fillna(bws.get('dram', max(bws.values())))
+    m['peak_gflops'] = m['type'].astype(str).map(peaks).fillna(ceilings.peak_for(ceil, 'f32'))
+    mem_roof = m['ai'] * m['bandwidth_gib'] * (1024**3) / 1e9
+    m['attainable'] = np.minimum(m['peak_gflops'], mem_roof)
+    m['efficiency'] = m['gflops'] / m['attainable']
+    m['ridge_ai'] = m['peak_gflops'] * 1e9 / (m['bandwidth_gib'] * 1024**3)
+    m['bound'] = np.where(mem_roof < m['peak_gflops'], 'memory', 'compute')
+    return m.sort_values('efficiency').reset_index(drop=True)
+
+
+def report_efficiency(data_dir='.', db=None, min_eff=0.5, out_csv=EFFICIENCY_CSV, ceil=None):
+    """Print ridge points, the bound/efficiency summary and the configurations below min_eff of their
+    roof (worst first); every configuration is written to out_csv."""
+    ceil = roofline_ceilings(ceil)
+    if db:
+        df = results_store.load_samples(db)
+        df['steady'] = dataset.steady_samples(df, by=['run_id'])
+    else:
+        df = load_roofline_frame(data_dir)
+    if df is None or df.empty:
+        print('No measurement rows found for the efficiency report')
+        return None
+    eff = roofline_efficiency(df, ceil)
+    eff.to_csv(out_csv, index=False)
+
+    print('Ridge points (FLOP/byte where the memory roof meets the compute roof):')
+    levels = [l for l in ceilings.ROOF_LEVELS if l in ceil['bandwidth']]
+    ridges = pd.DataFrame({lvl: {t: ceilings.peak_for(ceil, t) * 1e9 / (ceil['bandwidth'][lvl]['triad_gib'] * 1024**3)
+                                 for t in sorted(eff['type'].astype(str).unique())} for lvl in levels})
+    print(ridges.round(3).to_string())
+
+    print('\nEfficiency by bound and level (median of configurations):')
+    summary = eff.groupby(['bound', 'roof']).agg(configs=('efficiency', 'size'),
+                                                  median_eff=('efficiency', 'median'))
+    print(summary.to_string(formatters={'median_eff': '{:.1%}'.format}))
+
+    above = int((eff['efficiency'] > 1).sum())
+    if above:
+        print(f'\n{above} configurations exceed their roof: the level bandwidth is under-measured '
+              f'(re-run ceilings.py) or the point ran in a faster level than its label')
+
+    low = eff[eff['efficiency'] < min_eff]
+    print(f'\n{len(low)} of {len(eff)} configurations below {min_eff:.0%} of their roof (worst first):')
+    if not low.empty:
+        cols = ['variant', 'kernel', 'type', 'aligned', 'tail', 'access', 'stride', 'memory_level', 'array_size',
+                'roof', 'bound', 'ai', 'gflops', 'attainable', 'efficiency']
+        print(low[[c for c in cols if c in low.columns]].to_string(
+            index=False, formatters={'ai': '{:.3f}'.format, 'gflops': '{:.2f}'.format,
+                                     'attainable': '{:.2f}'.format, 'efficiency': '{:.1%}'.format}))
+    print(f'\nWrote {out_csv} ({len(eff)} configurations)')
+    return eff
+
+
+# -------------------------------
+# Batch rendering
+# -------------------------------
+# `--exp all` redraws every figure in one invocation: the result folders are
+# loaded once (dataset.py) and the figures rendered concurrently in a process
+# pool whose forked workers inherit the loaded frames. A figure is only redrawn
+# when its PNG is missing or the stamp of its inputs -- the result files it
+# reads, the ceilings and the analysis code -- differs from the one recorded in
+# RENDER_MANIFEST by the last run.
+
+RENDER_MANIFEST = 'render_manifest.json'  # figure -> input stamp of its last render
+CODE_INPUTS = ('analyze.py', 'dataset.py', 'kernel_registry.py', 'ceilings.py')
+
+FIGURES = {  # name -> (plot function, keyword arguments, output PNG)
+    'exp1': (plot_exp1, {'exp_dir': 'exp1'}, 'exp1_baseline_vs_auto.png'),
+    'exp2': (plot_exp2, {'exp_dir': 'exp2'}, 'exp2_sweep.png'),
+    'exp3': (plot_exp3, {'exp_dir': 'exp3'}, 'exp3_alignment_tail.png'),
+    'exp4': (plot_exp4, {'exp_dir': 'exp4'}, 'exp4_stride_gather.png'),
+    'exp5': (plot_exp5, {'exp_dir': 'exp5'}, 'exp5_types.png'),
+    'stencil_tb': (plot_stencil_tb, {'exp_dir': 'stencil_tb'}, 'stencil_tb.png'),
+    'roofline': (plot_roofline, {'data_dir': 'roofline'}, 'roofline.png'),
+}
+
+
+def figure_inputs(kwargs):
+    # folders and files a figure reads: its exp folder, or for the roofline the
+    # data folder, every exp* folder it falls back to and the ceilings
+    if 'exp_dir' in kwargs:
+        return [kwargs['exp_dir']]
+    exp_dirs = sorted(e for e in os.listdir('.') if e.startswith('exp') and os.path.isdir(e))
+    return [kwargs['data_dir']] + exp_dirs + [ceilings.CEILINGS_NAME]
+
+
+def input_stamp(paths, extra=None):
+    """sha256 over name, mtime and size of every CSV/JSON file under paths, the analysis code and extra."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    files = [os.path.join(here, f) for f in CODE_INPUTS]
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(d, f) for d, _, names in sorted(os.walk(path)) for f in sorted(names)
+                      if f.endswith(('.csv', '.json'))]
+        else:
+            files.append(path)
+    h = hashlib.sha256(json.dumps(extra, sort_keys=True).encode())
+    for f in files:
+        if os.path.exists(f):
+            h.update(f'{f}:{dataset.signature(f)}'.encode())
+    return h.hexdigest()
+
+
+def render_figure(name, kwargs):
+    # worker: draw one figure; returns its captured output and seconds taken
+    fn, _, out_png = FIGURES[name]
+    buf = io.StringIO()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(buf):
+        fn(out_png=out_png, **kwargs)
+    plt.close('all')
+    return buf.getvalue(), time.perf_counter() - t0
+
+
+def render_all(force=False, jobs=None, peak_gflops=None):
+    """Redraw every figure whose inputs changed since the last run (all of them when force is set)."""
+    manifest = {}
+    if os.path.exists(RENDER_MANIFEST):
+        with open(RENDER_MANIFEST) as f:
+            manifest = json.load(f)
+    pending = {}
+    for name, (_, kwargs, out_png) in FIGURES.items():
+        if 'exp_dir' in kwargs and not os.path.isdir(kwargs['exp_dir']):
+            continue
+        if name == 'roofline':
+            kwargs = dict(kwargs, peak_gflops=peak_gflops)
+        stamp = input_stamp(figure_inputs(kwargs), extra=kwargs)
+        if force or not os.path.exists(out_png) or manifest.get(name) != stamp:
+            pending[name] = (kwargs, stamp)
+    skipped = [n for n in FIGURES if n not in pending and n in manifest]
+    if skipped:
+        print(f"Up to date: {', '.join(skipped)}")
+    if not pending:
+        return
+
+    # load once in this process; forked workers share the frames
+    for name, (kwargs, _) in pending.items():
+        if 'exp_dir' in kwargs:
+            dataset.load_dir(kwargs['exp_dir'])
+        else:
+            load_roofline_frame(kwargs['data_dir'])
+    ctx = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    workers = min(len(pending), jobs or os.cpu_count() or 1)
+    print(f"Rendering {len(pending)} figures on {workers} worker processes")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {pool.submit(render_figure, name, kwargs): name for name, (kwargs, _) in pending.items()}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                output, secs = fut.result()
+            except Exception as e:
+                print(f"[{name}] FAILED: {e!r}")
+                continue
+            print(f"[{name}] {FIGURES[name][2]} ({secs:.1f}s)")
+            print(output, end='')
+            manifest[name] = pending[name][1]
+            with open(RENDER_MANIFEST, 'w') as f:
+                json.dump(manifest, f, indent=2)
+
 
 if __name__ == '__main__':
     main()
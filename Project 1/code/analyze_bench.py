@@ -0,0 +1,92 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+import kernel_registry
+import analyze
+
+# -------------------------------
+# Analysis scaling benchmark
+# -------------------------------
+# Times analyze.py's per-configuration reduction on synthetic result sets laid
+# out like dataset.py frames (one "CSV" per 1000 samples), from 10^5 rows to a
+# few million:
+#   python analyze_bench.py [ROWS...] [--legacy-max=N]
+# For comparison, the row-by-row roofline loop analyze.py used before
+# config_metrics (iterrows + a registry lookup per sample) is timed up to
+# --legacy-max rows; beyond that it would take minutes.
+
+DEFAULT_ROWS = (100_000, 1_000_000, 4_000_000)
+LEGACY_MAX = 200_000
+ROWS_PER_FILE = 1000
+
+def synthetic_frame(rows, seed=0):
+    """`rows` samples over kernels, variants, types, access patterns and sweep sizes."""
+    rng = np.random.default_rng(seed)
+    files = max(1, rows // ROWS_PER_FILE)
+    # one configuration per file, repeated for its samples
+    f = np.minimum(np.arange(rows) // ROWS_PER_FILE, files - 1)
+    kernels = np.array(list(kernel_registry.KERNELS))
+    access = np.array(['unit-stride', 'strided', 'gather'])
+    sizes = np.array([1024, 4096, 65536, 262144, 1 << 20, 1 << 24])
+    cfg = {'kernel': kernels[rng.integers(len(kernels), size=files)],
+           'variant': np.array(['scalar', 'simd'])[rng.integers(2, size=files)],
+           'type': np.array(['f32', 'f64', 'i32'])[rng.integers(3, size=files)],
+           'access': access[rng.integers(3, size=files)],
+           'array_size': sizes[rng.integers(len(sizes), size=files)],
+           'aligned': rng.integers(2, size=files), 'tail': rng.integers(2, size=files)}
+    cfg['stride'] = np.where(cfg['access'] == 'unit-stride', 1, rng.choice([2, 4, 8], size=files))
+    cfg['source'] = np.array([f'{v}_{t}_synthetic{i}_sweep.csv' for i, (v, t) in enumerate(zip(cfg['variant'], cfg['type']))])
+    df = pd.DataFrame({k: v[f] for k, v in cfg.items()})
+    df['run'] = np.arange(rows) % ROWS_PER_FILE
+    df['warmup'] = (df['run'] < 3).astype('int64')
+    df['steady'] = df['warmup'] == 0
+    df['elapsed_sec'] = df['array_size'] * rng.uniform(2e-10, 2e-9, size=rows)
+    df['gflops'] = df['kernel'].map({k: kernel_registry.flops_per_elem(k) for k in kernels}) \
+        * df['array_size'] / df['elapsed_sec'] / 1e9
+    df['freq_mhz'] = rng.normal(3000, 30, size=rows)
+    df['memory_level'] = 'sweep'
+    for col in ('kernel', 'variant', 'type', 'access', 'memory_level', 'source'):
+        df[col] = df[col].astype('category')
+    return df
+
+def legacy_roofline(df):
+    # the per-file, per-row loop plot_roofline ran before config_metrics
+    pts = []
+    for path, g in df.groupby('source', observed=True):
+        valid = g[(g['array_size'] > 0) & (g['elapsed_sec'] > 0) & (g['gflops'] > 0) & g['steady']]
+        ais = []
+        for _, r in valid.iterrows():
+            if not kernel_registry.is_known(r['kernel']):
+                continue
+            bpe = kernel_registry.bytes_per_elem(r['kernel'], r['type'], r['access'], int(r['stride']))
+            ais.append(float(r['gflops']) * 1e9 * float(r['elapsed_sec']) / (int(r['array_size']) * bpe))
+        if ais:
+            pts.append((path, float(np.mean(ais)), float(valid['gflops'].mean())))
+    return pts
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+if __name__ == "__main__":
+    legacy_max = LEGACY_MAX
+    rows_list = []
+    for a in sys.argv[1:]:
+        if a.startswith("--legacy-max="):
+            legacy_max = int(a[len("--legacy-max="):])
+        else:
+            rows_list.append(int(float(a)))
+    rows_list = rows_list or DEFAULT_ROWS
+
+    print(f"{'rows':>10s} {'legacy roofline':>16s} {'roofline':>9s} {'exp2 metrics':>13s} "
+          f"{'exp4 metrics':>13s} {'ns/row':>7s}")
+    for rows in rows_list:
+        df = synthetic_frame(rows)
+        legacy = f"{timed(legacy_roofline, df):15.2f}s" if rows <= legacy_max else f"{'-':>16s}"
+        roof = timed(analyze.csv_roofline_points, df)
+        exp2 = timed(analyze.config_metrics, df, ['variant', 'kernel', 'array_size'])
+        exp4 = timed(analyze.config_metrics, df, ['kernel', 'variant', 'access', 'stride'])
+        print(f"{rows:10d} {legacy} {roof:8.2f}s {exp2:12.2f}s {exp4:12.2f}s {roof / rows * 1e9:7.0f}")
+        del df
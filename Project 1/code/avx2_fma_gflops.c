@@ -1,22 +1,38 @@
 // avx2_fma_gflops.c
 // Compile: gcc -O3 -march=native -mfma avx2_fma_gflops.c -o avx2_fma_gflops
-// Run: sudo ./avx2_fma_gflops 100000000  (iterations)  (pin thread to core as described below)
+// Run: sudo ./avx2_fma_gflops 100000000 [core] [f32|f64]  (iterations)  (pin thread to core as described below)
+// ceilings.py builds and runs this to measure the compute roof per data type.
 
+#ifndef _WIN32
+#define _GNU_SOURCE  // sched_setaffinity
+#endif
 #include <immintrin.h>
 #include <stdio.h>
 #include <stdint.h>
+#include <string.h>
 #include <time.h>
-#include <pthread.h>
-#include <sched.h>
 #include <stdlib.h>
+#ifdef _WIN32
 #include <windows.h>
+#else
+#include <sched.h>
+#endif
 
 static inline void pin_to_core(int core) {
+#ifdef _WIN32
     DWORD_PTR mask = (DWORD_PTR)1 << core;
     HANDLE thread = GetCurrentThread();
     if (SetThreadAffinityMask(thread, mask) == 0) {
         fprintf(stderr, "Failed to set thread affinity\n");
     }
+#else
+    cpu_set_t set;
+    CPU_ZERO(&set);
+    CPU_SET(core, &set);
+    if (sched_setaffinity(0, sizeof(set), &set) != 0) {
+        fprintf(stderr, "Failed to set thread affinity\n");
+    }
+#endif
 }
 
 double now_seconds() {
@@ -25,43 +41,62 @@ double now_seconds() {
     return t.tv_sec + t.tv_nsec * 1e-9;
 }
 
+// Ten independent accumulators: an FMA has ~4 cycles latency and two issue
+// ports, so fewer chains would measure latency instead of throughput.
+// x = x*b + c with b < 1 converges, so nothing overflows or goes denormal.
+#define FMA_LOOP(VEC, SET1, FMADD, STORE, SCALAR, LANES)                          \
+    {                                                                             \
+        VEC b = SET1((SCALAR)0.9999), c = SET1((SCALAR)1e-4);                     \
+        VEC x0 = SET1((SCALAR)1.0), x1 = SET1((SCALAR)1.1), x2 = SET1((SCALAR)1.2), \
+            x3 = SET1((SCALAR)1.3), x4 = SET1((SCALAR)1.4), x5 = SET1((SCALAR)1.5), \
+            x6 = SET1((SCALAR)1.6), x7 = SET1((SCALAR)1.7), x8 = SET1((SCALAR)1.8), \
+            x9 = SET1((SCALAR)1.9);                                               \
+        t0 = now_seconds();                                                       \
+        for (long i = 0; i < iterations; ++i) {                                   \
+            x0 = FMADD(x0, b, c); x1 = FMADD(x1, b, c);                           \
+            x2 = FMADD(x2, b, c); x3 = FMADD(x3, b, c);                           \
+            x4 = FMADD(x4, b, c); x5 = FMADD(x5, b, c);                           \
+            x6 = FMADD(x6, b, c); x7 = FMADD(x7, b, c);                           \
+            x8 = FMADD(x8, b, c); x9 = FMADD(x9, b, c);                           \
+        }                                                                         \
+        t1 = now_seconds();                                                       \
+        /* Prevent optimizer from removing code */                                \
+        SCALAR out[LANES];                                                        \
+        STORE(out, x0 + x1 + x2 + x3 + x4 + x5 + x6 + x7 + x8 + x9);              \
+        sink = (double)out[0];                                                    \
+        lanes = LANES;                                                            \
+    }
+
 int main(int argc, char** argv) {
     if (argc < 2) {
-        printf("usage: %s <iterations> [core]\n", argv[0]);
+        printf("usage: %s <iterations> [core] [f32|f64]\n", argv[0]);
         return 1;
     }
     long iterations = atol(argv[1]);
     int core = (argc >= 3) ? atoi(argv[2]) : 0;
+    const char* type = (argc >= 4) ? argv[3] : "f32";
     pin_to_core(core);
 
-    // We'll keep multiple vector registers live to hide latency.
-    __m256 a = _mm256_set1_ps(1.0f);
-    __m256 b = _mm256_set1_ps(1.0001f);
-    __m256 c = _mm256_set1_ps(0.9999f);
-    __m256 d = _mm256_set1_ps(0.5f);
-
-    // Each _mm256_fmadd_ps does 8 elements * 2 flops = 16 flops.
-    // We'll do 4 fmadds per loop iteration (adjust if you want).
-    const int fmas_per_iter = 4;
-    double t0 = now_seconds();
-    for (long i = 0; i < iterations; ++i) {
-        a = _mm256_fmadd_ps(b, c, a); // 16 flops
-        b = _mm256_fmadd_ps(c, d, b); // 16 flops
-        c = _mm256_fmadd_ps(d, a, c); // 16 flops
-        d = _mm256_fmadd_ps(a, b, d); // 16 flops
+    const int fmas_per_iter = 10;
+    double t0, t1;
+    volatile double sink;
+    int lanes;
+    if (strcmp(type, "f64") == 0) {
+        // Each _mm256_fmadd_pd does 4 elements * 2 flops = 8 flops.
+        FMA_LOOP(__m256d, _mm256_set1_pd, _mm256_fmadd_pd, _mm256_storeu_pd, double, 4)
+    } else if (strcmp(type, "f32") == 0) {
+        // Each _mm256_fmadd_ps does 8 elements * 2 flops = 16 flops.
+        FMA_LOOP(__m256, _mm256_set1_ps, _mm256_fmadd_ps, _mm256_storeu_ps, float, 8)
+    } else {
+        fprintf(stderr, "unknown type %s (f32 or f64)\n", type);
+        return 1;
     }
-    double t1 = now_seconds();
-
-    // Prevent optimizer from removing code
-    float out[8];
-    _mm256_storeu_ps(out, a);
-    volatile float sink = out[0];
 
     double secs = t1 - t0;
-    long long total_flops = (long long)iterations * fmas_per_iter * 16; // 16 flops per 256-bit FMA
+    long long total_flops = (long long)iterations * fmas_per_iter * lanes * 2;
     double gflops = (double)total_flops / secs / 1e9;
 
-    printf("iters=%ld time=%.6f s GFLOPS=%.2f (core=%d)\n", iterations, secs, gflops, core);
-    if (sink == 0.0f) printf(""); // keep sink used
+    printf("iters=%ld time=%.6f s GFLOPS=%.2f (core=%d type=%s)\n", iterations, secs, gflops, core, type);
+    if (sink == 0.0) printf("\n"); // keep sink used
     return 0;
 }
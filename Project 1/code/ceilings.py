@@ -0,0 +1,127 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import subprocess
+import hostinfo
+
+# -------------------------------
+# Roofline ceilings
+# -------------------------------
+# Measured roofs of the machine, replacing the hardcoded peak and DRAM
+# bandwidth of the roofline plot:
+#   compute  avx2_fma_gflops.c: FMA throughput per data type (f32, f64)
+#   memory   stream_bw.c: STREAM copy/triad bandwidth with the working set
+#            at half of L1, L2 and L3, and at pro1's DRAM working set
+# Both run pinned to one core, like pro1 under tester.py. Results are kept in
+# ceilings.json per host (hostname and CPU model), so calibration runs once
+# per machine: `python ceilings.py [--force]`. analyze.py draws one memory
+# roof per level and judges each point against the level it ran in.
+
+CEILINGS_NAME = "ceilings.json"
+FMA_SOURCE, FMA_EXE = "avx2_fma_gflops.c", "avx2_fma_gflops"
+STREAM_SOURCE, STREAM_EXE = "stream_bw.c", "stream_bw"
+BUILD_FLAGS = ["gcc", "-O3", "-march=native", "-mfma"]
+
+FMA_TYPES = ("f32", "f64")
+FMA_ITERATIONS = 200_000_000
+FMA_REPEATS = 3  # best of
+LEVEL_FRACTION = 0.5  # cache levels are measured at this fraction of their capacity
+
+# roofs by level, and the roof each pro1 memory level is judged against
+ROOF_LEVELS = ("l1", "l2", "l3", "dram")
+LEVEL_ROOF = {"l1small": "l1", "l1large": "l1", "l2": "l2", "l3": "l3", "dram": "dram"}
+
+def host_key():
+    return f"{socket.gethostname()} | {hostinfo.cpu_model()}"
+
+def build(source, exe):
+    """Compile a probe unless its binary is newer than the source; returns the command prefix to run it."""
+    if not os.path.exists(exe) or os.path.getmtime(exe) < os.path.getmtime(source):
+        cmd = BUILD_FLAGS + [source, "-o", exe]
+        print(f"building with: {cmd}")
+        subprocess.run(cmd, check=True)
+    return os.path.join(".", exe)
+
+def stream_sizes(caches=None):
+    """Working-set bytes per roof level."""
+    caches = caches or hostinfo.cache_sizes()
+    sizes = {f"l{n}": int(caches[f"L{n}"] * LEVEL_FRACTION) for n in (1, 2, 3)}
+    sizes["dram"] = hostinfo.working_sets(caches)["dram"]
+    return sizes
+
+def measure_peak(exe, dtype, core=0):
+    """Best FMA GFLOP/s over FMA_REPEATS runs."""
+    best = 0.0
+    for _ in range(FMA_REPEATS):
+        out = subprocess.run([exe, str(FMA_ITERATIONS), str(core), dtype], capture_output=True, text=True,
+                             check=True).stdout
+        m = re.search(r"GFLOPS=([\d.]+)", out)
+        if m:
+            best = max(best, float(m.group(1)))
+    return best
+
+def measure_bandwidth(exe, sizes, core=0):
+    """level -> {bytes, copy_gib, triad_gib} (GiB/s) from one stream_bw run."""
+    levels = list(sizes)
+    out = subprocess.run([exe, f"--core={core}"] + [str(sizes[lvl]) for lvl in levels], capture_output=True,
+                         text=True, check=True).stdout
+    result = {}
+    for lvl, line in zip(levels, out.splitlines()):
+        fields = dict(kv.split("=", 1) for kv in line.split())
+        result[lvl] = {"bytes": int(fields["bytes"]),
+                       "copy_gib": float(fields["copy_gbs"]) * 1e9 / (1024**3),
+                       "triad_gib": float(fields["triad_gbs"]) * 1e9 / (1024**3)}
+    return result
+
+def calibrate(core=0):
+    fma = build(FMA_SOURCE, FMA_EXE)
+    stream = build(STREAM_SOURCE, STREAM_EXE)
+    caches = hostinfo.cache_sizes()
+    peaks = {}
+    for dtype in FMA_TYPES:
+        peaks[dtype] = measure_peak(fma, dtype, core)
+        print(f"peak {dtype}: {peaks[dtype]:.2f} GFLOP/s")
+    bandwidth = measure_bandwidth(stream, stream_sizes(caches), core)
+    for lvl, bw in bandwidth.items():
+        print(f"{lvl:5s} ({bw['bytes'] // 1024} KiB): copy {bw['copy_gib']:.2f} GiB/s, triad {bw['triad_gib']:.2f} GiB/s")
+    return {"host": host_key(), "measured": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "caches": caches,
+            "peak_gflops": peaks, "bandwidth": bandwidth}
+
+def load_all(path=CEILINGS_NAME):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def get(force=False, measure=True, path=CEILINGS_NAME):
+    """This host's ceilings: cached in ceilings.json, measured (and saved) when missing or forced.
+
+    Returns None when nothing is cached and measure is False.
+    """
+    stored = load_all(path)
+    key = host_key()
+    if key in stored and not force:
+        return stored[key]
+    if not measure:
+        return None
+    stored[key] = calibrate()
+    with open(path, "w") as f:
+        json.dump(stored, f, indent=2)
+    return stored[key]
+
+def peak_for(ceil, dtype):
+    # compute roof for a data type; i32 has no FMA probe, so it is held to the f32 roof
+    peaks = ceil["peak_gflops"]
+    return peaks.get(dtype, peaks.get("f32"))
+
+if __name__ == "__main__":
+    ceil = get(force="--force" in sys.argv[1:])
+    print(f"{ceil['host']} (measured {ceil['measured']})")
+    for dtype, peak in ceil["peak_gflops"].items():
+        print(f"  compute {dtype}: {peak:8.2f} GFLOP/s")
+    for lvl in ROOF_LEVELS:
+        bw = ceil["bandwidth"][lvl]
+        print(f"  {lvl:5s} copy {bw['copy_gib']:7.2f} GiB/s  triad {bw['triad_gib']:7.2f} GiB/s")
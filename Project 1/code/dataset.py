@@ -0,0 +1,194 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+# -------------------------------
+# Dataset
+# -------------------------------
+# Typed, cached access to pro1 CSVs for analyze.py. Each CSV is parsed once
+# into a frame with
+#   - categorical kernel/type/access/memory_level/variant/source columns
+#     (variant is the file name's first token, source the CSV path),
+#   - integer configuration columns and float timings (inf/NaN timings -> 0),
+#   - steady: the sample is neither flagged as warmup by pro1 nor part of a
+#     warm-up detected in its series (see detect_warmup).
+# A folder's parsed frame is kept in CACHE_NAME inside it together with each
+# CSV's mtime and size; later loads only re-parse the files that changed (and
+# drop the rows of deleted ones). The cache stores source as the bare file name
+# and each load spells it out under exp_dir as passed, so a folder cached from
+# one working directory loads correctly from another. Within one process every
+# folder is loaded once.
+
+CACHE_NAME = "dataset_cache.pkl"
+CACHE_VERSION = 3  # bump when the parsed layout changes
+
+CATEGORY_COLUMNS = ("kernel", "type", "access", "memory_level")
+INT_COLUMNS = ("run", "array_size", "aligned", "tail", "stride", "warmup", "samples", "reps", "freq_drift")
+TIMING_COLUMNS = ("elapsed_sec", "gflops")
+
+_loaded = {}  # folder -> (signature, frame)
+
+def is_pro1_csv(path):
+    with open(path) as f:
+        return f.readline().startswith("kernel,run,")
+
+def signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def parse_csv(path):
+    """One pro1 CSV as a typed frame (see the section comment for its columns)."""
+    df = pd.read_csv(path)
+    for col in TIMING_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").replace([np.inf, -np.inf], 0).fillna(0)
+    for col in INT_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            df[col] = values.astype("int64") if values.notna().all() else values
+    for col in ("timestamp", "freq_mhz"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["steady"] = steady_samples(df)
+    df["variant"] = os.path.basename(path).split("_")[0]
+    df["source"] = path
+    for col in CATEGORY_COLUMNS + ("variant", "source"):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+# -------------------------------
+# Warm-up detection
+# -------------------------------
+# A series is one (kernel, array_size) configuration of a CSV in run order. Its
+# warm-up is a single upward shift in GFLOP/s (cold caches and TLB, clock ramp)
+# found by a two-segment least-squares split of the samples' robust z-scores
+# (distance from the series median in MADs, clipped at +-HUBER_CLIP so one
+# extreme sample cannot dominate): the split after k samples is accepted when
+# the first k are slower than the rest and
+#   n * log(SSE_whole / (SSE_first_k + SSE_rest)) > CHANGEPOINT_PENALTY * log(n)
+# (a BIC-style penalty), with k at most WARMUP_MAX_FRACTION of a series of at
+# least MIN_SERIES samples. One slow sample in the middle of a series does not
+# pass; it is left to the robust statistics of analyze.py. Every series of a
+# frame is scored at once from cumulative sums.
+
+SERIES_COLUMNS = ("kernel", "array_size", "access", "stride")
+CHANGEPOINT_PENALTY = 3.0
+HUBER_CLIP = 3.0
+WARMUP_MAX_FRACTION = 0.5
+MIN_SERIES = 6
+
+def detect_warmup(df, value="gflops", by=()):
+    """Boolean array over df's rows: True for the samples before each series' detected change point.
+
+    Series are also split by the `by` columns (run_id for frames holding several runs).
+    """
+    warm = np.zeros(len(df), dtype=bool)
+    if df.empty:
+        return warm
+    keys = [c for c in SERIES_COLUMNS + tuple(by) if c in df.columns]
+    codes = df.groupby(keys, sort=False, observed=True, dropna=False).ngroup().to_numpy()
+    order = np.argsort(codes, kind="stable")  # series by series, each in file (run) order
+    g = codes[order]
+    counts = np.bincount(g)
+    start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    n = counts[g].astype(float)
+    k = np.arange(len(g)) - start[g] + 1.0  # samples before a split after this one
+
+    def series_median(values):
+        s = values[np.lexsort((values, g))]
+        return ((s[start + (counts - 1) // 2] + s[start + counts // 2]) / 2)[g]
+
+    v = df[value].to_numpy(dtype=float)[order]
+    dev = v - series_median(v)
+    mad = series_median(np.abs(dev)) * 1.4826  # ~ standard deviation for normal noise
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.clip(np.where(mad > 0, dev / mad, 0.0), -HUBER_CLIP, HUBER_CLIP)
+
+    s1, s2 = np.cumsum(x), np.cumsum(x * x)
+    base1, base2 = np.concatenate(([0.0], s1))[start][g], np.concatenate(([0.0], s2))[start][g]
+    p1, p2 = s1 - base1, s2 - base2  # sums over the first k samples of the series
+    end = start + counts - 1
+    t1, t2 = p1[end[g]], p2[end[g]]  # sums over the whole series
+    rest = n - k
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sse_split = np.maximum(p2 - p1 * p1 / k, 0) + np.maximum((t2 - p2) - (t1 - p1) ** 2 / rest, 0)
+        sse_whole = np.maximum(t2 - t1 * t1 / n, 0)
+        score = n * np.log(sse_whole / sse_split)
+        slower = p1 / k < (t1 - p1) / rest
+    ok = (k <= np.floor(n * WARMUP_MAX_FRACTION)) & (n >= MIN_SERIES) & (rest > 0) & (sse_whole > 0) & slower
+    score = np.where(ok, np.nan_to_num(score, nan=-np.inf), -np.inf)
+
+    best = np.maximum.reduceat(score, start)
+    split = np.minimum.reduceat(np.where(score == best[g], k, np.inf), start)  # first best split per series
+    split = np.where(best > CHANGEPOINT_PENALTY * np.log(counts), split, 0)
+    warm[order] = k <= split[g]
+    return warm
+
+def steady_samples(df, by=()):
+    """Boolean array over df's rows (in run order): pro1's warmup flag (absent in older CSVs), then a
+    detected warm-up among the remaining samples."""
+    steady = (df["warmup"] == 0).to_numpy(copy=True) if "warmup" in df.columns else np.ones(len(df), dtype=bool)
+    steady[steady] = ~detect_warmup(df[steady], by=by)
+    return steady
+
+def load_dir(exp_dir):
+    """Every pro1 CSV directly inside exp_dir as one frame (None when there are none)."""
+    files = sorted(f for f in os.listdir(exp_dir) if f.endswith(".csv"))
+    sig = tuple((f,) + signature(os.path.join(exp_dir, f)) for f in files)
+    if exp_dir in _loaded and _loaded[exp_dir][0] == sig:
+        return _loaded[exp_dir][1]
+
+    cache_path = os.path.join(exp_dir, CACHE_NAME)
+    stored = {"signatures": {}, "frame": None}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") == CACHE_VERSION:
+                stored = data
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass  # unreadable cache: rebuild it
+
+    # keep the cached rows of unchanged files, parse the rest
+    signatures = {fname: (mtime, size) for fname, mtime, size in sig}
+    stale = [f for f in signatures if stored["signatures"].get(f) != signatures[f]]
+    gone = [f for f in stored["signatures"] if f not in signatures]
+    df = stored["frame"]
+    if df is not None:
+        df = df.assign(source=df["source"].cat.rename_categories(lambda f: os.path.join(exp_dir, f)))
+    if stale or gone:
+        if df is not None:
+            drop = {os.path.join(exp_dir, f) for f in stale + gone}
+            df = df[~df["source"].isin(drop)]
+            df = df.assign(source=df["source"].cat.remove_unused_categories())
+        parsed = [parse_csv(os.path.join(exp_dir, f)) for f in stale if is_pro1_csv(os.path.join(exp_dir, f))]
+        df = concat([df] + parsed)
+        try:
+            with open(cache_path, "wb") as f:
+                cached = df.assign(source=df["source"].cat.rename_categories(os.path.basename)) \
+                    if df is not None else None
+                pickle.dump({"version": CACHE_VERSION, "signatures": signatures, "frame": cached}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass  # read-only results folder: parse again next time
+
+    _loaded[exp_dir] = (sig, df)
+    return df
+
+def load_tree(root):
+    """load_dir over root and every folder below it."""
+    return concat([load_dir(d) for d, _, files in sorted(os.walk(root)) if any(f.endswith(".csv") for f in files)])
+
+def concat(frames):
+    """Concatenate parsed frames, keeping the categorical columns categorical
+    (pd.concat falls back to object columns when the categories differ)."""
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    for col in CATEGORY_COLUMNS + ("variant", "source"):
+        if col in df.columns and df[col].dtype != "category":
+            df[col] = df[col].astype("category")
+    return df
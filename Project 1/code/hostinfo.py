@@ -0,0 +1,162 @@
+import os
+import json
+
+# -------------------------------
+# Cache topology
+# -------------------------------
+# Cache sizes of the machine the benchmarks run on, read from
+# /sys/devices/system/cpu/cpu<N>/cache/index*/ (Linux). They replace the
+# hardcoded L1/L2/L3 constants:
+#   - tester.py passes them to pro1 as --l1=/--l1large=/--l2=/--l3=/--dram=
+#     working-set targets and saves them as hostinfo.json next to the CSVs,
+#   - kernel_base.py sizes its memory levels and sweep from them,
+#   - analyze.py draws its cache-boundary lines from the hostinfo.json of an
+#     experiment folder (or this machine when there is none).
+# Without sysfs (Windows, containers hiding it) the old constants are used.
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+HOSTINFO_NAME = "hostinfo.json"
+
+# the values pro1.cpp was written for
+DEFAULT_CACHES = {"L1": 32 * 1024, "L2": 512 * 1024, "L3": 8 * 1024 * 1024}
+DEFAULT_CORES = 6
+
+SWEEP_ARRAYS = 2  # arrays in the working set, as in pro1 choose_N(level, 2)
+# sweep points per boundary, as fractions of the cache size
+SWEEP_FRACTIONS = (0.25, 0.5, 0.8, 1.0, 1.25, 2.0)
+
+def parse_size(text):
+    """'48K' / '2048K' / '1M' / '32768' -> bytes."""
+    text = text.strip().upper()
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+def detect_caches(cpu=0):
+    """Data/unified cache sizes in bytes keyed L1/L2/L3, as seen by one CPU (None without sysfs)."""
+    base = os.path.join(SYSFS_CPU, f"cpu{cpu}", "cache")
+    if not os.path.isdir(base):
+        return None
+    caches = {}
+    for entry in sorted(os.listdir(base)):
+        path = os.path.join(base, entry)
+        if not entry.startswith("index"):
+            continue
+        try:
+            with open(os.path.join(path, "type")) as f:
+                kind = f.read().strip()
+            with open(os.path.join(path, "level")) as f:
+                level = int(f.read())
+            with open(os.path.join(path, "size")) as f:
+                size = parse_size(f.read())
+        except (OSError, ValueError):
+            continue
+        if kind != "Instruction":
+            caches[f"L{level}"] = size
+    return caches or None
+
+def physical_core_count():
+    """Distinct (package, core) pairs in sysfs; os.cpu_count() otherwise."""
+    cores = set()
+    try:
+        cpus = [d for d in os.listdir(SYSFS_CPU) if d[3:].isdigit() and d.startswith("cpu")]
+    except OSError:
+        return os.cpu_count() or DEFAULT_CORES
+    for cpu in cpus:
+        topo = os.path.join(SYSFS_CPU, cpu, "topology")
+        try:
+            with open(os.path.join(topo, "physical_package_id")) as f:
+                package = f.read().strip()
+            with open(os.path.join(topo, "core_id")) as f:
+                cores.add((package, f.read().strip()))
+        except OSError:
+            continue
+    return len(cores) or os.cpu_count() or DEFAULT_CORES
+
+def cache_sizes():
+    """L1/L2/L3 bytes of this machine, filling any level sysfs does not report with the defaults."""
+    return dict(DEFAULT_CACHES, **(detect_caches() or {}))
+
+def working_sets(caches=None, cores=None):
+    """Working-set targets (bytes) for pro1's memory levels.
+
+    l1large keeps its original meaning (every core's L1 together) and dram is
+    at least 1 GiB and 8x the last-level cache.
+    """
+    caches = caches or cache_sizes()
+    cores = cores or physical_core_count()
+    return {
+        "l1small": caches["L1"],
+        "l1large": caches["L1"] * cores,
+        "l2": caches["L2"],
+        "l3": caches["L3"],
+        "dram": max(1 << 30, 8 * caches["L3"]),
+    }
+
+def sweep_sizes(itemsize, caches=None, num_arrays=SWEEP_ARRAYS):
+    """Array lengths N for a working-set sweep: points around each cache boundary plus one in DRAM."""
+    caches = caches or cache_sizes()
+    per_elem = itemsize * num_arrays
+    points = {1024}
+    for size in caches.values():
+        points.update(int(size * f) // per_elem for f in SWEEP_FRACTIONS)
+    points.add(4 * max(caches.values()) // per_elem)
+    return sorted(p for p in points if p > 0)
+
+def pro1_flags(sets=None):
+    """pro1 options carrying this machine's working-set targets (left out of its CSV name)."""
+    sets = sets or working_sets()
+    names = {"l1small": "l1", "l1large": "l1large", "l2": "l2", "l3": "l3", "dram": "dram"}
+    return [f"--{names[level]}={size}" for level, size in sets.items()]
+
+# -------------------------------
+# Host metadata
+# -------------------------------
+def cpu_model():
+    """CPU model name from /proc/cpuinfo, else whatever platform reports."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    import platform
+    return platform.processor() or platform.machine() or "unknown"
+
+def governor(cpu=0):
+    """cpufreq scaling governor of one CPU ("unknown" when cpufreq is not exposed)."""
+    try:
+        with open(os.path.join(SYSFS_CPU, f"cpu{cpu}", "cpufreq", "scaling_governor")) as f:
+            return f.read().strip()
+    except OSError:
+        return "unknown"
+
+# -------------------------------
+# hostinfo.json
+# -------------------------------
+def describe():
+    return {"caches": cache_sizes(), "cores": physical_core_count(), "working_sets": working_sets(),
+            "cpu_model": cpu_model(), "governor": governor()}
+
+def write_json(path=HOSTINFO_NAME):
+    with open(path, "w") as f:
+        json.dump(describe(), f, indent=2)
+    return path
+
+def load_caches(exp_dir="."):
+    """Cache sizes recorded with an experiment's CSVs, or this machine's when none were saved."""
+    path = os.path.join(exp_dir, HOSTINFO_NAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["caches"]
+    return cache_sizes()
+
+if __name__ == "__main__":
+    info = describe()
+    for level, size in info["caches"].items():
+        print(f"{level}: {size // 1024} KiB")
+    print(f"physical cores: {info['cores']} ({info['cpu_model']}, governor {info['governor']})")
+    print("pro1 flags:", " ".join(pro1_flags(info["working_sets"])))
+    print("f32 sweep N:", sweep_sizes(4))
@@ -1,5 +1,12 @@
+import os
+import sys
+import time
+import json
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
 import matplotlib.pyplot as plt
+from kernel_registry import KERNELS, get_kernel, flops_per_elem, bytes_per_elem
+import hostinfo
 
 # -------------------------------
 # Utility function
@@ -8,53 +15,348 @@ def relative_error(reference, result, eps=1e-12):
     """Compute relative error between reference and result arrays."""
     return np.linalg.norm(reference - result) / (np.linalg.norm(reference) + eps)
 
+# -------------------------------
+# Access patterns (mirrors pro1.cpp)
+# -------------------------------
+# Same flags pro1.cpp accepts; parse_access() turns them into the
+# (access, stride) pair that pro1.cpp writes to its CSV rows.
+ACCESS_PATTERNS = ["--unit-stride", "--stride=2", "--stride=4", "--stride=8",
+                   "--gather=2", "--gather=4", "--gather=8"]
+
+# pro1.cpp type names -> NumPy dtypes
+DTYPES = {"f32": np.float32, "f64": np.float64, "i32": np.int32}
+
+def parse_access(arg):
+    """Map a pro1.cpp access flag to (access, stride), e.g. '--stride=4' -> ('strided', 4)."""
+    if arg in ("--unit-stride", "unit-stride"):
+        return "unit-stride", 1
+    if arg.startswith("--stride="):
+        return "strided", int(arg[len("--stride="):])
+    if arg.startswith("--gather="):
+        return "gather", int(arg[len("--gather="):])
+    raise ValueError(f"unknown access pattern: {arg}")
+
+def make_gather_indices(N, stride):
+    # Same index stream as make_gather_indices() in pro1.cpp: (i * stride) % N
+    return (np.arange(N, dtype=np.intp) * stride) % N
+
+def kernel_impl(name, kind):
+    """This module's implementation of a registry kernel (reference, scalar, vectorized, parallel or streaming)."""
+    fn_name = get_kernel(name)[kind]
+    if fn_name is None:
+        raise KeyError(f"{name} has no {kind} implementation")
+    return globals()[fn_name]
+
+def kernel_args(name, values):
+    """Positional arguments for a registry kernel: `values` by name, else the registry constants."""
+    values = dict(get_kernel(name)["constants"], **values)
+    return tuple(values[arg] for arg in get_kernel(name)["args"])
+
+def make_inputs(array_size, type_name="f64", seed=0, count=3):
+    """Random x, y, z input arrays of a pro1.cpp type (f32, f64 or i32); count=2 skips z."""
+    rng = np.random.default_rng(seed)
+    dtype = DTYPES[type_name]
+    if np.issubdtype(dtype, np.integer):
+        return tuple(rng.integers(0, 10, array_size, dtype=dtype) for _ in range(count))
+    return tuple(rng.random(array_size, dtype=dtype) for _ in range(count))
+
 # -------------------------------
 # Kernel implementations
 # -------------------------------
+# The scalar kernels are element-by-element ports of the loops in pro1.cpp,
+# including the strided and gather variants; they are the oracle for the
+# vectorized engine below.
+#
+# Every kernel with an array result takes an optional caller-owned `out`
+# buffer. With out=None a new array is returned as before; otherwise the
+# result is written into `out` (and returned), elements the access pattern
+# does not visit keep their previous contents, and SAXPY may pass out=y to
+# update y in place exactly like pro1.cpp does.
+
+def _saxpy_out(y, out):
+    if out is None:
+        return y.copy()
+    if out is not y:
+        np.copyto(out, y)
+    return out
 
-def saxpy_scalar(a, x, y):
-    y_out = y.copy()
-    for i in range(len(x)):
-        y_out[i] = a * x[i] + y_out[i]
+def _check_stencil_out(x, out):
+    # any overlap (out=x, out=x[1:], ...) would feed updated values back into the stencil
+    if out is not None and np.shares_memory(x, out):
+        raise ValueError("stencil output buffer must not overlap its input")
+
+def saxpy_scalar(a, x, y, access="unit-stride", stride=1, gather_idx=None, out=None):
+    a = x.dtype.type(a)
+    y_out = _saxpy_out(y, out)
+    if access == "unit-stride":
+        for i in range(len(x)):
+            y_out[i] = a * x[i] + y_out[i]
+    elif access == "strided":
+        for i in range(0, len(x), stride):
+            y_out[i] = a * x[i] + y_out[i]
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(len(x), stride)
+        for idx in gather_idx:
+            y_out[idx] = a * x[idx] + y_out[idx]
     return y_out
 
-def saxpy_reference(a, x, y):
-    return a * x + y
+def saxpy_reference(a, x, y, out=None):
+    if out is None:
+        return a * x + y
+    y_out = _saxpy_out(y, out)
+    y_out += a * x
+    return y_out
 
-def dot_scalar(x, y):
+def dot_scalar(x, y, access="unit-stride", stride=1, gather_idx=None):
     s = 0.0
-    for i in range(len(x)):
-        s += x[i] * y[i]
+    if access == "unit-stride":
+        for i in range(len(x)):
+            s += x[i] * y[i]
+    elif access == "strided":
+        for i in range(0, len(x), stride):
+            s += x[i] * y[i]
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(len(x), stride)
+        for idx in gather_idx:
+            s += x[idx] * y[idx]
     return s
 
 def dot_reference(x, y):
     return np.dot(x, y)
 
-def elemwise_mul_scalar(x, y):
-    z = np.empty_like(x)
-    for i in range(len(x)):
-        z[i] = x[i] * y[i]
+def elemwise_mul_scalar(x, y, access="unit-stride", stride=1, gather_idx=None, out=None):
+    if access == "unit-stride":
+        z = np.empty_like(x) if out is None else out
+        for i in range(len(x)):
+            z[i] = x[i] * y[i]
+        return z
+    # strided/gather only write the visited elements
+    z = np.zeros_like(x) if out is None else out
+    if access == "strided":
+        for i in range(0, len(x), stride):
+            z[i] = x[i] * y[i]
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(len(x), stride)
+        for idx in gather_idx:
+            z[idx] = x[idx] * y[idx]
     return z
 
-def elemwise_mul_reference(x, y):
-    return x * y
+def elemwise_mul_reference(x, y, out=None):
+    return np.multiply(x, y, out=out)
 
-def stencil3_scalar(a, b, c, x):
+def stencil3_scalar(a, b, c, x, access="unit-stride", stride=1, gather_idx=None, out=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
     N = len(x)
-    y = np.zeros_like(x)
-    for i in range(N):
-        xm1 = x[i-1] if i > 0 else 0.0
-        xp1 = x[i+1] if i < N-1 else 0.0
-        y[i] = a*xm1 + b*x[i] + c*xp1
+    y = np.zeros_like(x) if out is None else out
+    if access == "unit-stride":
+        for i in range(N):
+            xm1 = x[i-1] if i > 0 else 0.0
+            xp1 = x[i+1] if i < N-1 else 0.0
+            y[i] = a*xm1 + b*x[i] + c*xp1
+    elif access == "strided":
+        # pro1.cpp: idx = i*stride for i in [1, N-1), interior points only
+        for idx in range(stride, N-1, stride):
+            y[idx] = a*x[idx-1] + b*x[idx] + c*x[idx+1]
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(N, stride)
+        for i in range(1, N-1):
+            idx = gather_idx[i]
+            if 0 < idx < N-1:
+                y[idx] = a*x[idx-1] + b*x[idx] + c*x[idx+1]
     return y
 
-def stencil3_reference(a, b, c, x):
-    y = np.zeros_like(x)
+def stencil3_reference(a, b, c, x, out=None):
+    _check_stencil_out(x, out)
+    y = np.zeros_like(x) if out is None else out
     y[0] = b*x[0] + c*x[1]
     y[-1] = a*x[-2] + b*x[-1]
     y[1:-1] = a*x[:-2] + b*x[1:-1] + c*x[2:]
     return y
 
+# -------------------------------
+# Vectorized engine
+# -------------------------------
+# Whole-array NumPy versions of the kernels above. Unit-stride and strided
+# access use slices (views, no index arrays); gather uses the same
+# (i * stride) % N index stream as pro1.cpp. When an `out` buffer is given,
+# unit-stride and strided calls run in BLOCK-element pieces with out= ufuncs
+# and one BLOCK-sized temporary, so no N-sized array is allocated; gather
+# still materializes the gathered operands.
+BLOCK = 32 * 1024
+
+def _axpy_into(a, x, y, tmp):
+    # y += a * x, one block at a time
+    for lo in range(0, len(x), BLOCK):
+        hi = min(lo + BLOCK, len(x))
+        t = tmp[:hi - lo]
+        np.multiply(x[lo:hi], a, out=t)
+        np.add(y[lo:hi], t, out=y[lo:hi])
+
+def _stencil3_into(a, b, c, x, y, start, end, tmp):
+    # y[i] = a*x[i-1] + b*x[i] + c*x[i+1] for interior i in [start, end)
+    start, end = max(start, 1), min(end, len(x) - 1)
+    for lo in range(start, end, BLOCK):
+        hi = min(lo + BLOCK, end)
+        t = tmp[:hi - lo]
+        np.multiply(x[lo-1:hi-1], a, out=y[lo:hi])
+        np.multiply(x[lo:hi], b, out=t)
+        np.add(y[lo:hi], t, out=y[lo:hi])
+        np.multiply(x[lo+1:hi+1], c, out=t)
+        np.add(y[lo:hi], t, out=y[lo:hi])
+
+def saxpy_vectorized(a, x, y, access="unit-stride", stride=1, gather_idx=None, out=None):
+    a = x.dtype.type(a)
+    if out is None and access == "unit-stride":
+        y_out = a * x
+        y_out += y
+        return y_out
+    y_out = _saxpy_out(y, out)
+    if access == "unit-stride":
+        _axpy_into(a, x, y_out, np.empty(BLOCK, dtype=x.dtype))
+    elif access == "strided":
+        _axpy_into(a, x[::stride], y_out[::stride], np.empty(BLOCK, dtype=x.dtype))
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(len(x), stride)
+        # repeated indices must accumulate like the sequential C++ loop
+        np.add.at(y_out, gather_idx, a * x[gather_idx])
+    return y_out
+
+def dot_vectorized(x, y, access="unit-stride", stride=1, gather_idx=None):
+    if access == "unit-stride":
+        return np.dot(x, y)
+    if access == "strided":
+        return np.dot(x[::stride], y[::stride])
+    if gather_idx is None:
+        gather_idx = make_gather_indices(len(x), stride)
+    return np.dot(x[gather_idx], y[gather_idx])
+
+def elemwise_mul_vectorized(x, y, access="unit-stride", stride=1, gather_idx=None, out=None):
+    if access == "unit-stride":
+        return np.multiply(x, y, out=out)
+    z = np.zeros_like(x) if out is None else out
+    if access == "strided":
+        np.multiply(x[::stride], y[::stride], out=z[::stride])
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(len(x), stride)
+        z[gather_idx] = x[gather_idx] * y[gather_idx]
+    return z
+
+def stencil3_vectorized(a, b, c, x, access="unit-stride", stride=1, gather_idx=None, out=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
+    N = len(x)
+    if access == "unit-stride":
+        if out is None:
+            return stencil3_reference(a, b, c, x)
+        _stencil3_into(a, b, c, x, out, 0, N, np.empty(BLOCK, dtype=x.dtype))
+        out[0] = b*x[0] + c*x[1]
+        out[-1] = a*x[-2] + b*x[-1]
+        return out
+    y = np.zeros_like(x) if out is None else out
+    if access == "strided":
+        s = stride
+        ys = y[s:N-1:s]
+        np.multiply(x[s-1:N-2:s], a, out=ys)
+        t = np.multiply(x[s:N-1:s], b)
+        np.add(ys, t, out=ys)
+        np.multiply(x[s+1:N:s], c, out=t)
+        np.add(ys, t, out=ys)
+    elif access == "gather":
+        if gather_idx is None:
+            gather_idx = make_gather_indices(N, stride)
+        idx = gather_idx[1:N-1]
+        idx = idx[(idx > 0) & (idx < N-1)]
+        y[idx] = a*x[idx-1] + b*x[idx] + c*x[idx+1]
+    return y
+
+# -------------------------------
+# Multi-step stencil
+# -------------------------------
+# Apply the 3-point stencil `steps` times with fixed boundary values (x[0]
+# and x[-1] never change), matching stencil_multistep_* in pro1.cpp. The
+# naive version sweeps the whole array once per step; the blocked version
+# uses overlapped (ghost-zone) tiles that stay resident in L2 for all steps.
+
+def stencil3_multistep_reference(a, b, c, x, steps):
+    y = x.copy()
+    for _ in range(steps):
+        y[1:-1] = a*y[:-2] + b*y[1:-1] + c*y[2:]
+    return y
+
+def stencil3_multistep_naive(a, b, c, x, steps, out=None, scratch=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
+    N = len(x)
+    y = np.empty_like(x) if out is None else out
+    scratch = np.empty_like(x) if scratch is None else scratch
+    tmp = np.empty(BLOCK, dtype=x.dtype)
+    src = x
+    for t in range(steps):
+        # pick the destination so the last step lands in y
+        dst = y if (steps - 1 - t) % 2 == 0 else scratch
+        dst[0], dst[-1] = src[0], src[-1]
+        _stencil3_into(a, b, c, src, dst, 0, N, tmp)
+        src = dst
+    return y
+
+def stencil3_multistep_blocked(a, b, c, x, steps, tile=None, out=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
+    N = len(x)
+    tile = tile or MEMORY_LEVELS["l2"] // (4 * x.dtype.itemsize)  # two tile buffers in half of L2
+    y = np.empty_like(x) if out is None else out
+    buf0, buf1 = np.empty(tile + 2 * steps, dtype=x.dtype), np.empty(tile + 2 * steps, dtype=x.dtype)
+    tmp = np.empty(BLOCK, dtype=x.dtype)
+    for lo in range(0, N, tile):
+        hi = min(lo + tile, N)
+        glo, ghi = max(lo - steps, 0), min(hi + steps, N)
+        w = ghi - glo
+        src, dst = buf0[:w], buf1[:w]
+        src[:] = x[glo:ghi]
+        dst[:] = src
+        for s in range(1, steps + 1):
+            # global boundaries stay fixed; interior tile edges lose one point per step
+            left = 1 if glo == 0 else s
+            right = w - 1 if ghi == N else w - s
+            _stencil3_into(a, b, c, src, dst, left, right, tmp)
+            src, dst = dst, src
+        y[lo:hi] = src[lo - glo:hi - glo]
+    return y
+
+# -------------------------------
+# Buffer pool
+# -------------------------------
+class BufferPool:
+    """Named, reusable output buffers for repeated-run loops.
+
+    get() allocates (aligned or deliberately misaligned) and first-touches a
+    buffer the first time a name is requested with a given size and dtype,
+    then hands back the same array on every later call, so timed runs pay
+    neither allocation nor page faults.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, N, dtype, aligned=True):
+        dtype = np.dtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is None or len(buf) != N or buf.dtype != dtype:
+            buf = aligned_array(N, dtype, aligned)
+            buf.fill(0)  # fault the pages in now, outside any timed region
+            self._buffers[name] = buf
+        return buf
+
+    def clear(self):
+        self._buffers.clear()
+
 # -------------------------------
 # Test and plot function
 # -------------------------------
@@ -66,12 +368,9 @@ def run_kernel_tests(array_size=5000, runs=10, tolerance=1e-12):
     z = np.random.rand(array_size).astype(np.float64)  # for elemwise or stencil
     a, b, c = 1.1, 2.2, 3.3
 
-    kernels = [
-        ("SAXPY", saxpy_scalar, saxpy_reference, (a, x, y)),
-        ("Dot Product", dot_scalar, dot_reference, (x, y)),
-        ("Elementwise Multiply", elemwise_mul_scalar, elemwise_mul_reference, (x, y)),
-        ("3-Point Stencil", stencil3_scalar, stencil3_reference, (a, b, c, x))
-    ]
+    values = dict(a=a, b=b, c=c, x=x, y=y)
+    kernels = [(entry["label"], kernel_impl(name, "scalar"), kernel_impl(name, "reference"),
+                kernel_args(name, values)) for name, entry in KERNELS.items()]
 
     # Store relative errors
     kernel_errors = {}
@@ -92,7 +391,8 @@ def run_kernel_tests(array_size=5000, runs=10, tolerance=1e-12):
         kernel_errors[name] = errors
         mean_err = np.mean(errors)
         std_err = np.std(errors)
-        print(f"{name}: mean relative error = {mean_err:.3e}, std = {std_err:.3e}")
+        status = "PASS" if max(errors) <= tolerance else "FAIL"
+        print(f"{name}: mean relative error = {mean_err:.3e}, std = {std_err:.3e} [{status}, tolerance {tolerance:.0e}]")
 
     # Plotting
     fig, ax = plt.subplots(figsize=(8,6))
@@ -108,8 +408,604 @@ def run_kernel_tests(array_size=5000, runs=10, tolerance=1e-12):
     plt.savefig("kernel_error_bars.png")
     print("\nPlot saved as 'kernel_error_bars.png'")
 
+def validate_access_patterns(array_size=5000, type_name="f64", access_patterns=ACCESS_PATTERNS):
+    """Check the vectorized engine against the scalar loops for every access pattern."""
+    x, y = make_inputs(array_size, type_name, count=2)
+    values = dict(a=1.1, b=2.2, c=3.3, x=x, y=y)
+    kernels = [(name, kernel_impl(name, "scalar"), kernel_impl(name, "vectorized"),
+                kernel_args(name, values)) for name in KERNELS]
+
+    errors = {}
+    print(f"\nVectorized engine vs scalar loops ({type_name}, array size={array_size})")
+    for flag in access_patterns:
+        access, stride = parse_access(flag)
+        gather_idx = make_gather_indices(array_size, stride) if access == "gather" else None
+        for name, scalar_fn, vec_fn, args in kernels:
+            expected = scalar_fn(*args, access=access, stride=stride, gather_idx=gather_idx)
+            result = vec_fn(*args, access=access, stride=stride, gather_idx=gather_idx)
+            err = relative_error(np.atleast_1d(np.float64(expected)), np.atleast_1d(np.float64(result)))
+            errors[(name, flag)] = err
+            print(f"  {name:8s} {flag:14s} relative error = {err:.3e}")
+    return errors
+
+# -------------------------------
+# Multi-core engine
+# -------------------------------
+# Unit-stride kernels split into one contiguous chunk per thread. Each thread
+# walks its chunk in BLOCK-element pieces with out= ufuncs, so NumPy drops
+# the GIL for the whole piece and the temporaries stay in L1/L2.
+
+_pools = {}
+
+def get_pool(nthreads):
+    """Shared ThreadPoolExecutor with nthreads workers (created once per size)."""
+    if nthreads not in _pools:
+        _pools[nthreads] = ThreadPoolExecutor(max_workers=nthreads)
+    return _pools[nthreads]
+
+def chunk_bounds(N, nthreads):
+    """Split [0, N) into nthreads contiguous (start, end) chunks."""
+    edges = np.linspace(0, N, nthreads + 1).astype(np.int64)
+    return [(int(edges[t]), int(edges[t + 1])) for t in range(nthreads) if edges[t] < edges[t + 1]]
+
+def run_chunks(fn, N, nthreads):
+    """Run fn(start, end) over every chunk on the pool and return the results in order."""
+    if nthreads == 1:
+        return [fn(0, N)]
+    return list(get_pool(nthreads).map(lambda se: fn(*se), chunk_bounds(N, nthreads)))
+
+def saxpy_parallel(a, x, y, nthreads=4, out=None):
+    a = x.dtype.type(a)
+    if out is y:
+        run_chunks(lambda start, end: _axpy_into(a, x[start:end], y[start:end],
+                                                 np.empty(BLOCK, dtype=x.dtype)),
+                   len(x), nthreads)
+        return y
+    y_out = np.empty_like(y) if out is None else out
+
+    def work(start, end):
+        for lo in range(start, end, BLOCK):
+            hi = min(lo + BLOCK, end)
+            np.multiply(x[lo:hi], a, out=y_out[lo:hi])
+            np.add(y_out[lo:hi], y[lo:hi], out=y_out[lo:hi])
+
+    run_chunks(work, len(x), nthreads)
+    return y_out
+
+def dot_parallel(x, y, nthreads=4):
+    # one partial sum per thread, combined at the end
+    partials = run_chunks(lambda start, end: np.dot(x[start:end], y[start:end]), len(x), nthreads)
+    return sum(partials)
+
+def elemwise_mul_parallel(x, y, nthreads=4, out=None):
+    z = np.empty_like(x) if out is None else out
+    run_chunks(lambda start, end: np.multiply(x[start:end], y[start:end], out=z[start:end]),
+               len(x), nthreads)
+    return z
+
+def stencil3_parallel(a, b, c, x, nthreads=4, out=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
+    N = len(x)
+    y = np.empty_like(x) if out is None else out
+    # interior points per chunk; the two boundary points are done below
+    run_chunks(lambda start, end: _stencil3_into(a, b, c, x, y, start, end,
+                                                 np.empty(BLOCK, dtype=x.dtype)),
+               N, nthreads)
+    y[0] = b*x[0] + c*x[1]
+    y[-1] = a*x[-2] + b*x[-1]
+    return y
+
+def run_thread_scaling(type_name="f32", memory_level="dram", max_threads=None, runs=5, out_dir="."):
+    """Time every threaded kernel for 1..max_threads threads and report GB/s and GFLOP/s."""
+    max_threads = max_threads or os.cpu_count()
+    dtype = DTYPES[type_name]
+    itemsize = np.dtype(dtype).itemsize
+    N = choose_N(memory_level, itemsize, 2)
+    x, y = make_inputs(N, type_name, seed=42, count=2)
+    out = BufferPool().get("out", N, dtype)
+    values = dict(x=x, y=y)
+
+    def bind(name):
+        fn, args = kernel_impl(name, "parallel"), kernel_args(name, values)
+        if get_kernel(name)["out"] is None:
+            return lambda t: fn(*args, nthreads=t)
+        return lambda t: fn(*args, nthreads=t, out=out)
+
+    kernels = {name: bind(name) for name in KERNELS}
+
+    rows = []
+    print(f"Thread scaling: {type_name}, {memory_level}, N = {N}")
+    print(f"{'kernel':8s} {'threads':>7s} {'GB/s':>9s} {'GFLOP/s':>9s} {'speedup':>8s}")
+    for name, fn in kernels.items():
+        base = None
+        for t in range(1, max_threads + 1):
+            fn(t)  # warm-up: thread start-up and first-touch page faults
+            best = min(time_runs(lambda: fn(t), runs))
+            gbps = bytes_per_elem(name, type_name) * N / best / 1e9
+            gflops = flops_per_elem(name) * N / best / 1e9
+            base = base or gbps
+            rows.append((name, t, best, gbps, gflops))
+            print(f"{name:8s} {t:7d} {gbps:9.2f} {gflops:9.2f} {gbps / base:8.2f}")
+
+        # saturation: first thread count after which one more thread adds < 5% bandwidth
+        bw = [r[3] for r in rows if r[0] == name]
+        sat = next((t + 1 for t in range(len(bw) - 1) if bw[t + 1] < 1.05 * bw[t]), len(bw))
+        print(f"{name}: bandwidth saturates at {sat} thread(s), {max(bw):.2f} GB/s peak")
+
+    csv_name = os.path.join(out_dir, f"thread_scaling_{type_name}_{memory_level}.csv")
+    with open(csv_name, "w") as csv:
+        csv.write("kernel,threads,elapsed_sec,gbps,gflops,array_size,type,memory_level\n")
+        for name, t, best, gbps, gflops in rows:
+            csv.write(f"{name},{t},{best:.9g},{gbps:.9g},{gflops:.9g},{N},{type_name},{memory_level}\n")
+    print(f"CSV file produced: {csv_name}")
+    return csv_name
+
+# -------------------------------
+# Timing backend (pro1.cpp CSV schema)
+# -------------------------------
+# run_benchmark() times the vectorized engine the same way pro1.cpp times its
+# builds and writes the same columns and filename, so analyze.py can load a
+# "numpy" variant next to "scalar" and "simd".
+CSV_HEADER = ("kernel,run,elapsed_sec,gflops,array_size,type,aligned,tail,access,stride,memory_level,"
+              "warmup,samples,reps,timestamp")
+
+def physical_memory_bytes():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 8 << 30  # sysconf unavailable (Windows): assume 8 GB
+
+def available_memory_bytes():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return physical_memory_bytes() // 2
+
+# Working-set targets from this machine's cache sizes, the same ones tester.py
+# passes to pro1 (bytes), plus "storage": memmap files at twice the installed
+# RAM, so the data cannot stay in the page cache
+MEMORY_LEVELS = dict(hostinfo.working_sets(), storage=2 * physical_memory_bytes())
+
+def choose_N(memory_level, itemsize, num_arrays=2):
+    """Elements per array so num_arrays arrays fill the given memory level (pro1.cpp choose_N)."""
+    cache_bytes = MEMORY_LEVELS.get(memory_level, 8 * itemsize * num_arrays)
+    return cache_bytes // (itemsize * num_arrays)
+
+def aligned_array(N, dtype, aligned=True, alignment=64):
+    """Uninitialized array starting on an `alignment`-byte boundary, or one element past it."""
+    dtype = np.dtype(dtype)
+    buf = np.empty(N + alignment // dtype.itemsize + 1, dtype=dtype)
+    offset = (-buf.ctypes.data % alignment) // dtype.itemsize
+    if not aligned:
+        offset += 1  # deliberate misalignment, like maybe_misalign() in pro1.cpp
+    return buf[offset:offset + N]
+
+def time_runs(fn, runs, setup=None, starts=None):
+    """Wall-clock seconds of `runs` back-to-back calls to fn(), calling setup() untimed before each.
+
+    If given, `starts` collects each call's start as epoch seconds (pro1's timestamp column).
+    """
+    elapsed = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        if starts is not None:
+            starts.append(time.time())
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+    return elapsed
+
+WARMUP_WINDOW = 3        # same warmup rule as pro1.cpp's detect_warmup()
+WARMUP_TOLERANCE = 0.05
+
+def detect_warmup(times):
+    """Number of leading warmup samples: those before the first WARMUP_WINDOW samples within WARMUP_TOLERANCE."""
+    for i in range(len(times) - WARMUP_WINDOW + 1):
+        window = times[i:i + WARMUP_WINDOW]
+        if max(window) <= min(window) * (1 + WARMUP_TOLERANCE):
+            return i
+    return 0  # never settled: keep every sample
+
+def run_benchmark(variant="numpy", type_name="f32", aligned=True, tail=False,
+                  access_flag="--unit-stride", memory_level="dram", runs=10, out_dir=".",
+                  pool=None, allocate=False, timesteps=0, array_size=None, data_dir=None):
+    """Time the vectorized kernels for one pro1.cpp configuration and write its CSV.
+
+    Like pro1.cpp, SAXPY and STENCIL update y in place and MUL writes z; the
+    arrays come from `pool` so repeated calls reuse them. allocate=True
+    times the allocating out=None path instead. timesteps=T times the naive
+    and blocked T-step stencils (STENCIL_T<T>, STENCIL_TB<T>) instead of
+    the four kernels, like pro1.cpp --timesteps=T.
+
+    memory_level="storage" streams the kernels over memmap files in data_dir
+    (default out_dir), dropping them from the page cache before every run,
+    and prints the effective throughput. array_size overrides N.
+    """
+    access, stride = parse_access(access_flag)
+    pool = pool or BufferPool()
+    dtype = DTYPES[type_name]
+    storage = memory_level == "storage"
+    if storage and (access != "unit-stride" or timesteps or allocate):
+        raise ValueError("the storage level streams unit-stride kernels into its files only")
+    if array_size:
+        sizes = [array_size]
+    elif memory_level == "sweep":
+        sizes = hostinfo.sweep_sizes(np.dtype(dtype).itemsize)  # pro1 get_sweep_N<T>(2)
+    else:
+        sizes = [choose_N(memory_level, np.dtype(dtype).itemsize, 2)]
+
+    args = [variant, type_name, "--aligned" if aligned else "--misaligned",
+            "--tail" if tail else "--no-tail", access_flag]
+    if timesteps:
+        args.append(f"--timesteps={timesteps}")
+    args.append(memory_level)
+    csv_name = os.path.join(out_dir, "_".join(args) + ".csv")
+    with open(csv_name, "w") as csv:
+        csv.write(CSV_HEADER + "\n")
+        for N in sizes:
+            N = N + 3 if tail else N
+            print(f"Array size N = {N}")
+            if storage:
+                x, y, z = (storage_array(os.path.join(data_dir or out_dir, f"{name}_{type_name}.bin"), N, dtype)
+                           for name in "xyz")
+                for seed, arr in enumerate((x, y, z)):
+                    fill_random(arr, type_name, seed=42 + seed)
+                # the chunk buffers come from the pool, allocated here rather than in the first timed call
+                _stream_buffers(pool, STREAM_CHUNK, dtype, "xy")
+                _stream_buffers(pool, STREAM_CHUNK + 2, dtype, ("xh", "yh", "tmp"))
+                kw, kind = dict(pool=pool), "streaming"
+                setup = lambda: [drop_page_cache(arr) for arr in (x, y, z)]
+            else:
+                x, y, z = (pool.get(name, N, dtype, aligned) for name in "xyz")
+                x[:], y[:], z[:] = make_inputs(N, type_name, seed=42)
+                gather_idx = make_gather_indices(N, stride) if access == "gather" else None
+                kw, kind = dict(access=access, stride=stride, gather_idx=gather_idx), "vectorized"
+                setup = None
+            values = dict(x=x, y=y)
+            outputs = dict(y=y, z=z)
+
+            def bind(name, **extra):
+                fn, args = kernel_impl(name, kind), kernel_args(name, values)
+                target = get_kernel(name)["out"]
+                if target is not None and not allocate:
+                    extra["out"] = outputs[target]
+                return lambda: fn(*args, **extra)
+
+            if timesteps:
+                # z is the naive version's ping-pong buffer, as in pro1.cpp
+                kernels = [f"STENCIL_T{timesteps}", f"STENCIL_TB{timesteps}"]
+                fns = [bind(kernels[0], scratch=None if allocate else z), bind(kernels[1])]
+            else:
+                kernels = list(KERNELS)
+                fns = [bind(name, **kw) for name in kernels]
+            for name, fn in zip(kernels, fns):
+                print(f"Timing kernel {name} over {runs} runs...")
+                starts = []
+                times = time_runs(fn, runs, setup, starts)
+                warmup = detect_warmup(times)
+                for run, elapsed in enumerate(times):
+                    gflops = flops_per_elem(name) * N / elapsed / 1e9
+                    csv.write(f"{name},{run},{elapsed:.9g},{gflops:.9g},{N},{type_name},"
+                              f"{int(aligned)},{int(tail)},{access},{stride},{memory_level},"
+                              f"{int(run < warmup)},{len(times) - warmup},1,{starts[run]:.6f}\n")
+                if storage:
+                    med = float(np.median(times))
+                    print(f"  {name}: median {med:.3f} s, effective "
+                          f"{bytes_per_elem(name, type_name) * N / med / 1e9:.2f} GB/s, "
+                          f"{flops_per_elem(name) * N / med / 1e9:.3f} GFLOP/s")
+    print(f"CSV file produced: {csv_name}")
+    return csv_name
+
+def compare_allocation(type_name="f32", memory_level="dram", runs=10):
+    """Time each kernel with out=None against pooled out= buffers and report the difference.
+
+    The out= calls get the buffers run_benchmark passes (SAXPY updates y in place), so
+    the two timings differ only by the allocation.
+    """
+    dtype = DTYPES[type_name]
+    N = choose_N(memory_level, np.dtype(dtype).itemsize, 2)
+    pool = BufferPool()
+    x, y, z = (pool.get(name, N, dtype) for name in "xyz")
+    x[:], y[:] = make_inputs(N, type_name, seed=42, count=2)
+
+    values = dict(x=x, y=y)
+    outputs = dict(y=y, z=z)
+    # kernels without an array result (DOT) have nothing to compare
+    kernels = []
+    for name in KERNELS:
+        target = get_kernel(name)["out"]
+        if target is None:
+            continue
+        fn, args = kernel_impl(name, "vectorized"), kernel_args(name, values)
+        kernels.append((name, lambda fn=fn, args=args: fn(*args),
+                        lambda fn=fn, args=args, out=outputs[target]: fn(*args, out=out)))
+    print(f"Allocating vs out= buffers: {type_name}, {memory_level}, N = {N}, median of {runs} runs")
+    print(f"{'kernel':8s} {'alloc ms':>10s} {'out= ms':>10s} {'saved ms':>10s} {'saved %':>8s}")
+    results = {}
+    for name, alloc_fn, out_fn in kernels:
+        t_alloc = float(np.median(time_runs(alloc_fn, runs)))
+        t_out = float(np.median(time_runs(out_fn, runs)))
+        results[name] = (t_alloc, t_out)
+        saved = t_alloc - t_out
+        print(f"{name:8s} {t_alloc*1e3:10.3f} {t_out*1e3:10.3f} {saved*1e3:10.3f} {100*saved/t_alloc:8.1f}")
+    return results
+
+def parse_benchmark_args(argv):
+    """Parse pro1.cpp-style arguments: [variant] f32 --aligned --no-tail --unit-stride dram"""
+    config = dict(variant="numpy", type_name="f32", aligned=True, tail=False,
+                  access_flag="--unit-stride", memory_level="dram")
+    for i, arg in enumerate(argv):
+        if arg in DTYPES:
+            config["type_name"] = arg
+        elif arg in ("--aligned", "--misaligned"):
+            config["aligned"] = arg == "--aligned"
+        elif arg in ("--tail", "--no-tail"):
+            config["tail"] = arg == "--tail"
+        elif arg == "--unit-stride" or arg.startswith(("--stride=", "--gather=")):
+            config["access_flag"] = arg
+        elif arg in MEMORY_LEVELS or arg == "sweep":
+            config["memory_level"] = arg
+        elif arg.startswith("--timesteps="):
+            config["timesteps"] = int(arg[len("--timesteps="):])
+        elif arg.startswith("--n="):
+            config["array_size"] = int(arg[len("--n="):])
+        elif arg.startswith("--data-dir="):
+            config["data_dir"] = arg[len("--data-dir="):]
+        elif arg.startswith("--runs="):
+            config["runs"] = int(arg[len("--runs="):])
+        elif i == 0:
+            config["variant"] = arg
+        else:
+            raise ValueError(f"unknown argument: {arg}")
+    return config
+
+# -------------------------------
+# Out-of-core streaming
+# -------------------------------
+# The stream_* kernels run over np.memmap-backed files in STREAM_CHUNK-element
+# pieces: each piece is copied into a reused in-memory buffer, computed with
+# the vectorized engine and written back, and output files are flushed before
+# returning so the write-back is part of the timed call. STENCIL reads one
+# halo element on each side of every chunk.
+STREAM_CHUNK = 4 * 1024 * 1024
+
+def storage_array(path, N, dtype):
+    """Writable np.memmap of N elements backed by `path` (created or resized as needed)."""
+    reuse = os.path.exists(path) and os.path.getsize(path) == N * np.dtype(dtype).itemsize
+    return np.memmap(path, dtype=dtype, mode="r+" if reuse else "w+", shape=(N,))
+
+def fill_random(arr, type_name, seed=0, chunk=STREAM_CHUNK):
+    """Fill a (memmapped) array with make_inputs-style random data, one chunk at a time."""
+    rng = np.random.default_rng(seed)
+    for lo in range(0, len(arr), chunk):
+        hi = min(lo + chunk, len(arr))
+        if np.issubdtype(arr.dtype, np.integer):
+            arr[lo:hi] = rng.integers(0, 10, hi - lo, dtype=arr.dtype)
+        else:
+            arr[lo:hi] = rng.random(hi - lo, dtype=arr.dtype)
+    if isinstance(arr, np.memmap):
+        arr.flush()
+
+def drop_page_cache(arr):
+    """Write back a memmap and ask the OS to evict its file from the page cache (POSIX only)."""
+    arr.flush()
+    if hasattr(os, "posix_fadvise") and getattr(arr, "filename", None):
+        fd = os.open(arr.filename, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def _stream_buffers(pool, chunk, dtype, names):
+    pool = pool or BufferPool()
+    return [pool.get(f"stream_{name}", chunk, dtype) for name in names]
+
+def _flush(arr):
+    if isinstance(arr, np.memmap):
+        arr.flush()
+
+def stream_saxpy(a, x, y, out, chunk=STREAM_CHUNK, pool=None):
+    xs, ys = _stream_buffers(pool, chunk, x.dtype, "xy")
+    for lo in range(0, len(x), chunk):
+        hi = min(lo + chunk, len(x))
+        n = hi - lo
+        np.copyto(xs[:n], x[lo:hi])
+        np.copyto(ys[:n], y[lo:hi])
+        out[lo:hi] = saxpy_vectorized(a, xs[:n], ys[:n], out=ys[:n])
+    _flush(out)
+    return out
+
+def stream_dot(x, y, chunk=STREAM_CHUNK, pool=None):
+    xs, ys = _stream_buffers(pool, chunk, x.dtype, "xy")
+    total = 0.0 if np.issubdtype(x.dtype, np.floating) else x.dtype.type(0)
+    for lo in range(0, len(x), chunk):
+        hi = min(lo + chunk, len(x))
+        n = hi - lo
+        np.copyto(xs[:n], x[lo:hi])
+        np.copyto(ys[:n], y[lo:hi])
+        total += np.dot(xs[:n], ys[:n])
+    return total
+
+def stream_mul(x, y, out, chunk=STREAM_CHUNK, pool=None):
+    xs, ys = _stream_buffers(pool, chunk, x.dtype, "xy")
+    for lo in range(0, len(x), chunk):
+        hi = min(lo + chunk, len(x))
+        n = hi - lo
+        np.copyto(xs[:n], x[lo:hi])
+        np.copyto(ys[:n], y[lo:hi])
+        out[lo:hi] = np.multiply(xs[:n], ys[:n], out=xs[:n])
+    _flush(out)
+    return out
+
+def stream_stencil3(a, b, c, x, out, chunk=STREAM_CHUNK, pool=None):
+    _check_stencil_out(x, out)
+    a, b, c = (x.dtype.type(v) for v in (a, b, c))
+    N = len(x)
+    # the x buffer holds the chunk plus one halo element on each side
+    xs, ys, tmp = _stream_buffers(pool, chunk + 2, x.dtype, ("xh", "yh", "tmp"))
+    for lo in range(0, N, chunk):
+        hi = min(lo + chunk, N)
+        glo, ghi = max(lo - 1, 0), min(hi + 1, N)
+        w = ghi - glo
+        np.copyto(xs[:w], x[glo:ghi])
+        _stencil3_into(a, b, c, xs[:w], ys[:w], 0, w, tmp)
+        # zero-padded global boundaries, as in stencil3_reference
+        if glo == 0:
+            ys[0] = b*xs[0] + c*xs[1]
+        if ghi == N:
+            ys[w-1] = a*xs[w-2] + b*xs[w-1]
+        out[lo:hi] = ys[lo - glo:hi - glo]
+    _flush(out)
+    return out
+
+# -------------------------------
+# Validation sweep
+# -------------------------------
+# Checks the fast implementations against the registry reference for every
+# kernel x dtype x working-set size, one case per worker process. Float
+# kernels are compared with a float64 reference on the same inputs; integer
+# kernels must match the reference exactly (same wrap-around arithmetic).
+# The f32 bound leaves room for float32 DOT accumulation over DRAM-sized
+# arrays (~5e-4 relative); indexing bugs show up as errors of order 1.
+# A DRAM-sized f64 case holds ~3 GB, so cases only start while the estimated
+# footprint of everything running fits in VALIDATION_MEMORY_FRACTION of the
+# available memory.
+TOLERANCES = {"f32": 1e-3, "f64": 1e-10, "i32": 0.0}
+VALIDATION_LEVELS = ["l1small", "l1large", "l2", "l3", "dram"]
+VALIDATION_IMPLS = ["vectorized", "vectorized-out", "parallel"]
+VALIDATION_MEMORY_FRACTION = 0.75
+
+def case_bytes(type_name, memory_level):
+    """Peak footprint of one validate_case: x and y, their float64 copies and the expected
+    result, and the result (with its out= buffer)."""
+    itemsize = np.dtype(DTYPES[type_name]).itemsize
+    return choose_N(memory_level, itemsize, 2) * (3 * itemsize + 3 * 8)
+
+def validate_case(name, type_name, memory_level, impl, nthreads=None):
+    """Validate one (kernel, type, level, implementation) point; returns a report dict."""
+    start = time.perf_counter()
+    dtype = DTYPES[type_name]
+    N = choose_N(memory_level, np.dtype(dtype).itemsize, 2)
+    x, y = make_inputs(N, type_name, seed=N, count=2)
+    used = get_kernel(name)["args"]
+    if np.issubdtype(dtype, np.floating):
+        # only upcast the arrays this kernel reads, to keep DRAM-sized cases in memory
+        ref_values = {k: v.astype(np.float64) for k, v in (("x", x), ("y", y)) if k in used}
+    else:
+        ref_values = dict(x=x, y=y)
+    expected = kernel_impl(name, "reference")(*kernel_args(name, ref_values))
+    del ref_values
+
+    args = kernel_args(name, dict(x=x, y=y))
+    if impl == "parallel":
+        result = kernel_impl(name, "parallel")(*args, nthreads=nthreads or os.cpu_count())
+    elif impl == "vectorized-out" and get_kernel(name)["out"] is not None:
+        result = kernel_impl(name, "vectorized")(*args, out=aligned_array(N, dtype))
+    else:
+        result = kernel_impl(name, "vectorized")(*args)
+
+    err = relative_error(np.atleast_1d(np.float64(expected)), np.atleast_1d(np.float64(result)))
+    tolerance = TOLERANCES[type_name]
+    return dict(kernel=name, type=type_name, memory_level=memory_level, array_size=int(N),
+                impl=impl, error=float(err), tolerance=tolerance, passed=bool(err <= tolerance),
+                seconds=time.perf_counter() - start)
+
+def run_validation_sweep(types=tuple(DTYPES), levels=VALIDATION_LEVELS, impls=VALIDATION_IMPLS,
+                         workers=None, report="validation_report.json", fail_fast=True):
+    """Validate every kernel x type x level x implementation across a process pool.
+
+    Stops scheduling new cases on the first failure when fail_fast is set and
+    writes every finished case to a JSON report. Returns True if all passed.
+    Cases start only while their estimated footprints fit the memory budget
+    (one case always runs, however large).
+    """
+    cases = [(name, t, lvl, impl) for lvl in levels for t in types for name in KERNELS for impl in impls]
+    # largest working sets first so the long cases overlap with the short ones
+    cases.sort(key=lambda c: -MEMORY_LEVELS[c[2]])
+    workers = workers or os.cpu_count()
+    budget = VALIDATION_MEMORY_FRACTION * available_memory_bytes()
+    results = []
+    failed = None
+    print(f"Validating {len(cases)} cases on {workers} worker processes "
+          f"({budget / 2**30:.1f} GiB memory budget)")
+    pending, running, in_use = list(cases), {}, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while (pending or running) and failed is None:
+            # start the largest pending cases that fit next to the running ones
+            i = 0
+            while i < len(pending) and len(running) < workers:
+                need = case_bytes(pending[i][1], pending[i][2])
+                if running and in_use + need > budget:
+                    i += 1
+                    continue
+                case = pending.pop(i)
+                running[pool.submit(validate_case, *case)] = (case, need)
+                in_use += need
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                (name, t, lvl, impl), need = running.pop(fut)
+                in_use -= need
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    res = dict(kernel=name, type=t, memory_level=lvl, impl=impl,
+                               error=None, passed=False, exception=repr(e))
+                results.append(res)
+                status = "PASS" if res["passed"] else "FAIL"
+                err = f"{res['error']:.3e}" if res.get("error") is not None else res.get("exception")
+                print(f"  [{status}] {res['kernel']:8s} {res['type']} {res['memory_level']:8s} "
+                      f"{res['impl']:15s} error = {err}")
+                if not res["passed"] and fail_fast and failed is None:
+                    failed = res
+
+    passed = failed is None and all(r["passed"] for r in results)
+    summary = dict(passed=passed, cases=len(cases), completed=len(results),
+                   failures=sum(not r["passed"] for r in results), tolerances=TOLERANCES)
+    with open(report, "w") as f:
+        json.dump(dict(summary=summary, results=results), f, indent=2)
+    print(f"{'All cases passed' if passed else 'Validation FAILED'}: "
+          f"{summary['completed']}/{summary['cases']} cases run, report written to {report}")
+    return passed
+
+def parse_validation_args(argv):
+    """--types=f32,f64 --levels=l1small,l2 --impls=vectorized --workers=4 --report=path --keep-going"""
+    config = {}
+    for arg in argv:
+        key, _, value = arg.lstrip("-").partition("=")
+        if key in ("types", "levels", "impls"):
+            config[key] = value.split(",")
+        elif key == "workers":
+            config[key] = int(value)
+        elif key == "report":
+            config[key] = value
+        elif key == "keep-going":
+            config["fail_fast"] = False
+        else:
+            raise ValueError(f"unknown argument: {arg}")
+    return config
+
 # -------------------------------
 # Main
 # -------------------------------
 if __name__ == "__main__":
-    run_kernel_tests(array_size=5000, runs=10, tolerance=1e-12)
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # e.g. python kernel_base.py bench numpy f32 --aligned --no-tail --unit-stride dram
+        #      python kernel_base.py bench numpy f64 --unit-stride storage --data-dir=/mnt/scratch
+        run_benchmark(**parse_benchmark_args(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "validate":
+        # e.g. python kernel_base.py validate --types=f32,f64 --levels=l1small,l2,l3 --workers=4
+        sys.exit(0 if run_validation_sweep(**parse_validation_args(sys.argv[2:])) else 1)
+    elif len(sys.argv) > 1 and sys.argv[1] == "alloc":
+        # e.g. python kernel_base.py alloc f32 dram
+        compare_allocation(type_name=sys.argv[2] if len(sys.argv) > 2 else "f32",
+                           memory_level=sys.argv[3] if len(sys.argv) > 3 else "dram")
+    elif len(sys.argv) > 1 and sys.argv[1] == "threads":
+        # e.g. python kernel_base.py threads f32 dram 8
+        run_thread_scaling(type_name=sys.argv[2] if len(sys.argv) > 2 else "f32",
+                           memory_level=sys.argv[3] if len(sys.argv) > 3 else "dram",
+                           max_threads=int(sys.argv[4]) if len(sys.argv) > 4 else None)
+    else:
+        run_kernel_tests(array_size=5000, runs=10, tolerance=1e-12)
+        validate_access_patterns(array_size=5000, type_name="f64")
@@ -0,0 +1,7 @@
+// Generated by kernel_registry.py (write_header) -- do not edit by hand.
+#pragma once
+
+constexpr double SAXPY_FLOPS_PER_ELEM = 2.0;
+constexpr double DOT_FLOPS_PER_ELEM = 2.0;
+constexpr double MUL_FLOPS_PER_ELEM = 1.0;
+constexpr double STENCIL_FLOPS_PER_ELEM = 5.0;
@@ -0,0 +1,177 @@
+import os
+import re
+
+# -------------------------------
+# Kernel registry
+# -------------------------------
+# One table of per-kernel metadata shared by every tool in this folder:
+#   - kernel_base.py reads the reference/scalar/vectorized/parallel/streaming
+#     implementations and FLOP counts for validation and timing,
+#   - analyze.py reads FLOPs and bytes per element to place points on the
+#     roofline,
+#   - pro1.cpp includes kernel_registry.h, generated from this table by
+#     write_header(), for the FLOP counts behind its GFLOP/s column.
+# Adding a kernel here updates arithmetic intensity everywhere.
+#
+# Per element of the N-element arrays:
+#   flops_per_elem  floating-point operations
+#   reads / writes  array accesses (STENCIL counts its three neighbour loads)
+#   args            positional arguments of the Python implementations
+#   constants       scalar arguments pro1.cpp times the kernel with
+#   out             which pro1.cpp buffer the kernel writes (None for DOT)
+# Implementations are kernel_base.py function names, resolved lazily by
+# kernel_base.kernel_impl so this module stays importable without NumPy
+# kernels (e.g. from analyze.py).
+
+KERNELS = {
+    "SAXPY": {
+        "label": "SAXPY",
+        "flops_per_elem": 2.0,
+        "reads": 2, "writes": 1,
+        "args": ("a", "x", "y"),
+        "constants": {"a": 3},
+        "out": "y",
+        "reference": "saxpy_reference",
+        "scalar": "saxpy_scalar",
+        "vectorized": "saxpy_vectorized",
+        "parallel": "saxpy_parallel",
+        "streaming": "stream_saxpy",
+    },
+    "DOT": {
+        "label": "Dot Product",
+        "flops_per_elem": 2.0,
+        "reads": 2, "writes": 0,
+        "args": ("x", "y"),
+        "constants": {},
+        "out": None,
+        "reference": "dot_reference",
+        "scalar": "dot_scalar",
+        "vectorized": "dot_vectorized",
+        "parallel": "dot_parallel",
+        "streaming": "stream_dot",
+    },
+    "MUL": {
+        "label": "Elementwise Multiply",
+        "flops_per_elem": 1.0,
+        "reads": 2, "writes": 1,
+        "args": ("x", "y"),
+        "constants": {},
+        "out": "z",
+        "reference": "elemwise_mul_reference",
+        "scalar": "elemwise_mul_scalar",
+        "vectorized": "elemwise_mul_vectorized",
+        "parallel": "elemwise_mul_parallel",
+        "streaming": "stream_mul",
+    },
+    "STENCIL": {
+        "label": "3-Point Stencil",
+        "flops_per_elem": 5.0,
+        "reads": 3, "writes": 1,
+        "args": ("a", "b", "c", "x"),
+        "constants": {"a": 1, "b": 2, "c": 3},
+        "out": "y",
+        "reference": "stencil3_reference",
+        "scalar": "stencil3_scalar",
+        "vectorized": "stencil3_vectorized",
+        "parallel": "stencil3_parallel",
+        "streaming": "stream_stencil3",
+    },
+}
+
+# Multi-step stencils are named by their step count: STENCIL_T<T> sweeps the
+# array once per step (naive), STENCIL_TB<T> streams it once (blocked).
+MULTISTEP_RE = re.compile(r'^STENCIL_(TB?)(\d+)$')
+
+TYPE_BYTES = {"f32": 4, "f64": 8, "i32": 4}
+CACHE_LINE = 64
+INDEX_BYTES = 8  # size_t gather index per element
+
+def get_kernel(name):
+    """Registry entry for a kernel name, including parametric STENCIL_T<T>/STENCIL_TB<T>."""
+    if name in KERNELS:
+        return KERNELS[name]
+    m = MULTISTEP_RE.match(str(name))
+    if not m:
+        raise KeyError(f"unknown kernel: {name}")
+    steps = int(m.group(2))
+    blocked = m.group(1) == "TB"
+    base = KERNELS["STENCIL"]
+    return {
+        "label": f"{steps}-step stencil ({'blocked' if blocked else 'naive'})",
+        "flops_per_elem": base["flops_per_elem"] * steps,
+        # blocked tiles stay in cache, so memory traffic is paid once per call
+        "reads": base["reads"] * (1 if blocked else steps),
+        "writes": base["writes"] * (1 if blocked else steps),
+        "args": ("a", "b", "c", "x", "steps"),
+        "constants": dict(base["constants"], steps=steps),
+        "out": "y",
+        "reference": "stencil3_multistep_reference",
+        "scalar": None,
+        "vectorized": "stencil3_multistep_blocked" if blocked else "stencil3_multistep_naive",
+        "parallel": None,
+        "streaming": None,
+    }
+
+def is_known(name):
+    try:
+        get_kernel(name)
+        return True
+    except KeyError:
+        return False
+
+def flops_per_elem(name):
+    return get_kernel(name)["flops_per_elem"]
+
+def bytes_per_elem(name, dtype="f32", access="unit-stride", stride=1):
+    """Bytes moved per element of N for a kernel, type and access pattern.
+
+    First-order cache-line model: strided access touches one element per
+    stride but pays for the whole line once stride*size exceeds it; gather
+    additionally streams one index per element.
+    """
+    entry = get_kernel(name)
+    size = TYPE_BYTES.get(dtype, 4)
+    accesses = entry["reads"] + entry["writes"]
+    if access == "unit-stride" or stride <= 1:
+        return accesses * size
+    # N/stride elements are touched; each costs its own line once stride*size > CACHE_LINE
+    per_access = CACHE_LINE / stride if stride * size > CACHE_LINE else size
+    if access == "gather":
+        return accesses * per_access + INDEX_BYTES
+    return accesses * per_access
+
+def arithmetic_intensity(name, dtype="f32", access="unit-stride", stride=1):
+    """FLOPs per byte moved."""
+    return flops_per_elem(name) / bytes_per_elem(name, dtype, access, stride)
+
+# -------------------------------
+# C++ header for pro1.cpp
+# -------------------------------
+HEADER_NAME = "kernel_registry.h"
+
+def header_text():
+    lines = ["// Generated by kernel_registry.py (write_header) -- do not edit by hand.",
+             "#pragma once", ""]
+    for name, entry in KERNELS.items():
+        lines.append(f"constexpr double {name}_FLOPS_PER_ELEM = {entry['flops_per_elem']!r};")
+    lines.append("")
+    return "\n".join(lines)
+
+def write_header(path=None):
+    """Regenerate kernel_registry.h next to this file (only rewritten when it changed)."""
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), HEADER_NAME)
+    text = header_text()
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return path
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+if __name__ == "__main__":
+    print("Wrote", write_header())
+    print(f"{'kernel':8s} {'FLOP/elem':>9s} " + " ".join(f"{t + ' B/elem':>10s}" for t in TYPE_BYTES))
+    for name in KERNELS:
+        print(f"{name:8s} {flops_per_elem(name):9.1f} "
+              + " ".join(f"{bytes_per_elem(name, t):10.1f}" for t in TYPE_BYTES))
@@ -8,6 +8,10 @@
 #include <chrono>
 #include <fstream>
 #include <sstream>
+#include <algorithm>
+#include <cmath>
+// FLOPs per element, generated from kernel_registry.py
+#include "kernel_registry.h"
 // OS-specific includes for setting CPU affinity
 #if defined(_WIN32) || defined(_WIN64)
 #include <windows.h>
@@ -23,6 +27,33 @@ enum class AccessPattern { UnitStride, Strided, Gather };
 AccessPattern g_access_pattern = AccessPattern::UnitStride;
 int g_stride = 1; // Used for strided access
 
+// ---------------- Multi-step stencil ----------------
+int g_timesteps = 0;  // --timesteps=T: time T-step stencils instead of the four kernels
+size_t g_tile = 0;    // --tile=B: tile width for the blocked stencil (0 = fit in L2)
+
+// ---------------- Adaptive repetitions ----------------
+// --adaptive: instead of a fixed run count, sample until warmup has ended and the
+// 95% CI of GFLOP/s is within +/- g_ci_target of the mean, or the time budget runs out.
+// These measurement flags are left out of the CSV file name.
+bool g_adaptive = false;
+double g_ci_target = 0.02;  // --ci=R: target CI half-width relative to the mean
+double g_budget_sec = 2.0;  // --budget=S: wall-clock budget per kernel and size
+int g_min_runs = 5;         // --min-runs=K: steady-state samples required before stopping
+int g_max_runs = 1000;      // --max-runs=K: hard cap on samples per kernel and size
+
+// ---------------- Inner-loop calibration ----------------
+// Each sample calls the kernel `reps` times back to back, with reps doubled
+// until one sample lasts at least g_min_sample_sec; the measured cost of a
+// timer read pair is subtracted before dividing by reps.
+double g_min_sample_sec = 1e-3; // --min-sample=S: minimum duration of one timed sample
+double g_timer_overhead = 0.0;  // seconds, measured once in main()
+
+bool is_measurement_flag(const std::string& arg) {
+    return arg == "--adaptive" || arg.rfind("--ci=", 0) == 0 || arg.rfind("--budget=", 0) == 0 ||
+           arg.rfind("--min-runs=", 0) == 0 || arg.rfind("--max-runs=", 0) == 0 ||
+           arg.rfind("--min-sample=", 0) == 0;
+}
+
 // Metadata globals for CSV
 std::string g_type, g_memory_level;
 std::string g_cmdline;
@@ -53,27 +84,125 @@ inline void do_not_optimize(T const& value) {
     asm volatile("" : : "r,m"(value) : "memory");
 }
 
+// ---------------- Warmup & confidence intervals ----------------
+constexpr size_t WARMUP_WINDOW = 3;      // consecutive samples that must agree
+constexpr double WARMUP_TOLERANCE = 0.05; // max relative spread inside the window
+
+// Index of the first sample of the first window of WARMUP_WINDOW samples whose
+// max/min spread is within WARMUP_TOLERANCE: everything before it is warmup.
+// Returns times.size() while no such window exists yet.
+size_t detect_warmup(const std::vector<double>& times) {
+    for (size_t i = 0; i + WARMUP_WINDOW <= times.size(); i++) {
+        auto lo_hi = std::minmax_element(times.begin() + i, times.begin() + i + WARMUP_WINDOW);
+        if (*lo_hi.second <= *lo_hi.first * (1.0 + WARMUP_TOLERANCE)) return i;
+    }
+    return times.size();
+}
+
+// Two-sided 97.5% Student t quantile for df degrees of freedom
+double t_quantile_975(size_t df) {
+    static const double table[] = {12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                                   2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                                   2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042};
+    if (df == 0) return INFINITY;
+    return df <= 30 ? table[df - 1] : 1.96;
+}
+
+// 95% CI half-width of the mean of values[first..], relative to that mean
+double relative_ci(const std::vector<double>& values, size_t first) {
+    size_t n = values.size() - first;
+    if (n < 2) return INFINITY;
+    double mean = 0, var = 0;
+    for (size_t i = first; i < values.size(); i++) mean += values[i];
+    mean /= n;
+    for (size_t i = first; i < values.size(); i++) var += (values[i] - mean) * (values[i] - mean);
+    var /= (n - 1);
+    return t_quantile_975(n - 1) * std::sqrt(var / n) / mean;
+}
+
+// Median cost of two back-to-back clock reads
+double measure_timer_overhead() {
+    using namespace std::chrono;
+    std::vector<double> d(101);
+    for (double& v : d) {
+        auto a = high_resolution_clock::now();
+        auto b = high_resolution_clock::now();
+        v = duration<double>(b - a).count();
+    }
+    std::nth_element(d.begin(), d.begin() + d.size() / 2, d.end());
+    return d[d.size() / 2];
+}
+
+// Wall-clock seconds of `reps` back-to-back calls to f, timer overhead removed
+template <typename F>
+double time_batch(F& f, size_t reps) {
+    using namespace std::chrono;
+    auto start = high_resolution_clock::now();
+    for (size_t r = 0; r < reps; r++) f();
+    auto end = high_resolution_clock::now();
+    return std::max(duration<double>(end - start).count() - g_timer_overhead, 0.0);
+}
+
+// Smallest power-of-two repetition count whose batch lasts g_min_sample_sec
+template <typename F>
+size_t calibrate_reps(F& f) {
+    size_t reps = 1;
+    while (reps < (size_t(1) << 30) && time_batch(f, reps) < g_min_sample_sec) reps *= 2;
+    return reps;
+}
+
 // ---------------- Timer with CSV export ----------------
+// Fixed mode times `runs` samples; adaptive mode keeps sampling as described
+// above. Either way warmup samples are detected and flagged in the CSV, along
+// with the number of steady-state samples the kernel got. Every sample is
+// per-call time averaged over a calibrated batch of `reps` calls.
 template <typename F>
 void time_function(F f, const std::string& kernel, double flops_per_elem, size_t N, int runs = 10) {
-    printf("Timing kernel %s over %d runs...\n", kernel.c_str(), runs);
+    size_t reps = calibrate_reps(f);
+    if (g_adaptive) {
+        printf("Timing kernel %s adaptively (CI +/-%.1f%%, budget %.1f s, %zu calls per sample)...\n",
+               kernel.c_str(), 100 * g_ci_target, g_budget_sec, reps);
+    } else {
+        printf("Timing kernel %s over %d runs (%zu calls per sample)...\n", kernel.c_str(), runs, reps);
+    }
     using namespace std::chrono;
-    for (int run = 0; run < runs; run++) {
-        auto start = high_resolution_clock::now();
-        f();
+    std::vector<double> times, rates, starts;
+    size_t warmup = 0;
+    auto budget_start = high_resolution_clock::now();
+    while (true) {
+        // wall-clock start of the sample, so tester.py can line it up with its frequency samples
+        starts.push_back(duration<double>(system_clock::now().time_since_epoch()).count());
+        double elapsed = time_batch(f, reps) / reps;
         auto end = high_resolution_clock::now();
-        double elapsed = duration<double>(end - start).count();
 
-        // might need to change this
-        // if eplased is 0, set gflops to 0 to avoid inf
-        if (elapsed == 0) elapsed = 0.1; // prevent division by zero
-        double gflops = (flops_per_elem * N) / elapsed / 1e9;
+        // a batch shorter than the timer overhead leaves nothing to measure
+        if (elapsed == 0) elapsed = g_timer_overhead / reps; // prevent division by zero
+        times.push_back(elapsed);
+        rates.push_back((flops_per_elem * N) / elapsed / 1e9);
+
+        warmup = detect_warmup(times);
+        if (!g_adaptive) {
+            if ((int)times.size() >= runs) break;
+            continue;
+        }
+        size_t steady = times.size() - warmup;
+        if ((int)steady >= g_min_runs && relative_ci(rates, warmup) <= g_ci_target) break;
+        if ((int)times.size() >= g_max_runs ||
+            duration<double>(end - budget_start).count() >= g_budget_sec) break;
+    }
+    if (warmup == times.size()) warmup = 0; // never settled: keep every sample
+    size_t samples = times.size() - warmup;
+    if (g_adaptive) {
+        printf("  %zu warmup + %zu samples, 95%% CI +/-%.2f%%\n",
+               warmup, samples, 100 * relative_ci(rates, warmup));
+    }
 
+    for (size_t run = 0; run < times.size(); run++) {
         // Export row to CSV
         g_csv << kernel << ","
               << run << ","
-              << elapsed << ","
-              << gflops << ","
+              << times[run] << ","
+              << rates[run] << ","
               << N << ","
               << g_type << ","
               << g_aligned << ","
@@ -81,7 +210,11 @@ void time_function(F f, const std::string& kernel, double flops_per_elem, size_t
               << (g_access_pattern == AccessPattern::UnitStride ? "unit-stride" :
                   g_access_pattern == AccessPattern::Strided ? "strided" : "gather") << ","
               << g_stride << ","
-              << g_memory_level << "\n";
+              << g_memory_level << ","
+              << (run < warmup) << ","
+              << samples << ","
+              << reps << ","
+              << std::to_string(starts[run]) << "\n";
               //<< "\"" << g_cmdline << "\"" << "\n";
               //"," << "\"" << g_compiler_args << "\"" << "\n";
               
@@ -168,6 +301,58 @@ void stencil_scalar(T* y, const T* x, T a, T b, T c, std::size_t N,
     do_not_optimize(y);
 }
 
+// -------------------- Multi-step stencil --------------------
+// Both versions apply the 3-point stencil `steps` times with fixed boundary
+// values (x[0] and x[N-1] never change) and leave the result in y.
+
+// Naive: one full sweep per timestep, ping-ponging between y and scratch,
+// so every step streams the whole array through the memory hierarchy.
+template <typename T>
+void stencil_multistep_naive(T* y, const T* x, T* scratch, T a, T b, T c,
+                             std::size_t N, int steps) {
+    const T* src = x;
+    for (int t = 0; t < steps; t++) {
+        // pick the destination so the last step lands in y
+        T* dst = ((steps - 1 - t) % 2 == 0) ? y : scratch;
+        dst[0] = src[0];
+        dst[N - 1] = src[N - 1];
+        for (std::size_t i = 1; i + 1 < N; i++)
+            dst[i] = a * src[i - 1] + b * src[i] + c * src[i + 1];
+        src = dst;
+    }
+    do_not_optimize(y);
+}
+
+// Blocked: overlapped (ghost-zone) time skewing. Each tile of `tile` outputs
+// loads tile + 2*steps inputs into two small buffers and runs all timesteps
+// there, shrinking the valid region by one point per side per step, so the
+// tile stays cache-resident and the array is streamed only once.
+template <typename T>
+void stencil_multistep_blocked(T* y, const T* x, T a, T b, T c,
+                               std::size_t N, int steps, std::size_t tile) {
+    std::vector<T> buf0(tile + 2 * steps), buf1(tile + 2 * steps);
+    for (std::size_t lo = 0; lo < N; lo += tile) {
+        std::size_t hi = std::min(lo + tile, N);
+        std::size_t glo = lo > (std::size_t)steps ? lo - steps : 0;
+        std::size_t ghi = std::min(hi + steps, N);
+        std::size_t w = ghi - glo;
+        std::copy(x + glo, x + ghi, buf0.data());
+        std::copy(x + glo, x + ghi, buf1.data());
+        T* src = buf0.data();
+        T* dst = buf1.data();
+        for (int s = 1; s <= steps; s++) {
+            // global boundaries stay fixed; interior tile edges lose one point per step
+            std::size_t left = (glo == 0) ? 1 : s;
+            std::size_t right = (ghi == N) ? w - 1 : w - s;
+            for (std::size_t i = left; i < right; i++)
+                dst[i] = a * src[i - 1] + b * src[i] + c * src[i + 1];
+            std::swap(src, dst);
+        }
+        std::copy(src + (lo - glo), src + (hi - glo), y + lo);
+    }
+    do_not_optimize(y);
+}
+
 // -------------------- Working-set size helper --------------------
 // Helper: get total working-set size for a kernel (sum of all arrays accessed)
 template <typename T>
@@ -176,40 +361,46 @@ size_t get_working_set_size(size_t N, int num_arrays) {
 }
 
 // Updated choose_N: returns N so that all arrays together fit in the cache level
-// Example cache sizes (adjust for your system):
-constexpr size_t L1_SMALL = 32 * 1024;   // 32 KB per core (L1 Data)
-constexpr size_t L1_LARGE = 192 * 1024; // 6 x 32 KB = 192 KB total L1 Data
-constexpr size_t L2_SIZE = 512 * 1024;  // 512 KB per core (L2)
-constexpr size_t L3_SIZE = 8 * 1024 * 1024; // 8 MB shared (L3)
-constexpr size_t DRAM_SIZE = 1ULL << 30; // 1 GB (arbitrary large)
+// Working-set targets in bytes. tester.py passes the sizes hostinfo.py detects
+// (--l1= --l1large= --l2= --l3= --dram=); these defaults are the machine this
+// was written for:
+size_t g_l1_small = 32 * 1024;   // 32 KB per core (L1 Data)
+size_t g_l1_large = 192 * 1024; // 6 x 32 KB = 192 KB total L1 Data
+size_t g_l2_size = 512 * 1024;  // 512 KB per core (L2)
+size_t g_l3_size = 8 * 1024 * 1024; // 8 MB shared (L3)
+size_t g_dram_size = 1ULL << 30; // 1 GB (arbitrary large)
+
+bool is_cache_flag(const std::string& arg) {
+    return arg.rfind("--l1=", 0) == 0 || arg.rfind("--l1large=", 0) == 0 || arg.rfind("--l2=", 0) == 0 ||
+           arg.rfind("--l3=", 0) == 0 || arg.rfind("--dram=", 0) == 0;
+}
 
 template <typename T>
 size_t choose_N(const std::string& memory_level, int num_arrays) {
     size_t cache_bytes = 0;
-    if (memory_level == "l1small") cache_bytes = L1_SMALL;
-    else if (memory_level == "l1large") cache_bytes = L1_LARGE;
-    else if (memory_level == "l2") cache_bytes = L2_SIZE;
-    else if (memory_level == "l3") cache_bytes = L3_SIZE;
-    else if (memory_level == "dram") cache_bytes = DRAM_SIZE;
+    if (memory_level == "l1small") cache_bytes = g_l1_small;
+    else if (memory_level == "l1large") cache_bytes = g_l1_large;
+    else if (memory_level == "l2") cache_bytes = g_l2_size;
+    else if (memory_level == "l3") cache_bytes = g_l3_size;
+    else if (memory_level == "dram") cache_bytes = g_dram_size;
     else cache_bytes = 8 * sizeof(T) * num_arrays; // default tiny
     return cache_bytes / (sizeof(T) * num_arrays);
 }
 
-// Simple sweep across cache levels
-std::vector<size_t> get_sweep_N() {
-    // Example sweep points for float32/int32 and float64
-    // Adjust as needed for your cache sizes
-    return {
-        1 * 1024,      // 1K
-        4 * 1024,      // 4K
-        16 * 1024,     // 16K
-        32 * 1024,     // 32K (L1)
-        192 * 1024,    // 192K (L1 total)
-        512 * 1024,    // 512K (L2)
-        2 * 1024 * 1024, // 2M (L3)
-        8 * 1024 * 1024, // 8M (L3 total)
-        32 * 1024 * 1024 // 32M (DRAM)
-    };
+// Sweep across cache levels: points on both sides of each L1/L2/L3 boundary
+// (same fractions as hostinfo.sweep_sizes) plus one point well into DRAM
+template <typename T>
+std::vector<size_t> get_sweep_N(int num_arrays) {
+    const double fractions[] = {0.25, 0.5, 0.8, 1.0, 1.25, 2.0};
+    size_t per_elem = sizeof(T) * num_arrays;
+    std::vector<size_t> points = {1024, 4 * std::max({g_l1_small, g_l2_size, g_l3_size}) / per_elem};
+    for (size_t cache : {g_l1_small, g_l2_size, g_l3_size})
+        for (double f : fractions)
+            points.push_back((size_t)(cache * f) / per_elem);
+    std::sort(points.begin(), points.end());
+    points.erase(std::unique(points.begin(), points.end()), points.end());
+    points.erase(std::remove(points.begin(), points.end(), (size_t)0), points.end());
+    return points;
 }
 
 // -------------------- Driver --------------------
@@ -218,7 +409,7 @@ void run_demo(const std::string& label) {
     int runs = 10;
     std::vector<size_t> N_sweep;
     if (g_memory_level == "sweep") {
-        N_sweep = get_sweep_N();
+        N_sweep = get_sweep_N<T>(2);
     } else {
         N_sweep = { choose_N<T>(g_memory_level, 2) };
     }
@@ -241,18 +432,29 @@ void run_demo(const std::string& label) {
             gather_idx = make_gather_indices(N, g_stride);
         }
         const std::vector<size_t>* gather_ptr = (g_access_pattern == AccessPattern::Gather) ? &gather_idx : nullptr;
+        if (g_timesteps > 0) {
+            // T-step stencil: naive repeated sweeps vs. temporally blocked tiles
+            // (zp is the naive version's ping-pong buffer)
+            size_t tile = g_tile ? g_tile : g_l2_size / (4 * sizeof(T)); // two tile buffers in half of L2
+            std::string steps = std::to_string(g_timesteps);
+            time_function([&]() { stencil_multistep_naive(yp, xp, zp, (T)1, (T)2, (T)3, N, g_timesteps); },
+                          "STENCIL_T" + steps, STENCIL_FLOPS_PER_ELEM * g_timesteps, N, runs);
+            time_function([&]() { stencil_multistep_blocked(yp, xp, (T)1, (T)2, (T)3, N, g_timesteps, tile); },
+                          "STENCIL_TB" + steps, STENCIL_FLOPS_PER_ELEM * g_timesteps, N, runs);
+            continue;
+        }
         // SAXPY
         time_function([&]() { saxpy_scalar(yp, xp, (T)3, N, g_access_pattern, g_stride, gather_ptr); },
-                      "SAXPY", 2.0, N, runs);
+                      "SAXPY", SAXPY_FLOPS_PER_ELEM, N, runs);
         // Dot
         time_function([&]() { dot_scalar(xp, yp, N, g_access_pattern, g_stride, gather_ptr); },
-                      "DOT", 2.0, N, runs);
+                      "DOT", DOT_FLOPS_PER_ELEM, N, runs);
         // Multiply
         time_function([&]() { mul_scalar(zp, xp, yp, N, g_access_pattern, g_stride, gather_ptr); },
-                      "MUL", 1.0, N, runs);
+                      "MUL", MUL_FLOPS_PER_ELEM, N, runs);
         // Stencil
         time_function([&]() { stencil_scalar(yp, xp, (T)1, (T)2, (T)3, N, g_access_pattern, g_stride, gather_ptr); },
-                      "STENCIL", 5.0, N, runs);
+                      "STENCIL", STENCIL_FLOPS_PER_ELEM, N, runs);
     }
 }
 
@@ -276,6 +478,13 @@ int main(int argc, char** argv) {
             printf("  --stride=N: strided access, N=2,4,8,...\n");
             printf("  --gather=N: gather-like access pattern, stride N\n");
             printf("  l1 / l2 / l3 / dram / sweep target working-set size for cache or memory hierarchy\n");
+            printf("  --l1=B --l1large=B --l2=B --l3=B --dram=B: working-set targets in bytes (not part of the CSV name)\n");
+            printf("  --timesteps=T: time T-step stencils (naive and temporally blocked) instead\n");
+            printf("  --tile=B: tile width in elements for the blocked stencil (default: fits in L2)\n");
+            printf("  --adaptive: sample until the 95%% CI of GFLOP/s converges (not part of the CSV name)\n");
+            printf("  --ci=R / --budget=S: adaptive CI half-width relative to the mean (0.02) and seconds per kernel (2)\n");
+            printf("  --min-runs=K / --max-runs=K: adaptive bounds on the number of samples (5, 1000)\n");
+            printf("  --min-sample=S: repeat the kernel until one timed sample lasts S seconds (0.001)\n");
             return 0;
         }else if (arg == "f32" || arg == "f64" || arg == "i32") {
             g_type = arg;
@@ -296,6 +505,38 @@ int main(int argc, char** argv) {
         } else if (arg.rfind("--gather=", 0) == 0) {
             g_access_pattern = AccessPattern::Gather;
             g_stride = std::stoi(arg.substr(9));
+        } else if (arg.rfind("--timesteps=", 0) == 0) {
+            g_timesteps = std::stoi(arg.substr(12));
+        } else if (arg.rfind("--tile=", 0) == 0) {
+            long long tile = std::stoll(arg.substr(7));
+            if (tile < 1) {
+                // the blocked stencil advances by `tile` outputs per tile; 0 would never finish
+                fprintf(stderr, "Error: --tile must be at least 1 (got %lld)\n", tile);
+                return 1;
+            }
+            g_tile = (size_t)tile;
+        } else if (arg == "--adaptive") {
+            g_adaptive = true;
+        } else if (arg.rfind("--ci=", 0) == 0) {
+            g_ci_target = std::stod(arg.substr(5));
+        } else if (arg.rfind("--budget=", 0) == 0) {
+            g_budget_sec = std::stod(arg.substr(9));
+        } else if (arg.rfind("--min-runs=", 0) == 0) {
+            g_min_runs = std::stoi(arg.substr(11));
+        } else if (arg.rfind("--max-runs=", 0) == 0) {
+            g_max_runs = std::stoi(arg.substr(11));
+        } else if (arg.rfind("--min-sample=", 0) == 0) {
+            g_min_sample_sec = std::stod(arg.substr(13));
+        } else if (arg.rfind("--l1=", 0) == 0) {
+            g_l1_small = std::stoull(arg.substr(5));
+        } else if (arg.rfind("--l1large=", 0) == 0) {
+            g_l1_large = std::stoull(arg.substr(10));
+        } else if (arg.rfind("--l2=", 0) == 0) {
+            g_l2_size = std::stoull(arg.substr(5));
+        } else if (arg.rfind("--l3=", 0) == 0) {
+            g_l3_size = std::stoull(arg.substr(5));
+        } else if (arg.rfind("--dram=", 0) == 0) {
+            g_dram_size = std::stoull(arg.substr(7));
         } else if (arg == "l1small" || arg == "l1large" || arg == "l2" || arg == "l3" || arg == "dram" || arg == "sweep") {
             g_memory_level = arg;
         }
@@ -303,10 +544,12 @@ int main(int argc, char** argv) {
 
     // Open CSV and write header
     // Prepend compiler variant (argv[1]) to filename, then join rest of args
+    // (measurement and cache-size flags excluded, so adaptive and fixed runs share a name)
     std::string csv_name;
     if (argc > 1) {
         csv_name = argv[1];
         for (int i = 2; i < argc; ++i) {
+            if (is_measurement_flag(argv[i]) || is_cache_flag(argv[i])) continue;
             csv_name += "_";
             csv_name += argv[i];
         }
@@ -319,7 +562,8 @@ int main(int argc, char** argv) {
     }
     csv_name += ".csv";
     g_csv.open(csv_name);
-    g_csv << "kernel,run,elapsed_sec,gflops,array_size,type,aligned,tail,access,stride,memory_level\n";
+    g_csv << "kernel,run,elapsed_sec,gflops,array_size,type,aligned,tail,access,stride,memory_level,warmup,samples,reps,timestamp\n";
+    g_timer_overhead = measure_timer_overhead();
 
     // Pin process to a single core (core 0) to ensure single-core execution for benchmarks
 #if defined(_WIN32) || defined(_WIN64)
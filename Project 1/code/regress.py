@@ -0,0 +1,138 @@
+import sys
+import math
+import numpy as np
+import dataset
+
+# -------------------------------
+# Regression gate
+# -------------------------------
+# Compares a fresh set of pro1 CSVs against a baseline set (e.g. a copy of an
+# experiment folder taken before a compiler or kernel change):
+#   python regress.py <baseline_dir> <new_dir> [--alpha=P] [--min-change=R]
+# Runs are matched per configuration -- kernel, variant, type, aligned, tail,
+# access, stride and array size -- and the steady-state GFLOP/s samples of
+# each side are compared with a two-sided Mann-Whitney U test. A configuration
+# counts as slower/faster when the test is significant at alpha AND the median
+# moved by more than min-change (timer noise on thousands of configurations
+# would otherwise flag a few by chance). The exit status is 1 when anything got
+# slower, so the script can gate a change.
+
+ALPHA = 0.01
+MIN_CHANGE = 0.03  # relative change in median GFLOP/s
+EXACT_MAX = 400    # n1*n2 up to which the exact U distribution is used (no ties)
+
+KEY_COLUMNS = ("kernel", "variant", "type", "aligned", "tail", "access", "stride", "array_size")
+
+def load_rates(exp_dir):
+    """(kernel, variant, type, aligned, tail, access, stride, array_size) -> steady-state GFLOP/s samples
+    (warmup flagged by pro1 or detected by dataset.py excluded)."""
+    df = dataset.load_tree(exp_dir)
+    if df is None:
+        return {}
+    df = df[df["steady"] & (df["gflops"] > 0)]
+    df = df.assign(**{c: "" for c in KEY_COLUMNS if c not in df.columns})
+    return {tuple(str(k) for k in key): g.tolist()
+            for key, g in df.groupby(list(KEY_COLUMNS), observed=True, dropna=False)["gflops"]}
+
+# -------------------------------
+# Mann-Whitney U
+# -------------------------------
+def rankdata(values):
+    """1-based ranks with ties given their average rank."""
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse], counts
+
+def exact_u_cdf(n1, n2):
+    """P(U <= u) for u = 0..n1*n2 under H0 without ties.
+
+    Coefficients of the Gaussian binomial [n1+n2 choose n1] in q: multiply by
+    (1 - q^(n1+i)) and divide by (1 - q^i) for i = 1..n2.
+    """
+    size = n1 * n2 + 1
+    poly = np.zeros(size)
+    poly[0] = 1.0
+    for i in range(1, n2 + 1):
+        shift = n1 + i
+        if shift < size:
+            poly[shift:] -= poly[:size - shift].copy()
+        # dividing by (1 - q^i) is a running sum with stride i
+        for start in range(i):
+            poly[start::i] = np.cumsum(poly[start::i])
+    return np.cumsum(poly) / poly.sum()
+
+def mann_whitney(x, y):
+    """Two-sided Mann-Whitney U test of x vs y; returns (U of x, p-value)."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n1, n2 = len(x), len(y)
+    ranks, ties = rankdata(np.concatenate([x, y]))
+    u1 = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    u = min(u1, n1 * n2 - u1)
+    if n1 * n2 <= EXACT_MAX and (ties == 1).all():
+        p = 2 * exact_u_cdf(n1, n2)[int(u)]
+    else:
+        # normal approximation with tie and continuity corrections
+        n = n1 + n2
+        tie_term = ((ties ** 3 - ties).sum()) / (n * (n - 1))
+        sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+        if sigma == 0:
+            return u1, 1.0
+        z = (n1 * n2 / 2 - u - 0.5) / sigma
+        p = math.erfc(max(z, 0) / math.sqrt(2))
+    return u1, min(p, 1.0)
+
+# -------------------------------
+# Comparison
+# -------------------------------
+def compare(baseline, new, alpha=ALPHA, min_change=MIN_CHANGE):
+    """One row per configuration present in both sets, with its status: slower, faster or same."""
+    rows = []
+    for key in sorted(set(baseline) & set(new)):
+        old, cur = baseline[key], new[key]
+        old_med, new_med = float(np.median(old)), float(np.median(cur))
+        change = new_med / old_med - 1
+        _, p = mann_whitney(cur, old)
+        status = "same"
+        if p < alpha and change <= -min_change:
+            status = "slower"
+        elif p < alpha and change >= min_change:
+            status = "faster"
+        rows.append(dict(zip(KEY_COLUMNS, key), old=old_med, new=new_med, change=change, p=p,
+                         n_old=len(old), n_new=len(cur), status=status))
+    return rows
+
+def print_table(rows, only_changed=True):
+    shown = [r for r in rows if r["status"] != "same"] if only_changed else rows
+    if not shown:
+        return
+    print(f"{'status':7s} {'kernel':8s} {'variant':8s} {'type':4s} {'al':2s} {'tl':2s} {'access':12s} "
+          f"{'stride':>6s} {'N':>10s} {'old GF/s':>9s} {'new GF/s':>9s} {'change':>8s} {'p':>8s}")
+    for r in sorted(shown, key=lambda r: r["change"]):
+        print(f"{r['status']:7s} {r['kernel']:8s} {r['variant']:8s} {r['type']:4s} {r['aligned']:2s} "
+              f"{r['tail']:2s} {r['access']:12s} {r['stride']:>6s} {r['array_size']:>10s} {r['old']:9.3f} "
+              f"{r['new']:9.3f} {r['change']:+7.1%} {r['p']:8.2g}")
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if len(args) != 2:
+        print("Usage: python regress.py <baseline_dir> <new_dir> [--alpha=P] [--min-change=R] [--all]")
+        sys.exit(2)
+    alpha, min_change = ALPHA, MIN_CHANGE
+    for a in sys.argv[1:]:
+        if a.startswith("--alpha="):
+            alpha = float(a[len("--alpha="):])
+        elif a.startswith("--min-change="):
+            min_change = float(a[len("--min-change="):])
+    baseline, new = load_rates(args[0]), load_rates(args[1])
+    rows = compare(baseline, new, alpha, min_change)
+    print_table(rows, only_changed="--all" not in sys.argv[1:])
+    counts = {s: sum(r["status"] == s for r in rows) for s in ("slower", "faster", "same")}
+    print(f"\n{len(rows)} configurations compared ({len(set(baseline) ^ set(new))} only in one set): "
+          f"{counts['slower']} slower, {counts['faster']} faster, {counts['same']} unchanged "
+          f"(alpha={alpha}, min change={min_change:.0%})")
+    sys.exit(1 if counts["slower"] else 0)
@@ -0,0 +1,164 @@
+import os
+import csv
+import sys
+import json
+import time
+import hashlib
+import socket
+import sqlite3
+import hostinfo
+
+# -------------------------------
+# Results store
+# -------------------------------
+# One SQLite database (results.db) that every pro1 run is appended to, so
+# analysis can query by configuration instead of parsing CSV file names:
+#   runs     one row per pro1 invocation: configuration (from the CSV columns),
+#            pro1 arguments, compiler flags, binary hash, CPU model, governor,
+#            host, timestamp, the counters sidecar if there is one and the
+#            CSV's md5 (csv_hash)
+#   samples  one row per timed sample, keyed by run_id and indexed by kernel
+# tester.py adds each run as it finishes; `python results_store.py import
+# <dir>...` backfills CSVs produced before the store existed.
+
+DB_NAME = "results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    csv_name TEXT NOT NULL, csv_hash TEXT,
+    variant TEXT, type TEXT, aligned INTEGER, tail INTEGER,
+    access TEXT, stride INTEGER, memory_level TEXT,
+    args TEXT, compiler_flags TEXT, binary_hash TEXT,
+    cpu_model TEXT, governor TEXT, hostname TEXT, timestamp TEXT,
+    counters TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    kernel TEXT, run INTEGER, elapsed_sec REAL, gflops REAL, array_size INTEGER,
+    warmup INTEGER, samples INTEGER, reps INTEGER,
+    timestamp REAL, freq_mhz REAL, freq_drift INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run_id);
+CREATE INDEX IF NOT EXISTS samples_kernel ON samples(kernel);
+CREATE INDEX IF NOT EXISTS runs_config ON runs(variant, type, memory_level);
+"""
+# indexes on migrated columns, created once connect() has added them
+INDEXES = "CREATE INDEX IF NOT EXISTS runs_hash ON runs(csv_hash);"
+
+SAMPLE_COLUMNS = ["kernel", "run", "elapsed_sec", "gflops", "array_size", "warmup", "samples", "reps",
+                  "timestamp", "freq_mhz", "freq_drift"]
+SAMPLE_TYPES = {"timestamp": "REAL", "freq_mhz": "REAL", "freq_drift": "INTEGER"}
+RUN_TYPES = {"csv_hash": "TEXT"}
+
+def connect(path=DB_NAME):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    # databases created before a column existed get it added (NULL for old rows)
+    for table, types in (("samples", SAMPLE_TYPES), ("runs", RUN_TYPES)):
+        have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for col, kind in types.items():
+            if col not in have:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {kind}")
+    conn.executescript(INDEXES)
+    return conn
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def add_run(conn, csv_path, variant, args=(), compiler_flags="", binary_hash=None, counters=None,
+            timestamp=None, csv_name=None):
+    """Append one pro1 CSV as a run with its samples; returns the run_id.
+
+    csv_name is how the run refers to its CSV (default: the file name).
+    """
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    first = rows[0] if rows else {}
+    cur = conn.execute(
+        "INSERT INTO runs (csv_name, csv_hash, variant, type, aligned, tail, access, stride, memory_level, args,"
+        " compiler_flags, binary_hash, cpu_model, governor, hostname, timestamp, counters)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (csv_name or os.path.basename(csv_path), file_hash(csv_path), variant,
+         first.get("type"), first.get("aligned"), first.get("tail"), first.get("access"), first.get("stride"), first.get("memory_level"), json.dumps(list(args)),
+         compiler_flags, binary_hash, hostinfo.cpu_model(), hostinfo.governor(), socket.gethostname(),
+         timestamp or time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+         json.dumps(counters) if counters is not None else None))
+    run_id = cur.lastrowid
+    # newer columns are missing from CSVs written before pro1/tester.py recorded them
+    defaults = {"warmup": 0, "samples": len(rows), "reps": 1}
+    conn.executemany(
+        f"INSERT INTO samples (run_id, {', '.join(SAMPLE_COLUMNS)}) VALUES (?{', ?' * len(SAMPLE_COLUMNS)})",
+        [(run_id,) + tuple(r.get(c, defaults.get(c)) for c in SAMPLE_COLUMNS) for r in rows])
+    conn.commit()
+    return run_id
+
+def import_dir(exp_dir, path=DB_NAME):
+    """Add every pro1 CSV under exp_dir that the store does not hold yet; returns how many were added.
+
+    Runs are named by their path under exp_dir's folder (e.g. exp3/<csv>): experiments reuse file
+    names, so a bare name is no key. A CSV is already held when a run has its path, or its file
+    name and content (md5) -- tester.py's run, after the CSV was moved into the folder. The
+    variant is the file name's first token -- the one thing only the name records.
+    """
+    conn = connect(path)
+    names, contents = set(), set()
+    for name, digest in conn.execute("SELECT csv_name, csv_hash FROM runs"):
+        names.add(name)
+        contents.add((os.path.basename(name), digest))
+    parent = os.path.dirname(os.path.abspath(exp_dir))
+    added = 0
+    for root, _, files in os.walk(exp_dir):
+        for fname in sorted(files):
+            if not fname.endswith(".csv"):
+                continue
+            with open(os.path.join(root, fname)) as f:
+                if not f.readline().startswith("kernel,run,"):
+                    continue  # not a pro1 CSV (thread scaling, tuning results...)
+            name = os.path.relpath(os.path.abspath(os.path.join(root, fname)), parent)
+            digest = file_hash(os.path.join(root, fname))
+            if name in names or (fname, digest) in contents:
+                print(f"  skipping {name}: already stored")
+                continue
+            counters_path = os.path.join(root, fname[:-len(".csv")] + ".counters.json")
+            counters = None
+            if os.path.exists(counters_path):
+                with open(counters_path) as f:
+                    counters = json.load(f)["counters"]
+            mtime = time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(os.path.getmtime(os.path.join(root, fname))))
+            add_run(conn, os.path.join(root, fname), fname.split("_")[0], counters=counters, timestamp=mtime,
+                    csv_name=name)
+            added += 1
+    conn.close()
+    return added
+
+def load_samples(path=DB_NAME, where="", params=()):
+    """Samples joined with their run's metadata as a DataFrame, optionally filtered by a SQL WHERE clause.
+
+    Rows come run by run in sample order (insertion order), as warm-up detection expects.
+    """
+    import pandas as pd
+    conn = connect(path)
+    # runs.timestamp is when the run was stored; a sample's own start is sample_timestamp
+    columns = [f"samples.{c}" if c != "timestamp" else "samples.timestamp AS sample_timestamp"
+               for c in SAMPLE_COLUMNS]
+    query = ("SELECT runs.*, " + ", ".join(columns) +
+             " FROM samples JOIN runs USING (run_id)" + (f" WHERE {where}" if where else "") +
+             " ORDER BY samples.rowid")
+    df = pd.read_sql_query(query, conn, params=params)
+    conn.close()
+    return df
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "import":
+        for d in sys.argv[2:]:
+            print(f"{d}: added {import_dir(d)} runs to {DB_NAME}")
+    else:
+        conn = connect()
+        runs, samples = conn.execute("SELECT COUNT(*), (SELECT COUNT(*) FROM samples) FROM runs").fetchone()
+        print(f"{DB_NAME}: {runs} runs, {samples} samples")
+        for row in conn.execute("SELECT variant, type, memory_level, COUNT(*) FROM runs"
+                                " GROUP BY variant, type, memory_level ORDER BY 1, 2, 3"):
+            print("  {:8s} {:4s} {:8s} {:5d} runs".format(*row))
+        print("Usage: python results_store.py import <dir> [<dir>...]")
@@ -0,0 +1,117 @@
+// stream_bw.c
+// STREAM-style copy and triad bandwidth at given working-set sizes (one line per size).
+// Compile: gcc -O3 -march=native stream_bw.c -o stream_bw
+// Run: ./stream_bw [--core=N] <bytes> [<bytes>...]
+// ceilings.py builds and runs this with the L1/L2/L3/DRAM working sets from hostinfo.py.
+//
+// Bytes are counted as in STREAM: copy moves 16 bytes per element (one load,
+// one store), triad 24 (two loads, one store); write-allocate traffic is not
+// counted. Each size reports the best of TRIALS timed batches.
+
+#ifndef _WIN32
+#define _GNU_SOURCE  // sched_setaffinity
+#endif
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <sched.h>
+#endif
+
+#define TRIALS 7
+#define MIN_BATCH_SEC 0.02  // repeat the kernel until one timed batch takes this long
+
+static void pin_to_core(int core) {
+#ifdef _WIN32
+    if (SetThreadAffinityMask(GetCurrentThread(), (DWORD_PTR)1 << core) == 0) {
+        fprintf(stderr, "Failed to set thread affinity\n");
+    }
+#else
+    cpu_set_t set;
+    CPU_ZERO(&set);
+    CPU_SET(core, &set);
+    if (sched_setaffinity(0, sizeof(set), &set) != 0) {
+        fprintf(stderr, "Failed to set thread affinity\n");
+    }
+#endif
+}
+
+static double now_seconds(void) {
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return t.tv_sec + t.tv_nsec * 1e-9;
+}
+
+// keeps the compiler from merging or dropping repeated passes
+#define BARRIER() __asm__ __volatile__("" ::: "memory")
+
+static void copy(double* restrict c, const double* restrict a, size_t n) {
+    for (size_t i = 0; i < n; ++i) c[i] = a[i];
+}
+
+static void triad(double* restrict a, const double* restrict b, const double* restrict c, double s, size_t n) {
+    for (size_t i = 0; i < n; ++i) a[i] = b[i] + s * c[i];
+}
+
+// best seconds per pass over TRIALS batches of `reps` passes
+#define BEST_PASS(CALL, best)                                 \
+    {                                                         \
+        best = 1e30;                                          \
+        for (int t = 0; t < TRIALS; ++t) {                    \
+            double t0 = now_seconds();                        \
+            for (long r = 0; r < reps; ++r) { CALL; BARRIER(); } \
+            double dt = (now_seconds() - t0) / reps;          \
+            if (dt < best) best = dt;                         \
+        }                                                     \
+    }
+
+static void measure(size_t bytes) {
+    size_t n = bytes / (3 * sizeof(double));  // triad's three arrays fill the working set
+    if (n < 64) n = 64;
+    size_t alloc = ((n * sizeof(double) + 63) / 64) * 64;
+    double* a = aligned_alloc(64, alloc);
+    double* b = aligned_alloc(64, alloc);
+    double* c = aligned_alloc(64, alloc);
+    if (!a || !b || !c) {
+        fprintf(stderr, "allocation of %zu bytes failed\n", 3 * alloc);
+        exit(1);
+    }
+    for (size_t i = 0; i < n; ++i) { a[i] = 1.0; b[i] = 2.0; c[i] = 0.0; }
+
+    // calibrate the batch length on one pass (also warms the caches and TLB)
+    double t0 = now_seconds();
+    triad(a, b, c, 3.0, n);
+    double one = now_seconds() - t0;
+    long reps = one > 0 ? (long)(MIN_BATCH_SEC / one) + 1 : 1000;
+
+    double best_copy, best_triad;
+    BEST_PASS(copy(c, a, n), best_copy);
+    BEST_PASS(triad(a, b, c, 3.0, n), best_triad);
+
+    printf("bytes=%zu n=%zu copy_gbs=%.3f triad_gbs=%.3f\n", bytes, n,
+           16.0 * n / best_copy / 1e9, 24.0 * n / best_triad / 1e9);
+    fflush(stdout);
+    free(a); free(b); free(c);
+}
+
+int main(int argc, char** argv) {
+    int sizes = 0;
+    for (int i = 1; i < argc; ++i) {
+        if (strncmp(argv[i], "--core=", 7) == 0) {
+            pin_to_core(atoi(argv[i] + 7));
+        }
+    }
+    for (int i = 1; i < argc; ++i) {
+        if (strncmp(argv[i], "--", 2) == 0) continue;
+        measure((size_t)strtoull(argv[i], NULL, 10));
+        ++sizes;
+    }
+    if (sizes == 0) {
+        printf("usage: %s [--core=N] <bytes> [<bytes>...]\n", argv[0]);
+        return 1;
+    }
+    return 0;
+}
@@ -1,16 +1,33 @@
 import itertools
 import subprocess
 import os
+import json
+import hashlib
+import shutil
+import csv
+import random
+import statistics
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import kernel_registry
+import hostinfo
+import results_store
+import ceilings
 
 # ------------------- Config -------------------
 
 source_file = "pro1.cpp"
-exe_name = "pro1"
+exe_name = "pro1"  # each variant builds its own pro1_<variant> binary
+build_inputs = [source_file, kernel_registry.HEADER_NAME]  # files hashed into the build cache key
+build_cache = "build_cache.json"
+run_manifest = "run_manifest.json"  # CSV name -> spec and binary hash of the run that wrote it
 
 compiler_variants = {
-    "scalar": ["g++", "-O1", "-Wall", "-fno-tree-vectorize", "-fno-tree-slp-vectorize", source_file, "-o", exe_name],
-    #"auto": ["g++", "-O3", "-Wall", "-march=native", source_file, "-o", exe_name],
-    "simd": ["g++", "-O3", "-Wall", "-mavx2", "-mfma", "-march=native", "-ffast-math", source_file, "-o", exe_name],
+    "scalar": ["g++", "-O1", "-Wall", "-fno-tree-vectorize", "-fno-tree-slp-vectorize"],
+    #"auto": ["g++", "-O3", "-Wall", "-march=native"],
+    "simd": ["g++", "-O3", "-Wall", "-mavx2", "-mfma", "-march=native", "-ffast-math"],
 }
 
 types = ["f32", "f64", "i32"]
@@ -18,6 +35,74 @@ alignments = ["--aligned", "--misaligned"]
 tails = ["--tail", "--no-tail"]
 access_patterns = ["--unit-stride", "--stride=2", "--stride=4", "--stride=8", "--gather=2", "--gather=4", "--gather=8"]
 memory_levels = ["l1small", "l1large", "l2", "l3", "dram", "sweep"]
+timesteps = 8  # stencil_tb: timesteps per multi-step stencil call
+# pro1 options that change how a point is measured, not what it is; pro1 leaves
+# them out of the CSV name. e.g. python tester.py exp1 --adaptive --ci=0.01 --budget=5
+measurement_prefixes = ("--adaptive", "--ci=", "--budget=", "--min-runs=", "--max-runs=", "--min-sample=",
+                        "--l1=", "--l1large=", "--l2=", "--l3=", "--dram=")
+measurement_flags = []
+# this machine's cache sizes as pro1 working-set targets (see hostinfo.py)
+cache_flags = hostinfo.pro1_flags()
+
+# ------------------- Build Cache -------------------
+
+def exe_path(comp_name):
+    return f"{exe_name}_{comp_name}"
+
+def build_command(comp_name):
+    return compiler_variants[comp_name] + [source_file, "-o", exe_path(comp_name)]
+
+def build_hash(comp_name):
+    # Source, generated header, flags and compiler version: any change forces a rebuild
+    h = hashlib.sha256()
+    cmd = build_command(comp_name)
+    h.update(" ".join(cmd).encode())
+    h.update(subprocess.run([cmd[0], "--version"], capture_output=True).stdout)
+    for fname in build_inputs:
+        with open(fname, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def load_build_cache():
+    if not os.path.exists(build_cache):
+        return {}
+    with open(build_cache) as f:
+        return json.load(f)
+
+def build_all(variants=None, keep_going=False):
+    # Build every compiler variant once, in parallel, skipping binaries whose hash is unchanged.
+    # With keep_going a variant that fails to compile is reported and left out of the result
+    variants = list(variants or compiler_variants)
+    cache = load_build_cache()
+    hashes = {name: build_hash(name) for name in variants}
+    stale = [name for name in variants
+             if cache.get(name) != hashes[name] or not os.path.exists(exe_path(name))]
+    for name in variants:
+        if name not in stale:
+            print(f"{exe_path(name)} is up to date")
+
+    def build(name):
+        print(f"building with: {build_command(name)}")
+        try:
+            subprocess.run(build_command(name), check=True)
+        except subprocess.CalledProcessError as e:
+            if not keep_going:
+                raise
+            print(f"build of {exe_path(name)} failed (exit status {e.returncode})")
+            return name, False
+        return name, True
+
+    failed = set()
+    # one compiler per core at most: the tune mode can make dozens of variants stale at once
+    with ThreadPoolExecutor(max_workers=max(min(len(stale), os.cpu_count() or 1), 1)) as pool:
+        for name, ok in pool.map(build, stale):
+            if not ok:
+                failed.add(name)
+                continue
+            cache[name] = hashes[name]
+            with open(build_cache, "w") as f:
+                json.dump(cache, f, indent=2)
+    return {name: exe_path(name) for name in variants if name not in failed}
 
 # ------------------- Run Harness -------------------
 
@@ -41,171 +126,488 @@ def check_csv_files(expected_files):
         for f in unexpected:
             print(f"  {f}")
 
-def exp1():
-    # Baseline (scalar) vs auto-vectorized
-    # Build a scalar-only baseline and an auto-vectorized version for each selected kernel. Measure runtime
-    # across sizes spanning L1→L2→LLC→DRAM. Report speedup = scalar_time / simd_time and achieved
-    # GFLOP/s
+# ------------------- Counters -------------------
+# Optional (--counters): each pro1 run is wrapped in `perf stat` when perf works
+# on this machine, and its rusage (page faults, context switches, CPU time) is
+# collected through os.wait4 either way. The totals for the whole run go to a
+# <csv name>.counters.json sidecar that analyze.py merges with the CSV.
+
+collect_counters = False
+perf_events = ["cycles", "instructions", "cache-references", "cache-misses",
+               "LLC-load-misses", "dTLB-load-misses"]
+_perf_works = None
+
+def perf_available():
+    global _perf_works
+    if _perf_works is None:
+        try:
+            _perf_works = shutil.which("perf") is not None and subprocess.run(
+                ["perf", "stat", "-x,", "-e", "instructions", "true"], capture_output=True).returncode == 0
+        except OSError:
+            _perf_works = False
+    return _perf_works
 
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands
-        print(f"building with: {comp_cmd}")
-        for mem in memory_levels[:5]: #skip sweep for this experiment
-            args = [f"./{exe_name}", comp_name ,str(types[0]), str(alignments[0]), str(tails[1]), str(access_patterns[0]), mem]
-            print("Running:", " ".join(args))
-            subprocess.run(comp_cmd, check=True)
+def counters_for(args):
+    return csv_for(args)[:-len(".csv")] + ".counters.json"
+
+def parse_perf(path):
+    # perf stat -x, lines: value,unit,event,... ("<not supported>" values are skipped)
+    counts = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(",")
+            if len(fields) < 3 or line.startswith("#"):
+                continue
             try:
-                subprocess.run(args, check=True)
-                csv_name = "_".join(args[1:]) + ".csv"
-                expected_files.append(csv_name)
-                if os.path.exists(csv_name):
-                    print(f"CSV file produced: {csv_name}")
-                else:
-                    print(f"CSV file not found: {csv_name}")
+                value = float(fields[0])
+            except ValueError:
+                continue
+            # hybrid CPUs report cpu_core/cycles/ and cpu_atom/cycles/ separately
+            event = fields[2].split("/")[-2] if "/" in fields[2] else fields[2]
+            event = event.split(":")[0]
+            counts[event] = counts.get(event, 0) + value
+    return counts
+
+def write_counters(args, perf_out, usage):
+    counters, sources = {}, []
+    if perf_out and os.path.exists(perf_out):
+        counters.update(parse_perf(perf_out))
+        os.remove(perf_out)
+        sources.append("perf")
+    if usage is not None:
+        counters.update({
+            "utime_sec": usage.ru_utime, "stime_sec": usage.ru_stime,
+            "maxrss_kb": usage.ru_maxrss,
+            "minor_faults": usage.ru_minflt, "major_faults": usage.ru_majflt,
+            "voluntary_ctx_switches": usage.ru_nvcsw, "involuntary_ctx_switches": usage.ru_nivcsw,
+        })
+        sources.append("rusage")
+    with open(counters_for(args), "w") as f:
+        json.dump({"args": args[1:], "sources": sources, "counters": counters}, f, indent=2)
+
+# ------------------- Frequency -------------------
+# While a pro1 run is going, a thread samples the pinned core's clock
+# (cpufreq scaling_cur_freq, else the "cpu MHz" of /proc/cpuinfo) every
+# freq_interval seconds. Afterwards every CSV row gets freq_mhz, the mean of
+# the samples taken during it (matched by pro1's timestamp column), and
+# freq_drift, set on every row of a run whose steady-state frequency spread
+# (max - min) / median exceeds freq_drift_threshold.
+
+track_frequency = True  # --no-freq turns it off
+freq_interval = 0.02
+freq_drift_threshold = 0.05
+
+def read_freq_mhz(core):
+    try:
+        with open(f"/sys/devices/system/cpu/cpu{core}/cpufreq/scaling_cur_freq") as f:
+            return int(f.read()) / 1000.0  # kHz
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/proc/cpuinfo") as f:
+            current = None
+            for line in f:
+                if line.startswith("processor"):
+                    current = int(line.split(":")[1])
+                elif line.startswith("cpu MHz") and current == core:
+                    return float(line.split(":")[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+def sample_frequency(core, stop, samples):
+    # Thread body: append (epoch seconds, MHz) until `stop` is set
+    while True:
+        mhz = read_freq_mhz(core)
+        if mhz is None:
+            return  # no frequency source on this machine
+        samples.append((time.time(), mhz))
+        if stop.wait(freq_interval):
+            return
+
+def add_frequency(csv_name, samples):
+    # Add freq_mhz/freq_drift columns to a pro1 CSV; returns the run's relative drift (None: no data)
+    if not samples or not os.path.exists(csv_name):
+        return None
+    with open(csv_name, newline="") as f:
+        reader = csv.DictReader(f)
+        fields, rows = reader.fieldnames, list(reader)
+    if not rows or "timestamp" not in fields:
+        return None
+    for row in rows:
+        start = float(row["timestamp"])
+        end = start + float(row["elapsed_sec"]) * int(row.get("reps") or 1)
+        during = [mhz for t, mhz in samples if start <= t <= end]
+        if not during:  # sample shorter than freq_interval: nearest reading
+            during = [min(samples, key=lambda s: abs(s[0] - start))[1]]
+        row["freq_mhz"] = f"{statistics.mean(during):.1f}"
+    freqs = [float(r["freq_mhz"]) for r in rows]
+    steady = [f for f, r in zip(freqs, rows) if r.get("warmup", "0") == "0"] or freqs
+    drift = (max(steady) - min(steady)) / statistics.median(steady)
+    for row in rows:
+        row["freq_drift"] = int(drift > freq_drift_threshold)
+    with open(csv_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=[c for c in fields if c not in ("freq_mhz", "freq_drift")]
+                                + ["freq_mhz", "freq_drift"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return drift
+
+# ------------------- Scheduler -------------------
+# Every pro1 run is pinned to one core. Runs whose working set fits in a core's
+# private L1/L2 do not interfere, so they run side by side on distinct physical
+# cores; l3/dram/sweep runs share the LLC and memory bus and run one at a time
+# on a quiet machine after the parallel batch.
+
+serial_levels = {"l3", "dram", "sweep"}
+parallel_jobs = None  # max concurrent L1/L2 runs (None: one per physical core)
+
+def physical_cores():
+    # One logical CPU per physical core among the CPUs this process may use
+    try:
+        allowed = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # no affinity API (Windows/macOS)
+        return list(range(os.cpu_count() or 1))
+    cores, seen = [], set()
+    for cpu in allowed:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                siblings = f.read().strip()
+        except OSError:
+            siblings = str(cpu)
+        if siblings not in seen:
+            seen.add(siblings)
+            cores.append(cpu)
+    return cores
+
+def pin_to(core):
+    if hasattr(os, "sched_setaffinity"):
+        return lambda: os.sched_setaffinity(0, {core})
+    return None  # pinning unsupported here: run unpinned
+
+def csv_for(args):
+    # pro1 names its CSV after its arguments, minus measurement flags
+    return "_".join(a for a in args[1:] if not a.startswith(measurement_prefixes)) + ".csv"
+
+def run_pinned(args, core, capture=False):
+    # Run one configuration on `core`; returns (csv_name, output or None)
+    line = f"Running on core {core}: " + " ".join(args)
+    if not capture:
+        print(line)
+    cmd, perf_out = args, None
+    if collect_counters and perf_available():
+        perf_out = counters_for(args) + ".perf"
+        cmd = ["perf", "stat", "-x,", "-e", ",".join(perf_events), "-o", perf_out, "--"] + args
+    freq_samples, stop = [], threading.Event()
+    sampler = threading.Thread(target=sample_frequency, args=(core, stop, freq_samples), daemon=True)
+    if track_frequency:
+        sampler.start()
+    proc = subprocess.Popen(cmd, preexec_fn=pin_to(core), text=True,
+                            stdout=subprocess.PIPE if capture else None,
+                            stderr=subprocess.STDOUT if capture else None)
+    output = proc.stdout.read() if capture else None
+    usage = None
+    if collect_counters and hasattr(os, "wait4"):
+        # wait4 reports the child's own rusage (including perf's child, once reaped)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        proc.wait()
+    if track_frequency:
+        stop.set()
+        sampler.join()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args, output)
+    if collect_counters:
+        write_counters(args, perf_out, usage)
+    drift = add_frequency(csv_for(args), freq_samples)
+    if drift is not None and drift > freq_drift_threshold:
+        warning = f"WARNING: core {core} frequency drifted {100 * drift:.1f}% during {csv_for(args)}"
+        if capture:
+            line += "\n" + warning
+        else:
+            print(warning)
+    return csv_for(args), line + "\n" + output if capture else None
+
+def spec_hash(args):
+    # Everything after the binary path: variant, pro1 options and memory level
+    return hashlib.sha256(json.dumps(args[1:]).encode()).hexdigest()
+
+def load_manifest():
+    if not os.path.exists(run_manifest):
+        return {}
+    with open(run_manifest) as f:
+        return json.load(f)
+
+def run_configs(configs, force=False):
+    # Run each argument list through pro1; returns the CSV names they should produce.
+    # A configuration is skipped when its CSV exists and the manifest records the
+    # same spec and binary hash for it, unless force is set.
+    builds = load_build_cache()
+    manifest = load_manifest()
+    by_csv = {csv_for(args): args for args in configs}
+    stamps = {csv_for(args): {"spec": spec_hash(args), "binary": builds.get(args[1])}
+              for args in configs}
+    done = [args for args in configs if not force and os.path.exists(csv_for(args))
+            and manifest.get(csv_for(args)) == stamps[csv_for(args)]
+            and (not collect_counters or os.path.exists(counters_for(args)))]
+    if done:
+        print(f"Skipping {len(done)} of {len(configs)} configurations with up-to-date CSVs")
+    configs = [args for args in configs if args not in done]
+    for args in configs:
+        if os.path.exists(csv_for(args)):
+            os.remove(csv_for(args))  # stale: a failed rerun must not look produced
+    cores = physical_cores()
+    parallel = [args for args in configs if args[-1] not in serial_levels]
+    serial = [args for args in configs if args[-1] in serial_levels]
+    # keep the first core for this script when there are others to spare
+    workers = cores[1:] if len(cores) > 1 else cores
+    workers = workers[:parallel_jobs] if parallel_jobs else workers
+    free = queue.Queue()
+    for core in workers:
+        free.put(core)
+
+    def run_parallel(args):
+        core = free.get()
+        try:
+            return run_pinned(args, core, capture=True)
+        finally:
+            free.put(core)
+
+    expected_files = [csv_for(args) for args in done]
+    store = results_store.connect()
+
+    def report(csv_name, output=None):
+        expected_files.append(csv_name)
+        if output:
+            print(output, end="")
+        if os.path.exists(csv_name):
+            print(f"CSV file produced: {csv_name}")
+            manifest[csv_name] = stamps[csv_name]
+            with open(run_manifest, "w") as f:
+                json.dump(manifest, f, indent=2)
+            args = by_csv[csv_name]
+            counters = None
+            if os.path.exists(counters_for(args)):
+                with open(counters_for(args)) as f:
+                    counters = json.load(f)["counters"]
+            results_store.add_run(store, csv_name, args[1], args[1:], " ".join(compiler_variants[args[1]]),
+                                  builds.get(args[1]), counters)
+        else:
+            print(f"CSV file not found: {csv_name}")
+
+    with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+        futures = {pool.submit(run_parallel, args): args for args in parallel}
+        for future in as_completed(futures):
+            try:
+                report(*future.result())
             except subprocess.CalledProcessError as e:
                 print("Error running:", e)
-    check_csv_files(expected_files)
+                expected_files.append(csv_for(futures[future]))
+    for args in serial:
+        try:
+            report(*run_pinned(args, cores[0]))
+        except subprocess.CalledProcessError as e:
+            print("Error running:", e)
+            expected_files.append(csv_for(args))
+    store.close()
+    return expected_files
+
+# ------------------- Experiments -------------------
+# Each experiment is a cross-product over the axes of axis_defaults; an axis
+# it does not list takes its default. "extra" adds pro1 options before the
+# memory level and "filter" drops configurations (it is called with a dict of
+# one value per axis).
+
+axis_defaults = {
+    "variants": list(compiler_variants),
+    "types": types[:1],
+    "alignments": alignments[:1],
+    "tails": tails[1:],
+    "access_patterns": access_patterns[:1],
+    "memory_levels": memory_levels[4:5],
+}
 
-def exp2():
+experiments = {
+    # Baseline (scalar) vs auto-vectorized
+    # Build a scalar-only baseline and an auto-vectorized version for each selected kernel. Measure runtime
+    # across sizes spanning L1→L2→LLC→DRAM. Report speedup = scalar_time / simd_time and achieved
+    # GFLOP/s
+    "exp1": {"memory_levels": memory_levels[:5]},
     # Locality (working-set) sweep
     # For one kernel, sweep N to cross cache levels. From the same runs, produce GFLOP/s (or GiB/s for purely
     # streaming) and CPE; annotate cache transitions. Discuss where SIMD gains compress as the kernel
     # becomes memory-bound
-
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands
-        print(f"building with: {comp_cmd}")
-        args = [f"./{exe_name}", comp_name, str(types[0]), str(alignments[0]), str(tails[1]), str(access_patterns[0]), memory_levels[5]]
-        print("Running:", " ".join(args))
-        subprocess.run(comp_cmd, check=True)
-        try:
-            subprocess.run(args, check=True)
-            csv_name = "_".join(args[1:]) + ".csv"
-            expected_files.append(csv_name)
-            if os.path.exists(csv_name):
-                print(f"CSV file produced: {csv_name}")
-            else:
-                print(f"CSV file not found: {csv_name}")
-        except subprocess.CalledProcessError as e:
-            print("Error running:", e)
-    check_csv_files(expected_files)
-
-def exp3():
+    "exp2": {"memory_levels": ["sweep"]},
     # Alignment & tail handling
     # Compare aligned vs misaligned inputs and sizes with/without a vector tail. Quantify the throughput gap
     # and explain (prologue/epilogue cost, unaligned loads, masking)
-
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands 
-        print(f"building with: {comp_cmd}")
-        for align, tail in itertools.product(alignments, tails):
-            args = [f"./{exe_name}", comp_name, str(types[0]), align, tail, str(access_patterns[0]), memory_levels[4]]
-            print("Running:", " ".join(args))
-            subprocess.run(comp_cmd, check=True)
-            try:
-                subprocess.run(args, check=True)
-                csv_name = "_".join(args[1:]) + ".csv"
-                expected_files.append(csv_name)
-                if os.path.exists(csv_name):
-                    print(f"CSV file produced: {csv_name}")
-                else:
-                    print(f"CSV file not found: {csv_name}")
-            except subprocess.CalledProcessError as e:
-                print("Error running:", e)
-    check_csv_files(expected_files)
-
-def exp4():
+    "exp3": {"alignments": alignments, "tails": tails},
     # Stride / gather effects
     # Evaluate unit-stride vs strided/gather-like patterns (where meaningful). Show the impact on effective
     # bandwidth and SIMD efficiency; explain prefetcher and cache-line utilization effects.
-
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands 
-        print(f"building with: {comp_cmd}")
-        for access in access_patterns:
-            args = [f"./{exe_name}", comp_name, str(types[0]), str(alignments[0]), str(tails[1]), access, str(memory_levels[4])]
-            print("Running:", " ".join(args))
-            subprocess.run(comp_cmd, check=True)
-            try:
-                subprocess.run(args, check=True)
-                csv_name = "_".join(args[1:]) + ".csv"
-                expected_files.append(csv_name)
-                if os.path.exists(csv_name):
-                    print(f"CSV file produced: {csv_name}")
-                else:
-                    print(f"CSV file not found: {csv_name}")
-            except subprocess.CalledProcessError as e:
-                print("Error running:", e)
-    check_csv_files(expected_files)
-
-def exp5():
+    "exp4": {"access_patterns": access_patterns},
     # Data type comparison
     # Compare float32 vs float64 (and optionally int32). Report how vector width (lanes) and arithmetic
     # intensity affect speedup and GFLOP/s
-
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands 
-        print(f"building with: {comp_cmd}")
-        for t in types:
-            args = [f"./{exe_name}", comp_name, t, str(alignments[0]), str(tails[1]), str(access_patterns[0]), str(memory_levels[4])]
-            print("Running:", " ".join(args))
-            subprocess.run(comp_cmd, check=True)
-            try:
-                subprocess.run(args, check=True)
-                csv_name = "_".join(args[1:]) + ".csv"
-                expected_files.append(csv_name)
-                if os.path.exists(csv_name):
-                    print(f"CSV file produced: {csv_name}")
-                else:
-                    print(f"CSV file not found: {csv_name}")
-            except subprocess.CalledProcessError as e:
-                print("Error running:", e)
-    check_csv_files(expected_files)
-
-
-def roofline():
+    "exp5": {"types": types},
     # For at least one kernel, compute arithmetic intensity (FLOPs per byte moved) and place your achieved
     # GFLOP/s on a roofline using your measured memory bandwidth (from Project #2, if available) and an
     # estimate of your CPU’s peak FLOP rate. Explain whether you’re compute-bound or memory-bound and
     # how this predicts the observed SIMD speedup
+    "roofline": {"memory_levels": memory_levels[:5]},
+    # Temporal blocking
+    # Run the T-step stencil as naive repeated sweeps and as time-skewed, L2-resident tiles at the
+    # l2/l3/dram working sets, to see how far blocking moves the kernel toward the compute roof
+    "stencil_tb": {"memory_levels": memory_levels[2:5], "extra": [f"--timesteps={timesteps}"]},
+}
 
-    expected_files = []
-    for comp_name, comp_cmd in list(compiler_variants.items()): #build with all commands 
-        print(f"building with: {comp_cmd}")
-        for mem in memory_levels[:5]: #skip sweep for this experiment
-            args = [f"./{exe_name}", comp_name, str(types[0]), str(alignments[0]), str(tails[1]), str(access_patterns[0]), mem]
-            print("Running:", " ".join(args))
-            subprocess.run(comp_cmd, check=True)
-            try:
-                subprocess.run(args, check=True)
-                csv_name = "_".join(args[1:]) + ".csv"
-                expected_files.append(csv_name)
-                if os.path.exists(csv_name):
-                    print(f"CSV file produced: {csv_name}")
-                else:
-                    print(f"CSV file not found: {csv_name}")
-            except subprocess.CalledProcessError as e:
-                print("Error running:", e)
-    check_csv_files(expected_files)
+def expand(spec, exes):
+    # pro1 argument lists for every configuration of an experiment spec
+    axes = list(axis_defaults)
+    configs = []
+    for values in itertools.product(*(spec.get(axis, axis_defaults[axis]) for axis in axes)):
+        config = dict(zip(axes, values))
+        if "filter" in spec and not spec["filter"](config):
+            continue
+        variant = config["variants"]
+        configs.append([f"./{exes[variant]}", variant, config["types"], config["alignments"], config["tails"],
+                        config["access_patterns"]] + spec.get("extra", []) + cache_flags + measurement_flags
+                       + [config["memory_levels"]])
+    return configs
+
+def run_experiment(name, force=False):
+    spec = experiments[name]
+    exes = build_all(spec.get("variants"))
+    check_csv_files(run_configs(expand(spec, exes), force))
+
+# ------------------- Autotuner -------------------
+# `python tester.py tune` builds pro1 with flag sets drawn from tune_space (one
+# option per axis, compilers that are not installed are skipped), runs each
+# build at tune_levels next to the fixed scalar/simd variants, and writes:
+#   tune_results.csv  median steady-state GFLOP/s per build, kernel and level
+#   tune_best.json    the fastest flag set per kernel and level
+# Builds and runs go through the same build cache, scheduler and manifest as
+# the experiments, so an interrupted tune resumes where it stopped.
+
+tune_space = {
+    "compiler": ["g++", "clang++"],
+    "opt": [["-O2"], ["-O3"]],
+    "march": [[], ["-march=native"]],
+    "fast_math": [[], ["-ffast-math"]],
+    "unroll": [[], ["-funroll-loops"]],
+    "prefetch": [[], ["-fprefetch-loop-arrays"]],  # g++ only
+    "vector_width": [[], ["-mprefer-vector-width=128"], ["-mprefer-vector-width=256"],
+                     ["-mprefer-vector-width=512"]],
+}
+gcc_only_flags = {"-fprefetch-loop-arrays"}
+tune_levels = ["l1small", "l2", "dram"]
+tune_samples = 24  # flag sets drawn from the space (0: all of them)
+tune_results = "tune_results.csv"
+tune_best = "tune_best.json"
+
+def tune_flag_sets(samples=tune_samples, seed=0):
+    # Distinct compiler command prefixes from tune_space, sampled reproducibly
+    axes = list(tune_space)
+    sets = []
+    for values in itertools.product(*(tune_space[axis] for axis in axes)):
+        choice = dict(zip(axes, values))
+        if shutil.which(choice["compiler"]) is None:
+            continue
+        flags = [f for axis in axes[1:] for f in choice[axis]]
+        if "clang" in choice["compiler"] and gcc_only_flags & set(flags):
+            continue
+        sets.append([choice["compiler"], "-Wall"] + flags)
+    if samples and len(sets) > samples:
+        sets = random.Random(seed).sample(sets, samples)
+    return sets
+
+def register_tuned(flag_sets):
+    # Add each flag set to compiler_variants as tune_<hash>; returns the variant names
+    names = []
+    for cmd in flag_sets:
+        name = "tune_" + hashlib.sha256(" ".join(cmd).encode()).hexdigest()[:8]
+        compiler_variants[name] = cmd
+        names.append(name)
+    return names
+
+def median_gflops(csv_name):
+    # kernel -> median GFLOP/s over the steady-state (non-warmup) rows of one pro1 CSV
+    rates = {}
+    with open(csv_name) as f:
+        for row in csv.DictReader(f):
+            if row.get("warmup", "0") == "0":
+                rates.setdefault(row["kernel"], []).append(float(row["gflops"]))
+    return {kernel: statistics.median(v) for kernel, v in rates.items()}
+
+def tune(samples=tune_samples, force=False):
+    variants = ["scalar", "simd"] + register_tuned(tune_flag_sets(samples))
+    print(f"Tuning {len(variants) - 2} flag sets (+ scalar, simd) at {', '.join(tune_levels)}")
+    # a flag set the compiler rejects is reported and dropped, not fatal to the whole tune
+    exes = build_all(variants, keep_going=True)
+    failed = [name for name in variants if name not in exes]
+    if failed:
+        print(f"Skipping {len(failed)} variant(s) that failed to build: "
+              + "; ".join(" ".join(compiler_variants[name]) for name in failed))
+    spec = {"variants": [name for name in variants if name in exes], "memory_levels": tune_levels}
+    configs = expand(spec, exes)
+    check_csv_files(run_configs(configs, force))
+
+    rows = []
+    for args in configs:
+        if not os.path.exists(csv_for(args)):
+            continue
+        for kernel, gflops in median_gflops(csv_for(args)).items():
+            rows.append({"variant": args[1], "kernel": kernel, "memory_level": args[-1],
+                         "type": args[2], "gflops": gflops, "flags": " ".join(compiler_variants[args[1]])})
+    with open(tune_results, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["variant", "kernel", "memory_level", "type", "gflops", "flags"])
+        writer.writeheader()
+        writer.writerows(rows)
 
+    best = {}
+    for r in rows:
+        key = f"{r['kernel']}/{r['memory_level']}"
+        if key not in best or r["gflops"] > best[key]["gflops"]:
+            best[key] = r
+    baseline = {f"{r['kernel']}/{r['memory_level']}": r["gflops"] for r in rows if r["variant"] == "simd"}
+    print(f"\n{'kernel/level':20s} {'GFLOP/s':>9s} {'vs simd':>8s}  best flags")
+    for key, r in sorted(best.items()):
+        gain = r["gflops"] / baseline[key] if baseline.get(key) else float("nan")
+        r["speedup_vs_simd"] = gain
+        print(f"{key:20s} {r['gflops']:9.3f} {gain:7.2f}x  {r['flags']}")
+    with open(tune_best, "w") as f:
+        json.dump(best, f, indent=2)
+    print(f"\nWrote {tune_results} ({len(rows)} rows) and {tune_best}")
+    return best
 
     
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
-        print("Usage: python tester.py [exp1|exp2|exp3|exp4|exp5|roofline]")
+        print(f"Usage: python tester.py [{'|'.join(experiments)}|tune] [--force] [--counters] [--no-freq] "
+              f"[--adaptive [--ci=R] [--budget=S]] [--samples=N]")
         sys.exit(1)
-    exp_map = {
-        "exp1": exp1,
-        "exp2": exp2,
-        "exp3": exp3,
-        "exp4": exp4,
-        "exp5": exp5,
-        "roofline": roofline,
-    }
     exp_name = sys.argv[1].lower()
-    if exp_name in exp_map:
-        exp_map[exp_name]()
+    if exp_name in experiments or exp_name == "tune":
+        measurement_flags.extend(a for a in sys.argv[2:] if a.startswith(measurement_prefixes))
+        collect_counters = "--counters" in sys.argv[2:]
+        track_frequency = "--no-freq" not in sys.argv[2:]
+        if collect_counters and not perf_available():
+            print("perf stat unavailable: collecting rusage counters only")
+        kernel_registry.write_header()  # keep pro1.cpp's FLOP counts in sync with the registry
+        hostinfo.write_json()  # cache sizes for analyze.py's boundary lines; keep it with the CSVs
+        if exp_name == "tune":
+            samples = [int(a[len("--samples="):]) for a in sys.argv[2:] if a.startswith("--samples=")]
+            tune(samples[-1] if samples else tune_samples, force="--force" in sys.argv[2:])
+        else:
+            if exp_name == "roofline":
+                try:
+                    ceilings.get()  # measured roofs for analyze.py, once per host
+                except (subprocess.CalledProcessError, OSError) as e:
+                    # e.g. no AVX2/FMA for the compute probe: analyze.py falls back to the nominal roofs
+                    print(f"Could not measure the roofline ceilings ({e}); analyze.py will use the nominal roofs")
+            run_experiment(exp_name, force="--force" in sys.argv[2:])
     else:
         print(f"Unknown experiment: {exp_name}")
-        print("Valid options: exp1, exp2, exp3, exp4, exp5, roofline")
+        print("Valid options:", ", ".join(experiments), "or tune")